@@ -2,12 +2,31 @@
 @author: Carl Verge
 @contact: carlverge@gmail.com
 @version: 12.06
-@requires: Python 2.6, net-snmp python bindings
+@requires: Python 2.6, net-snmp python bindings (or Python 3 for the python backend, which works without them)
 @warning: No warranty or support included. Please don't call me if this nukes your node (send me a picture, though!)
 '''
 
-import netsnmp
-from collections import namedtuple
+try:
+    import netsnmp
+    HAVE_NETSNMP = True
+except ImportError: #Only the python backend works without the bindings, it has stand-ins for their classes
+    from . import backend as netsnmp
+    HAVE_NETSNMP = False
+import bisect
+import functools
+import time
+import threading
+from array import array
+from collections import namedtuple, OrderedDict
+
+try: _STRING_TYPES = (basestring,)
+except NameError: _STRING_TYPES = (str,) #Python 3
+
+try: from itertools import zip_longest
+except ImportError: from itertools import izip_longest as zip_longest #Python 2
+
+try: from sys import intern
+except ImportError: pass #Python 2, it is a builtin
 
 
 class SNMPError(Exception):
@@ -126,9 +145,598 @@ class SNMPInconsistentNameError(SNMPError):
         '''The variable does not exist; the agent cannot create it because the named object instance is inconsistent with the values of other managed objects.'''
         def __init__(self, errstring, errno=None, errind=None, varlist=None):
             SNMPError.__init__(self, errstring, errno, errind, varlist)
+
+class SNMPHostDownError(SNMPError):
+        '''The agent kept timing out, so the request wasn't sent. See the BreakerThreshold session setting.'''
+        def __init__(self, errstring, errno=None, errind=None, varlist=None):
+            SNMPError.__init__(self, errstring, errno, errind, varlist)
  
                
 
+class LRUCache(object):
+    '''
+    A small thread-safe dictionary that forgets the least recently used entries past max_entries.
+    '''
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try: value = self._data.pop(key)
+            except KeyError: return default
+            self._data[key] = value #Move it to the most recent end
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.max_entries: self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock: return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock: self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+#What a name resolves to, see SNMPythonSession.translate
+#   root: The long name of the OID, eg. .iso.org.dod.internet.mgmt.mib-2.interfaces.ifTable
+#   numeric: The numeric OID, eg. .1.3.6.1.2.1.2.2
+#   first: The long name of the first object under it, eg. .iso.org.dod.internet.mgmt.mib-2.interfaces.ifTable.ifEntry.ifIndex
+OIDTranslation = namedtuple('OIDTranslation', ['root', 'numeric', 'first'])
+
+#Name translations only depend on the loaded MIBs, so one cache is shared by every session in the process
+TRANSLATION_CACHE = LRUCache(4096)
+
+#Row classes are built once per set of column names, creating a namedtuple type is expensive
+_ROW_CLASSES = LRUCache(1024)
+
+def _row_class(typename, fields):
+    key = (typename, tuple(fields))
+    rowClass = _ROW_CLASSES.get(key)
+    if rowClass is None:
+        rowClass = namedtuple(typename, list(fields), rename=True)
+        _ROW_CLASSES.put(key, rowClass)
+    return rowClass
+
+
+def _oid_tuple(tag, iid=''):
+    #A numeric OID (split in a tag and iid like netsnmp does) as a tuple of ints, for comparing. ValueError if it has names
+    return tuple([int(number) for number in ('%s.%s' % (tag, iid) if iid else tag).strip('.').split('.')])
+
+
+def _typecode(codes, size):
+    #The first array typecode that holds numbers of at least size bytes on this platform ('q' and 'Q' need Python 3.3)
+    for code in codes:
+        try:
+            if array(code).itemsize >= size: return code
+        except ValueError: pass
+    return None
+
+#The array typecode for each numeric netsnmp type. Other types (and anything that doesn't fit) are kept in lists.
+COLUMN_TYPECODES = {
+                'INTEGER': _typecode('il', 4),
+                'INTEGER32': _typecode('il', 4),
+                'COUNTER': _typecode('IL', 4),
+                'GAUGE': _typecode('IL', 4),
+                'UINTEGER': _typecode('IL', 4),
+                'UNSIGNED32': _typecode('IL', 4),
+                'TICKS': _typecode('IL', 4),
+                'COUNTER64': _typecode('LQ', 8),
+               }
+
+#How each netsnmp type is turned into a python value when DecodeValues is on. Types not listed are left as strings.
+TYPE_DECODERS = {
+                'INTEGER': int,
+                'INTEGER32': int,
+                'COUNTER': int,
+                'GAUGE': int,
+                'UINTEGER': int,
+                'UNSIGNED32': int,
+                'TICKS': int,
+                'COUNTER64': int,
+                'NULL': lambda val: None,
+                'NOSUCHOBJECT': lambda val: None,
+                'NOSUCHINSTANCE': lambda val: None,
+                'ENDOFMIBVIEW': lambda val: None,
+               }
+
+#The types netsnmp gives a varbind that has no object behind it
+_EXCEPTION_TYPES = ('NOSUCHOBJECT', 'NOSUCHINSTANCE', 'ENDOFMIBVIEW')
+
+def decode_value(val, type):
+    '''
+    Turn a value from netsnmp into a python value according to its type: numbers become ints, and the
+    noSuchObject/noSuchInstance/endOfMibView exceptions become None. Anything else is returned as is.
+    '''
+    if val is None: return None
+    decoder = TYPE_DECODERS.get(type)
+    if decoder is None: return val
+    try: return decoder(val)
+    except ValueError: return val #Some agents send junk, don't lose it
+
+
+class ColumnarTable(object):
+    '''
+    A table stored column by column, as returned by SNMPythonSession.get_table_columnar.
+    Numeric columns (integers, counters, gauges, ticks) are compact arrays of numbers, the others are lists of strings.
+    This takes several times less memory than a dictionary of named tuples, and whole columns can be worked on at once:
+        table = session.get_table_columnar('ifXTable', columns=['ifName', 'ifHCInOctets'])
+        print sum(table.column('ifHCInOctets'))
+        print table['3'].ifName #Rows are still available, built on demand
+        for index, row in table.iteritems(): ...
+    @ivar columns: The column names, in order.
+    @ivar types: The netsnmp type of each column, None if the column had no values.
+    @ivar index: The row indexes, in index order.
+    @ivar positions: Maps each row index to its position in the columns.
+    @ivar timestamp: The time.time() the table was retrieved at.
+    @ivar uptime: The agent's sysUpTime.0 (in hundredths of a second) when the table was retrieved, if it was asked for.
+    '''
+    def __init__(self, columns, timestamp=None, uptime=None):
+        self.columns = tuple(columns)
+        self.uptime = uptime
+        self.types = [None]*len(self.columns)
+        self.index = []
+        self.positions = {}
+        self.timestamp = timestamp
+        self._data = [[] for column in self.columns]
+        self._missing = [set() for column in self.columns] #Positions of the cells a sparse table doesn't have
+        self._colNumbers = dict((column, x) for x, column in enumerate(self.columns))
+        self._rowClass = _row_class('TableRow', self.columns)
+
+    def append(self, iid, values, types):
+        '''
+        Add a row at the end of the table.
+        @param iid: The row index.
+        @param values: One value per column, None for a missing cell.
+        @param types: One netsnmp type per column, None for a missing cell.
+        '''
+        position = len(self.index)
+        self.index.append(iid)
+        self.positions[iid] = position
+        for col, val in enumerate(values):
+            data = self._data[col]
+            if val is None:
+                self._missing[col].add(position)
+                data.append(0 if isinstance(data, array) else None)
+                continue
+            if self.types[col] is None: #The first value decides how the column is stored
+                self.types[col] = types[col]
+                code = COLUMN_TYPECODES.get(types[col])
+                if code: data = self._data[col] = array(code, [0]*len(data))
+            elif types[col] != self.types[col] and isinstance(data, array):
+                data = self._to_list(col)
+            if isinstance(data, array):
+                try:
+                    data.append(int(val))
+                    continue
+                except (ValueError, OverflowError, TypeError):
+                    data = self._to_list(col)
+            data.append(val)
+
+    def _to_list(self, col):
+        #The column turned out not to be all numbers, go back to strings
+        missing = self._missing[col]
+        data = self._data[col] = [None if x in missing else str(val) for x, val in enumerate(self._data[col])]
+        return data
+
+    def column(self, name):
+        '''
+        @return: The whole column, an array for numeric columns and a list otherwise. Missing cells are 0 in arrays and None in lists.
+        '''
+        return self._data[self._colNumbers[name]]
+
+    def missing(self, name):
+        '''
+        @return: The set of row positions that have no value in the column.
+        '''
+        return self._missing[self._colNumbers[name]]
+
+    def row(self, position):
+        '''
+        @return: The row at a position, as a named tuple like get_table returns (numbers stay numbers). Missing cells are None.
+        '''
+        return self._rowClass(*[None if position in missing else data[position]
+                                for data, missing in zip(self._data, self._missing)])
+
+    def __getitem__(self, iid):
+        return self.row(self.positions[iid])
+
+    def get(self, iid, default=None):
+        position = self.positions.get(iid)
+        return default if position is None else self.row(position)
+
+    def __contains__(self, iid):
+        return iid in self.positions
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def iteritems(self):
+        for position, iid in enumerate(self.index): yield iid, self.row(position)
+
+    items = iteritems
+
+    def to_dict(self):
+        '''
+        @return: The table as a dictionary of named tuples, like get_table.
+        '''
+        return dict(self.iteritems())
+
+
+class ResponseCache(object):
+    '''
+    Remembers the results of gets for a while, so scripts and dashboards that ask the same agents for the same objects
+    over and over don't hit the agent every time. Give it to one or more sessions with the ResponseCache setting:
+        cache = ResponseCache({'sysUpTime': 1, 'sysDescr': 3600, 'ifDescr': 300}, max_entries=50000)
+        session = SNMPythonSession(DestHost='192.168.1.1', Community='private', Version=2, ResponseCache=cache)
+        print session['sysDescr.0'] #Only the first one goes to the agent for the next hour
+        if 'ifDescr.2' in session: ... #Existence checks are answered from the cache too
+
+    The time to live of an OID comes from the longest prefix in ttls that matches it (whole labels only, so 'ifIn'
+    doesn't match 'ifInOctets.1'). OIDs with no match use default_ttl, 0 means not cached at all.
+    Sets through a session using the cache forget the OIDs they set.
+    When the cache is shared by several sessions in different threads, identical gets in flight at the same time
+    are only sent once: the later ones wait for the first one's answer.
+    Results are kept per naming and value format (UseLongNames, UseNumeric, UseEnums, UseSprintValue), so sessions
+    with different settings sharing the cache each get results the way they asked for them.
+    @warning: OIDs are matched as written, 'sysDescr.0' and '.1.3.6.1.2.1.1.1.0' are cached separately.
+    '''
+    def __init__(self, ttls=None, default_ttl=0, max_entries=10000):
+        '''
+        @param ttls: Dictionary of OID prefix -> seconds to keep results under it. (Optional)
+        @param default_ttl: Seconds to keep results that don't match a prefix, 0 to not cache them. (Optional)
+        @param max_entries: The most results kept, the least recently used ones are dropped first. (Optional)
+        '''
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self._entries = LRUCache(max_entries)
+        self._prefixes = sorted(self.ttls, key=len, reverse=True)
+        self._ttlCache = LRUCache(max_entries) #OID -> its ttl, so the prefixes are only searched once per OID
+        self._inFlight = {} #Key -> threading.Event set when the get for it is done
+        self._formats = set() #The formats results were cached in, see _format
+        self._lock = threading.Lock()
+
+    def ttl(self, oid):
+        '''
+        @return: How long results for the OID are kept, in seconds.
+        '''
+        ttl = self._ttlCache.get(oid)
+        if ttl is None:
+            ttl = self.default_ttl
+            for prefix in self._prefixes:
+                if oid == prefix or oid.startswith(prefix + '.'):
+                    ttl = self.ttls[prefix]
+                    break
+            self._ttlCache.put(oid, ttl)
+        return ttl
+
+    def _format(self, session):
+        #The session settings that change how netsnmp writes the tags and values
+        return tuple([getattr(session, name, 0) for name in ('UseLongNames', 'UseNumeric', 'UseEnums', 'UseSprintValue')])
+
+    def _key(self, session, oid, format=None):
+        if format is None: format = self._format(session)
+        return (session.DestHost, getattr(session, 'RemotePort', None), getattr(session, 'Community', None), oid, format)
+
+    def fetch(self, session, oids):
+        '''
+        Get the OIDs through the session, answering what we can from the cache.
+        @return: A list of varbinds with the results, in the same order as the OIDs.
+        @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
+        '''
+        now = time.time()
+        format = self._format(session)
+        results = [None]*len(oids)
+        mine, waiting = [], [] #Positions we get from the agent, and the ones another thread is already getting
+        with self._lock:
+            self._formats.add(format)
+            for x, oid in enumerate(oids):
+                if self.ttl(oid) <= 0:
+                    mine.append(x)
+                    continue
+                key = self._key(session, oid, format)
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    results[x] = netsnmp.Varbind(*entry[1])
+                elif key in self._inFlight:
+                    waiting.append((x, self._inFlight[key]))
+                else:
+                    self._inFlight[key] = threading.Event()
+                    mine.append(x)
+
+        try:
+            if mine:
+                varbinds = session._request('get', [netsnmp.Varbind(oids[x]) for x in mine])
+                now = time.time()
+                for x, varbind in zip(mine, varbinds):
+                    results[x] = varbind
+                    ttl = self.ttl(oids[x])
+                    if ttl > 0:
+                        self._entries.put(self._key(session, oids[x], format),
+                                          (now + ttl, (varbind.tag, varbind.iid, varbind.val, varbind.type)))
+        finally:
+            with self._lock:
+                for x in mine:
+                    event = self._inFlight.pop(self._key(session, oids[x], format), None)
+                    if event is not None: event.set()
+
+        retry = []
+        for x, event in waiting:
+            event.wait()
+            entry = self._entries.get(self._key(session, oids[x], format))
+            if entry is None: retry.append(x) #The other get failed, try it ourselves
+            else: results[x] = netsnmp.Varbind(*entry[1])
+        if retry:
+            for x, varbind in zip(retry, session._request('get', [netsnmp.Varbind(oids[x]) for x in retry])):
+                results[x] = varbind
+        return results
+
+    def invalidate(self, session, oids):
+        '''
+        Forget the cached results for the OIDs on the session's agent, in every format.
+        '''
+        for format in list(self._formats):
+            for oid in oids: self._entries.pop(self._key(session, oid, format))
+
+    def clear(self):
+        '''Forget everything.'''
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class AgentState(object):
+    '''
+    What the module has learned about a single agent, shared by every session talking to it.
+    Get it with SNMPythonSession.agent_state() if you want to look at (or seed) the learned values.
+    @ivar max_repetitions: The getbulk max-repetitions that currently works best for this agent.
+    @ivar max_varbinds: How many varbinds we currently put in one get/getnext/set PDU for this agent.
+    @ivar too_big_varbinds: The smallest number of varbinds that got a tooBig reply, max_varbinds stays under it.
+    @ivar srtt: The smoothed round-trip time in seconds, None until the first reply. See the AdaptiveTimeout session setting.
+    @ivar rttvar: The smoothed variation of the round-trip time in seconds.
+    @ivar timeout: The timeout in seconds worked out from them, None until the first reply.
+    @ivar timeouts: The number of requests that timed out.
+    @ivar consecutive_timeouts: The number of requests that timed out since the last reply.
+    @ivar breaker: The circuit breaker: 'closed' (requests go out), 'open' (they fail fast until retry_at),
+                   or 'half-open' (one probe request is out). See the BreakerThreshold session setting.
+    @ivar retry_at: When the next probe can go out while the breaker is open, seconds since the epoch.
+    @ivar backoff: The seconds the breaker stayed open the last time, doubled every time the probe fails.
+    @ivar trips: How many times the breaker opened.
+    @ivar fast_failures: How many requests failed fast because the breaker was open.
+    '''
+    def __init__(self, max_repetitions, max_varbinds):
+        self.max_repetitions = max_repetitions
+        self.max_varbinds = max_varbinds
+        self.too_big_varbinds = None
+        self.srtt = None
+        self.rttvar = None
+        self.timeout = None
+        self.timeouts = 0
+        self.consecutive_timeouts = 0
+        self.breaker = 'closed'
+        self.retry_at = None
+        self.backoff = None
+        self.trips = 0
+        self.fast_failures = 0
+        self._lock = threading.Lock() #For the breaker and round-trip updates, which come from any thread
+
+    def __repr__(self):
+        return 'AgentState(%s)' % ', '.join('%s=%r' % item for item in sorted(self.__dict__.items()) if not item[0].startswith('_'))
+
+
+#Histogram buckets (upper bounds) for request round-trips and call times in seconds, and for getbulk pages per walk
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PAGE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+class Histogram(object):
+    '''
+    Counts of observed values in fixed buckets, the way most metrics systems take them.
+    @ivar bounds: The upper bound of each bucket. Values over the last bound go in one more bucket.
+    @ivar counts: The number of values in each bucket (not cumulative), one longer than bounds.
+    @ivar count: The number of values observed.
+    @ivar sum: The sum of the values observed.
+    '''
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0]*(len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, fraction):
+        '''
+        @return: The upper bound of the bucket holding the given percentile (eg. 0.99), None if nothing was observed.
+                 Float('inf') if it is in the last bucket.
+        '''
+        if not self.count: return None
+        rank, seen = fraction * self.count, 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank: return bound
+        return float('inf')
+
+    def to_dict(self):
+        return {'bounds': list(self.bounds), 'counts': list(self.counts), 'count': self.count, 'sum': self.sum}
+
+
+class Metrics(object):
+    '''
+    The counters and histograms SessionMetrics keeps, for all hosts and for each one.
+    @ivar requests: PDU type (get, getnext, getbulk, set) -> PDUs sent.
+    @ivar varbinds_sent: Varbinds in the requests.
+    @ivar varbinds_returned: Varbinds in the successful replies.
+    @ivar errors: Error class name (SNMPTimeoutError, SNMPTooBigError... see SNMPythonSession.ERROR_MAP) -> count.
+                  Includes errors the session recovered from, like a tooBig reply it split the request for.
+    @ivar rtt: Histogram of request round-trips in seconds, netsnmp retries included.
+    @ivar walks: The number of getbulk walks (subtrees and tables).
+    @ivar walk_pages: Histogram of the getbulk pages each walk took.
+    @ivar calls: Session method -> calls.
+    @ivar call_time: Histogram of the seconds each call took.
+    @ivar assembly_time: Histogram of the seconds each call spent in python rather than waiting on the agent
+                         (decoding values, putting tables together, ...).
+    '''
+    def __init__(self):
+        self.requests = {}
+        self.varbinds_sent = 0
+        self.varbinds_returned = 0
+        self.errors = {}
+        self.rtt = Histogram(TIME_BUCKETS)
+        self.walks = 0
+        self.walk_pages = Histogram(PAGE_BUCKETS)
+        self.calls = {}
+        self.call_time = Histogram(TIME_BUCKETS)
+        self.assembly_time = Histogram(TIME_BUCKETS)
+
+    def to_dict(self):
+        result = {}
+        for name, value in self.__dict__.items():
+            if isinstance(value, Histogram): value = value.to_dict()
+            elif isinstance(value, dict): value = dict(value)
+            result[name] = value
+        return result
+
+
+class SessionHooks(object):
+    '''
+    The base class for a session's Instrumentation. Override the hooks you need, they do nothing by default:
+        class SlowRequests(SessionHooks):
+            def request_finished(self, session, op, varbinds, returned, rtt, error):
+                if rtt > 1.0: log.warning('%s took %.1fs for a %s', session.DestHost, rtt, op)
+        session = SNMPythonSession(DestHost='192.168.1.1', Community='private', Version=2, Instrumentation=SlowRequests())
+    Hooks run in the thread making the request, keep them quick. When a get is pipelined (see PipelineDepth),
+    they are called from several threads at once.
+    '''
+    def request_started(self, session, op, varbinds):
+        '''
+        Called right before a PDU is sent.
+        @param op: The PDU type: get, getnext, getbulk or set.
+        @param varbinds: The number of varbinds in the request.
+        '''
+
+    def request_finished(self, session, op, varbinds, returned, rtt, error):
+        '''
+        Called once the reply came back, or netsnmp gave up.
+        @param returned: The number of varbinds in the reply, 0 on errors.
+        @param rtt: The seconds it took, netsnmp retries included.
+        @param error: The name of the SNMPError class the failure maps to (see SNMPythonSession.ERROR_MAP), or None.
+        '''
+
+    def walk_finished(self, session, root, pages, varbinds):
+        '''
+        Called when a getbulk walk is over, or stopped early.
+        @param root: The OID walked, or the list of columns for a table walked side by side.
+        @param pages: The number of getbulk replies it took.
+        @param varbinds: The number of varbinds it yielded.
+        '''
+
+    def call_finished(self, session, method, elapsed, assembly, error):
+        '''
+        Called when a public request method (get_data, get_table, ...) returns or raises.
+        Methods called by other methods, like get_subtree_data_oids by get_table, are only reported as part of the outer call.
+        @param method: The method name.
+        @param elapsed: The seconds the call took.
+        @param assembly: The part of them spent in python rather than waiting on the agent.
+        @param error: The name of the SNMPError class raised, or None.
+        '''
+
+
+class SessionMetrics(SessionHooks):
+    '''
+    Instrumentation that keeps counters and histograms (see Metrics) of everything the sessions using it do,
+    in total and for each host. It is thread safe, so one can be shared by many sessions, a poller or an async session:
+        metrics = SessionMetrics()
+        poller = SNMPythonPoller(Community='public', Version=2, Instrumentation=metrics)
+        ...
+        print metrics.total.errors, metrics.hosts['10.0.0.1'].rtt.percentile(0.99)
+        export(metrics.snapshot())
+    Give each session its own SessionMetrics for per-session numbers.
+    @ivar total: The Metrics for every host.
+    @ivar hosts: Host -> its Metrics.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.total = Metrics()
+            self.hosts = {}
+
+    def _metrics(self, session):
+        #Called with the lock held
+        host = self.hosts.get(session.DestHost)
+        if host is None: host = self.hosts[session.DestHost] = Metrics()
+        return (self.total, host)
+
+    def request_finished(self, session, op, varbinds, returned, rtt, error):
+        with self._lock:
+            for metrics in self._metrics(session):
+                metrics.requests[op] = metrics.requests.get(op, 0) + 1
+                metrics.varbinds_sent += varbinds
+                metrics.varbinds_returned += returned
+                metrics.rtt.observe(rtt)
+                if error: metrics.errors[error] = metrics.errors.get(error, 0) + 1
+
+    def walk_finished(self, session, root, pages, varbinds):
+        with self._lock:
+            for metrics in self._metrics(session):
+                metrics.walks += 1
+                metrics.walk_pages.observe(pages)
+
+    def call_finished(self, session, method, elapsed, assembly, error):
+        with self._lock:
+            for metrics in self._metrics(session):
+                metrics.calls[method] = metrics.calls.get(method, 0) + 1
+                metrics.call_time.observe(elapsed)
+                metrics.assembly_time.observe(assembly)
+
+    def snapshot(self):
+        '''
+        @return: A copy of the metrics as plain dictionaries and lists, for exporting: {'total': {...}, 'hosts': {host: {...}}}
+        '''
+        with self._lock:
+            return {'total': self.total.to_dict(), 'hosts': dict((host, metrics.to_dict()) for host, metrics in self.hosts.items())}
+
+
+def _instrumented(method):
+    #Decorator for the session's public request methods, reports each call to the session's Instrumentation.
+    #The time not spent in _send is the python side: decoding values and assembling the results.
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        hooks = self.Instrumentation
+        if hooks is None or self._callDepth: return method(self, *args, **kwargs)
+        self._callDepth += 1
+        network, start, error = self._networkTime, time.time(), None
+        try:
+            return method(self, *args, **kwargs)
+        except SNMPError as e:
+            error = e.__class__.__name__
+            raise
+        finally:
+            self._callDepth -= 1
+            elapsed = time.time() - start
+            hooks.call_finished(self, method.__name__, elapsed, max(elapsed - (self._networkTime - network), 0.0), error)
+    return wrapper
+
+
 class SNMPythonSession(netsnmp.Session):
     '''
     @author: Carl Verge
@@ -139,6 +747,7 @@ class SNMPythonSession(netsnmp.Session):
     An attempt at a more pythonic approach to SNMP for simple scripts. Uses the netsnmp bindings
     as a base (I wanted to see if it would make a perf. difference vs pure SNMP python libs).
     Many of the methods in this module require that MIBs are loaded in netsnmp to perform translations.
+    Loading all of them takes seconds, see the mibindex module for loading just a few, or none at all.
     
     To install net-snmp and python bindings (net-snmp is preinstalled on many *NIX)
         Debian/Ubuntu: apt-get install snmp libsnmp-python
@@ -156,6 +765,8 @@ class SNMPythonSession(netsnmp.Session):
     
     To start a session (v2):
         session = SNMPythonSession(DestHost='192.168.1.1', Community='private', Version=2)
+    Or for the length of a with block, closing its socket at the end (see close):
+        with SNMPythonSession(DestHost='192.168.1.1', Community='private', Version=2, Backend='python') as session: ...
         
     To start getting variables:
         print session['sysUpTime.0'] #Returns a single value
@@ -192,6 +803,9 @@ class SNMPythonSession(netsnmp.Session):
             3 : TableRow(ifIndex='37453824', ifDescr='Ethernet 0/0', ifType='6', ifMtu='1514', ...
             4 : TableRow(ifIndex='37421056', ifDescr='Ethernet 0/1', ifType='6', ifMtu='1514', ...
             ...
+
+        #Only walk the columns you need, side by side (parallel=True walks all of them this way):
+        tab = session.get_table('ifXTable', columns=['ifName', 'ifHCInOctets', 'ifHCOutOctets'])
     
     Getting a subtree (uses getbulk):
         #This will return a list of tuples, an entry for each value under that OID.
@@ -202,6 +816,10 @@ class SNMPythonSession(netsnmp.Session):
             ('.iso.org.dod.internet.mgmt.mib-2.interfaces.ifTable.ifEntry.ifIndex', '1', '1', 'INTEGER32')
             ('.iso.org.dod.internet.mgmt.mib-2.interfaces.ifTable.ifEntry.ifIndex', '2', '2', 'INTEGER32')
             ...
+
+        #For big subtrees and tables, the iter_ versions stream the results a getbulk reply at a time instead:
+        for entry in session.iter_subtree('ipRouteTable'): print entry
+        for index, row in session.iter_table('ifTable'): print index, row.ifDescr
         
     Tips on creating a row:
         #Set the row status to 5 (createAndWait), then configure the other parameters
@@ -235,6 +853,38 @@ class SNMPythonSession(netsnmp.Session):
             UseEnums : If set to 1, translate enum numbers to strings. I've had this crash python on me.
             UseLongNames : Return the fully qualified OID name instead of the leaf name.
             UseNumeric : Force disable translation of OID names. This breaks many methods.
+            DecodeValues : If set to 1, values come back as python types instead of strings: ints for numbers, None when there is no
+                           object. See decode_value. Can also be passed to the constructor.
+            MaxRepetitions : The getbulk max-repetitions for walks. None (the default) learns the best value for each agent:
+                             it backs off on tooBig replies and timeouts, and grows while replies come back full and fast.
+                             Can also be passed to the constructor, eg. SNMPythonSession(DestHost=..., MaxRepetitions=25)
+            MaxVarbinds : The most varbinds put in one get, getnext or set PDU, longer requests are split up and the results put
+                          back in order. None (the default) learns the limit for each agent, splitting again on tooBig replies.
+                          Can also be passed to the constructor.
+            PipelineDepth : How many PDUs of a split get or getnext are in flight at once (sets are always sent one at a time).
+                            Above 1, extra sessions to the same agent are opened on demand. Can also be passed to the constructor.
+            ResponseCache : A ResponseCache to answer gets (and 'in' checks) from, None to always ask the agent.
+                            Can also be passed to the constructor.
+            MIBIndex : A mibindex.MIBIndex to translate names with instead of netsnmp's MIBs, so they don't have to be loaded
+                       (see mibindex.use_mibs). Names, long names and results work as if the MIBs were loaded, but
+                       sets without a type take the one the object has (see set_data). Can also be passed to the constructor.
+            Instrumentation : A SessionHooks told about every request, walk and call the session makes, eg. a SessionMetrics
+                              to count requests, errors and round-trips. None (the default) for no instrumentation.
+                              Can also be passed to the constructor.
+            AdaptiveTimeout : If set to 1, each request waits as long as the agent's smoothed round-trip time suggests
+                              (plus 4 times its variation, at least TIMEOUT_MIN) rather than the full Timeout, which is
+                              the most it waits. See agent_state() for the round-trip times. Can also be passed to the constructor.
+            BreakerThreshold : After this many requests in a row to the agent time out, the circuit breaker opens: requests
+                               fail fast with SNMPHostDownError instead of waiting for another timeout. After BREAKER_BACKOFF
+                               seconds one request probes the agent, closing the breaker if it answers, and doubling the wait
+                               (up to BREAKER_BACKOFF_MAX) if not. None (the default) for no breaker. The breaker state
+                               is in agent_state(), shared by all sessions to the agent. Can also be passed to the constructor.
+            Backend : Constructor only. 'netsnmp' (the default) sends the requests with the net-snmp library, 'python'
+                      with plain UDP sockets and a BER codec written in python (see the backend module), for SNMP v1 and v2c.
+                      The python backend has no MIBs, so use numeric OIDs or a MIBIndex, and sets without types cost a get
+                      (see set_data). With it, the PDUs of a split get or getnext are all sent at once on the one socket
+                      when PipelineDepth is above 1, no extra sessions needed. It doesn't need the net-snmp python bindings:
+                      when they aren't installed (HAVE_NETSNMP is False), 'python' is the default and the only choice.
     
     '''
 
@@ -249,7 +899,38 @@ class SNMPythonSession(netsnmp.Session):
         By default, OID name translation is turned on (required by a lot of the methods)
         As well, enum translation is turned off (I've had it crash python on me a few times)
         '''
-        netsnmp.Session.__init__(self, *args, **kwargs)
+        #Our own settings have to be taken out, netsnmp complains about arguments it doesn't know
+        maxRepetitions = kwargs.pop('MaxRepetitions', None)
+        decodeValues = kwargs.pop('DecodeValues', 0)
+        maxVarbinds = kwargs.pop('MaxVarbinds', None)
+        pipelineDepth = kwargs.pop('PipelineDepth', 1)
+        responseCache = kwargs.pop('ResponseCache', None)
+        adaptiveTimeout = kwargs.pop('AdaptiveTimeout', 0)
+        breakerThreshold = kwargs.pop('BreakerThreshold', None)
+        instrumentation = kwargs.pop('Instrumentation', None)
+        mibIndex = kwargs.pop('MIBIndex', None)
+        backend = kwargs.pop('Backend', 'netsnmp' if HAVE_NETSNMP else 'python')
+        if backend == 'netsnmp':
+            if not HAVE_NETSNMP: raise ValueError("The net-snmp python bindings aren't installed, use Backend='python'")
+            netsnmp.Session.__init__(self, *args, **kwargs)
+            self._backend = None
+        else:
+            if backend == 'python': from .backend import PythonBackend as backend
+            self._backend = backend(self, **kwargs) #Sets up the session attributes in place of netsnmp
+        self.MaxRepetitions = maxRepetitions
+        self.DecodeValues = decodeValues
+        self.MaxVarbinds = maxVarbinds
+        self.PipelineDepth = pipelineDepth
+        self._sessionArgs = (args, dict(kwargs, Backend=backend)) #To open more sessions to the same agent when pipelining
+        self._siblings = []
+        self.ResponseCache = responseCache
+        self.AdaptiveTimeout = adaptiveTimeout
+        self.BreakerThreshold = breakerThreshold
+        self.Instrumentation = instrumentation
+        self.MIBIndex = mibIndex
+        self._networkTime = 0.0 #Seconds spent waiting on the agent, for the instrumentation
+        self._networkLock = threading.Lock() #Pipelining threads add to it at once
+        self._callDepth = 0
         self.UseNumeric = 0
         #@bug: Disabled for now, I've had enum parsing crash the netsnmp lib (and the python interpreter by extension)
         self.UseEnums = 0
@@ -275,23 +956,373 @@ class SNMPythonSession(netsnmp.Session):
                17: SNMPNotWritableError, #The variable exists but the agent cannot modify it.
                18: SNMPInconsistentNameError #The variable does not exist; the agent cannot create it because the named object instance is inconsistent with the values of other managed objects.          
                }
-    
-    def raise_error(self, errstring, errno=None, errind=None, varlist=None):
+
+    #How many column numbers get_table_columns probes with a single getnext
+    COLUMN_PROBE_SIZE = 32
+
+    #Limits for the learned getbulk max-repetitions, and the reply times (in seconds) that make it grow or shrink
+    BULK_INITIAL = 100
+    BULK_MIN = 1
+    BULK_MAX = 1000
+    BULK_FAST = 0.1
+    BULK_SLOW = 1.0
+
+    #Limits for the learned number of varbinds in one get/getnext/set PDU
+    VARBINDS_INITIAL = 64
+    VARBINDS_MAX = 512
+
+    #Limits for the adaptive timeout in seconds, and how much of the round-trip variation it allows for (RFC 6298)
+    TIMEOUT_MIN = 0.2
+    TIMEOUT_VARIATIONS = 4
+
+    #Seconds the circuit breaker stays open the first time, it doubles (up to the max) every time the probe fails
+    BREAKER_BACKOFF = 5.0
+    BREAKER_BACKOFF_MAX = 300.0
+
+    #The per-call settings a pipelining session copies to the extra sessions it uses
+    SIBLING_SETTINGS = ('UseLongNames', 'UseNumeric', 'UseEnums', 'UseSprintValue')
+
+    #What we have learned about each agent, keyed by (host, port) and shared by all sessions
+    _agents = {}
+    _agentsLock = threading.Lock()
+
+    def agent_state(self):
+        '''
+        @return: The AgentState for the agent this session talks to, shared by all sessions to the same agent.
+        '''
+        key = (self.DestHost, getattr(self, 'RemotePort', None))
+        state = self._agents.get(key)
+        if state is None:
+            with self._agentsLock:
+                state = self._agents.setdefault(key, AgentState(self.BULK_INITIAL, self.VARBINDS_INITIAL))
+        return state
+
+    def reset_agent_state(self):
+        '''
+        Forget what has been learned about the agent (see agent_state), for every session talking to it.
+        The next request starts over from the defaults.
+        '''
+        with self._agentsLock: self._agents.pop((self.DestHost, getattr(self, 'RemotePort', None)), None)
+
+    def close(self):
+        '''
+        Close the Backend's socket, and those of the extra sessions used for pipelining, instead of waiting for the
+        garbage collector. The session can still be used after, the Backend opens a new socket on the next request.
+        netsnmp's own sessions are only freed with the session object.
+        '''
+        for sibling in self._siblings: sibling.close()
+        self._siblings = []
+        if self._backend is not None: self._backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _getbulk(self, nonrepeaters, varbinds):
+        '''
+        Perform a getbulk starting from the varbinds, with the session's fixed MaxRepetitions or the learned one.
+        A tooBig reply (or a timeout, retried once) halves the max-repetitions and tries again,
+        and a reply that came back complete and fast doubles it for the next request.
+        @return: The varlist with the results.
+        '''
+        fixed = self.MaxRepetitions
+        state = self.agent_state()
+        repetitions = fixed or state.max_repetitions
+        retriedTimeout = False
+
+        while True:
+            varlist = netsnmp.VarList(*[netsnmp.Varbind(varbind.tag, varbind.iid) for varbind in varbinds])
+            start = time.time()
+            self._send(self, 'getbulk', varlist, nonrepeaters, repetitions)
+            elapsed = time.time() - start
+
+            if self.ErrorStr:
+                tooBig = self.ErrorNum == 1
+                timedOut = self.ErrorInd == -24 and not retriedTimeout
+                if not fixed and repetitions > self.BULK_MIN and (tooBig or timedOut):
+                    retriedTimeout = retriedTimeout or not tooBig
+                    repetitions = state.max_repetitions = max(repetitions // 2, self.BULK_MIN)
+                    continue
+                self.raise_error(self.ErrorStr, self.ErrorNum, self.ErrorInd, varlist)
+
+            if not fixed:
+                repeaters = len(varbinds) - nonrepeaters
+                if elapsed > self.BULK_SLOW:
+                    state.max_repetitions = max(repetitions * 3 // 4, self.BULK_MIN)
+                #The agent sent everything we asked for, so the PDU wasn't full yet
+                elif elapsed < self.BULK_FAST and len(varlist) >= nonrepeaters + repetitions * repeaters:
+                    state.max_repetitions = min(repetitions * 2, self.BULK_MAX)
+            return varlist
+
+    def _get(self, oids):
+        #A get of the OIDs, through the response cache if there is one
+        if self.ResponseCache is not None: return self.ResponseCache.fetch(self, oids)
+        return self._request('get', [netsnmp.Varbind(oid) for oid in oids])
+
+    def _request(self, op, varbinds):
+        '''
+        Send the varbinds with a get, getnext or set (op is the method name), split into as many PDUs as needed.
+        Up to PipelineDepth PDUs of a get or getnext are in flight at once. The results come back in the original order.
+        @return: A list of the varbinds with the results.
+        '''
+        limit = self.MaxVarbinds or self.agent_state().max_varbinds
+        if len(varbinds) <= limit: return self._request_chunk(self, op, varbinds, 0)
+
+        chunks = [(start, varbinds[start:start+limit]) for start in range(0, len(varbinds), limit)]
+        if op == 'set' or self.PipelineDepth <= 1: #Sets go in order, and stop at the first failure
+            return [varbind for start, chunk in chunks for varbind in self._request_chunk(self, op, chunk, start)]
+        return self._pipeline(op, chunks)
+
+    def _request_chunk(self, session, op, varbinds, offset, varlist=None):
+        #Send one PDU through the session, splitting it further if the agent says it is too big.
+        #If the varlist is given it was already sent (see _multiplex), and the session has its errors.
+        if varlist is None:
+            varlist = netsnmp.VarList(*varbinds)
+            self._send(session, op, varlist)
+        if session.ErrorStr:
+            if session.ErrorNum == 1 and len(varbinds) > 1 and not self.MaxVarbinds:
+                state = self.agent_state()
+                half = len(varbinds) // 2
+                state.max_varbinds = max(min(state.max_varbinds, half), 1)
+                state.too_big_varbinds = min(state.too_big_varbinds or len(varbinds), len(varbinds))
+                return (self._request_chunk(session, op, varbinds[:half], offset) +
+                        self._request_chunk(session, op, varbinds[half:], offset+half))
+            #Point the error index at the varbind in the whole request, not in this PDU
+            errind = session.ErrorInd + offset if session.ErrorInd and session.ErrorInd > 0 else session.ErrorInd
+            self.raise_error(session.ErrorStr, session.ErrorNum, errind, varlist)
+
+        if not self.MaxVarbinds:
+            state = self.agent_state()
+            if len(varbinds) >= state.max_varbinds: #A full PDU went through, try a bit more next time
+                ceiling = state.too_big_varbinds - 1 if state.too_big_varbinds else self.VARBINDS_MAX
+                state.max_varbinds = min(state.max_varbinds + max(state.max_varbinds // 4, 1), self.VARBINDS_MAX, ceiling)
+        return list(varlist)
+
+    def _send(self, session, op, varlist, *args):
+        '''
+        Send one PDU with the netsnmp method op of the session (this one, or a sibling when pipelining).
+        Every request to the agent goes through here, so the Instrumentation sees all of them.
+        @param args: Arguments that go before the varlist (non-repeaters and max-repetitions for getbulk).
+        '''
+        hooks = self.Instrumentation
+        state = self.agent_state() if self.AdaptiveTimeout or self.BreakerThreshold else None
+        if hooks is None and state is None:
+            self._call(session, op, varlist, args)
+            return
+        varbinds = len(varlist)
+        if state is not None: timeout, probe = self._open_request(session, state)
+        if hooks is not None: hooks.request_started(self, op, varbinds)
+        start = time.time()
+        try:
+            self._call(session, op, varlist, args)
+        except:
+            if state is not None and probe: self._cancel_probe(state)
+            raise
+        finally:
+            rtt = time.time() - start
+            if state is not None: limit, session.Timeout = session.Timeout, timeout
+        if state is not None: self._close_request(state, rtt, session.ErrorStr and session.ErrorInd == -24, limit)
+        with self._networkLock: self._networkTime += rtt
+        if hooks is None: return
+        error = self.error_class(session.ErrorNum, session.ErrorInd).__name__ if session.ErrorStr else None
+        hooks.request_finished(self, op, varbinds, 0 if error else len(varlist), rtt, error)
+
+    def _open_request(self, session, state):
+        '''
+        Before a request: fail fast if the circuit breaker is open, and set the session's Timeout from the round-trip times.
+        @return: (the session's own Timeout, to put back after the request, whether this request is the breaker's probe)
+        @raise SNMPHostDownError: The breaker is open, or another request is already probing the agent.
+        '''
+        probe = False
+        if self.BreakerThreshold and state.breaker != 'closed':
+            with state._lock: #Only one of the requests that find the breaker open can become the probe
+                if state.breaker == 'open' and time.time() >= state.retry_at:
+                    state.breaker = 'half-open' #This request is the probe
+                    probe = True
+                elif state.breaker != 'closed':
+                    state.fast_failures += 1
+                    raise SNMPHostDownError('%s kept timing out, not trying again for %.1fs' % (self.DestHost, max(state.retry_at - time.time(), 0)))
+        timeout = session.Timeout
+        if self.AdaptiveTimeout and state.timeout is not None and timeout > 0:
+            session.Timeout = int(min(state.timeout * 1000000, timeout)) #The session's own Timeout is the most we wait
+        return timeout, probe
+
+    def _cancel_probe(self, state):
+        #The probe never went out, let the next request probe
+        with state._lock:
+            if state.breaker == 'half-open': state.breaker = 'open'
+
+    def _close_request(self, state, rtt, timedOut, limit):
+        #After a request: learn the round-trip time, and trip or close the circuit breaker. limit is the Timeout it was sent with
+        with state._lock:
+            if timedOut:
+                state.timeouts += 1
+                state.consecutive_timeouts += 1
+                threshold = self.BreakerThreshold
+                if threshold and (state.breaker == 'half-open' or (state.breaker == 'closed' and state.consecutive_timeouts >= threshold)):
+                    state.backoff = min(state.backoff * 2, self.BREAKER_BACKOFF_MAX) if state.breaker == 'half-open' else self.BREAKER_BACKOFF
+                    state.breaker = 'open'
+                    state.retry_at = time.time() + state.backoff
+                    state.trips += 1
+                return
+
+            state.consecutive_timeouts = 0
+            state.breaker = 'closed'
+            #Only time replies to the first try, with a retry we can't tell which one was answered (Karn's algorithm)
+            if limit > 0 and rtt * 1000000 > limit: return
+            if state.srtt is None:
+                state.srtt, state.rttvar = rtt, rtt / 2.0
+            else:
+                state.rttvar = 0.75 * state.rttvar + 0.25 * abs(state.srtt - rtt)
+                state.srtt = 0.875 * state.srtt + 0.125 * rtt
+            state.timeout = max(state.srtt + self.TIMEOUT_VARIATIONS * state.rttvar, self.TIMEOUT_MIN)
+
+    def _send_many(self, op, varlists):
+        '''
+        Send several get or getnext PDUs at once with the Backend, see _send.
+        @return: A list of (ErrorStr, ErrorNum, ErrorInd) for each varlist.
+        '''
+        hooks = self.Instrumentation
+        state = self.agent_state() if self.AdaptiveTimeout or self.BreakerThreshold else None
+        sizes = [len(varlist) for varlist in varlists]
+        if state is not None: timeout, probe = self._open_request(self, state)
+        if hooks is not None:
+            for varbinds in sizes: hooks.request_started(self, op, varbinds)
+        if self.MIBIndex is not None:
+            for varlist in varlists: self._to_numeric(varlist)
+        start = time.time()
+        try:
+            results = self._backend.call_many([(op, varlist, ()) for varlist in varlists])
+        except:
+            if state is not None and probe: self._cancel_probe(state)
+            raise
+        finally:
+            rtt = time.time() - start
+            if state is not None: limit, self.Timeout = self.Timeout, timeout
+        if state is not None: #One round-trip for all of them, it only times out if none came back
+            self._close_request(state, rtt, min([errind == -24 for errstring, errno, errind in results]), limit)
+        with self._networkLock: self._networkTime += rtt
+        if self.MIBIndex is not None:
+            for varlist in varlists: self._from_numeric(varlist, self.UseLongNames, self.UseNumeric)
+        if hooks is not None:
+            for varlist, varbinds, (errstring, errno, errind) in zip(varlists, sizes, results):
+                error = self.error_class(errno, errind).__name__ if errstring else None
+                hooks.request_finished(self, op, varbinds, 0 if error else len(varlist), rtt, error)
+        return results
+
+    def _call(self, session, op, varlist, args):
+        if self.MIBIndex is None:
+            session._wire(op, varlist, args)
+            return
+
+        #With a MIBIndex, netsnmp only ever sees numeric OIDs, and the replies are named the way it would have with the MIBs
+        self._to_numeric(varlist)
+        useLongNames, useNumeric = session.UseLongNames, session.UseNumeric
+        session.UseLongNames, session.UseNumeric = 1, 1
+        try:
+            session._wire(op, varlist, args)
+        finally:
+            session.UseLongNames, session.UseNumeric = useLongNames, useNumeric
+        self._from_numeric(varlist, useLongNames, useNumeric)
+
+    def _wire(self, op, varlist, args):
+        #The request itself, with the netsnmp method op or the Backend
+        if self._backend is None: getattr(self, op)(*(args + (varlist,)))
+        else: self._backend.call(op, varlist, args)
+
+    def _to_numeric(self, varlist):
+        index = self.MIBIndex
+        for varbind in varlist:
+            oid = '%s.%s' % (varbind.tag, varbind.iid) if varbind.iid else varbind.tag
+            numeric = index.numeric(oid)
+            if numeric is None: raise SNMPError('Unknown object %s, it is not in the MIBIndex' % oid, None, None, varlist)
+            varbind.tag, varbind.iid = numeric, ''
+
+    def _from_numeric(self, varlist, useLongNames, useNumeric):
+        index = self.MIBIndex
+        for varbind in varlist:
+            oid = '%s.%s' % (varbind.tag, varbind.iid) if varbind.iid else varbind.tag
+            found = index.describe(oid)
+            if found is None: continue #Outside of the index, leave it numeric
+            numeric, label, longName, varbind.iid = found
+            varbind.tag = numeric if useNumeric else (longName if useLongNames else label)
+
+    def _sibling(self, number):
+        #Another session to the same agent, for the number'th PDU in flight (0 is this session)
+        if number == 0: return self
+        while len(self._siblings) < number:
+            args, kwargs = self._sessionArgs
+            self._siblings.append(self.__class__(*args, **kwargs))
+        sibling = self._siblings[number-1]
+        for name in self.SIBLING_SETTINGS:
+            if hasattr(self, name): setattr(sibling, name, getattr(self, name))
+        sibling.MaxVarbinds = self.MaxVarbinds
+        return sibling
+
+    def _pipeline(self, op, chunks):
+        #Send the chunks with up to PipelineDepth sessions at once, one thread each
+        if self._backend is not None and hasattr(self._backend, 'call_many'): return self._multiplex(op, chunks)
+        results, errors = {}, []
+        pending = list(reversed(chunks))
+        lock = threading.Lock()
+
+        def worker(session):
+            while True:
+                with lock:
+                    if not pending or errors: return
+                    start, chunk = pending.pop()
+                try:
+                    results[start] = self._request_chunk(session, op, chunk, start)
+                except SNMPError as e:
+                    with lock: errors.append((start, e))
+
+        sessions = [self._sibling(x) for x in range(min(self.PipelineDepth, len(chunks)))]
+        threads = [threading.Thread(target=worker, args=(session,)) for session in sessions[1:]]
+        for thread in threads: thread.start()
+        worker(sessions[0])
+        for thread in threads: thread.join()
+
+        if errors: raise min(errors, key=lambda error: error[0])[1] #The error for the earliest varbind
+        return [varbind for start, chunk in chunks for varbind in results[start]]
+
+    def _multiplex(self, op, chunks):
+        #Send PipelineDepth chunks at a time on the Backend's socket, no threads or extra sessions
+        results = []
+        for first in range(0, len(chunks), self.PipelineDepth):
+            batch = chunks[first:first+self.PipelineDepth]
+            varlists = [netsnmp.VarList(*chunk) for start, chunk in batch]
+            errors = self._send_many(op, varlists)
+            for (start, chunk), varlist, error in zip(batch, varlists, errors):
+                #Errors (and splitting too big chunks) are handled like a chunk sent on its own, the earliest first
+                self.ErrorStr, self.ErrorNum, self.ErrorInd = error
+                results.extend(self._request_chunk(self, op, chunk, start, varlist))
+        return results
+
+    def error_class(self, errno=None, errind=None):
+        '''
+        @return: The SNMPError subclass for a netsnmp error number and index, see ERROR_MAP.
+        '''
         #I have no idea why it sets errind to -24 for timeouts, but it does.
-        if errind == -24: raise SNMPTimeoutError(errstring, errno, errind, varlist)
-        elif errno in self.ERROR_MAP: raise self.ERROR_MAP[errno](errstring, errno, errind, varlist)
-        else: raise SNMPError(errstring, errno, errind, varlist)
+        if errind == -24: return SNMPTimeoutError
+        return self.ERROR_MAP.get(errno, SNMPError)
+
+    def raise_error(self, errstring, errno=None, errind=None, varlist=None):
+        raise self.error_class(errno, errind)(errstring, errno, errind, varlist)
     
     def __contains__(self, key):
         '''
-        Does a get on the target and returns true if there was a value there and false in all other cases (including errors).
+        Does a get on the target and returns true if there was an object there and false in all other cases (including errors).
+        It goes by the type of the result, not the value, so an object whose value is 0 or empty is still there.
         Allows operations like:
             if 'ifDescr.2' in session: ...
         @return: True if the object is in the target's MIB, false otherwise (including SNMP timeouts).
         '''
         try:
-            return True if self.get_data(key) else False
+            type = self.get_data_oids(key)[0][3]
         except SNMPError: return False
+        return type is not None and type not in _EXCEPTION_TYPES
     
     def __setitem__(self, key, value):
         '''
@@ -302,8 +1333,8 @@ class SNMPythonSession(netsnmp.Session):
         @raise SNMPError: Will raise an SNMPError on any failure -- see documentation for specific exceptions.
         '''
         if not isinstance(value, tuple): value = (value,) #Handle a single value
-        #Line up the OID and the values passed in
-        self.set_data(*[(oid, val) for oid,val in map(None,key.replace(',',' ').split(),value)] )
+        #Line up the OID and the values passed in, a missing OID or value makes an invalid set tuple
+        self.set_data(*[(oid, val) for oid,val in zip_longest(key.replace(',',' ').split(),value)] )
         
     def __getitem__(self, key):
         '''
@@ -316,6 +1347,7 @@ class SNMPythonSession(netsnmp.Session):
         ''' 
         return self.get_data(*key.replace(',',' ').split())
     
+    @_instrumented
     def get_next_data(self, *args, **kwargs):
         '''
         Perform an SNMP getnext on the provided oids. Example:
@@ -324,11 +1356,11 @@ class SNMPythonSession(netsnmp.Session):
         @return: Returns a tuple containing the results. If no result was found, None is returned for that oid.
         @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
         '''
-        varlist = netsnmp.VarList(*[netsnmp.Varbind(oid) for oid in args])
-        result = self.getnext(varlist)
-        if self.ErrorStr: self.raise_error(self.ErrorStr, self.ErrorNum, self.ErrorInd, varlist)
+        varlist = self._request('getnext', [netsnmp.Varbind(oid) for oid in args])
+        result = tuple([self._value(varbind) for varbind in varlist])
         return result[0] if len(result) == 1 else result
         
+    @_instrumented
     def get_next_data_oids(self, *args, **kwargs):
         '''
         Perform an SNMP getnext on the provided oids. This returns additional information about what was retrieved. 
@@ -345,12 +1377,11 @@ class SNMPythonSession(netsnmp.Session):
             If there was no data, it will return an entry that looks like this: ('ifEntry', '', '', 'NOSUCHOBJECT')
         @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
         '''
-        varlist = netsnmp.VarList(*[netsnmp.Varbind(oid) for oid in args])
-        self.getnext(varlist) 
-        if self.ErrorStr: self.raise_error(self.ErrorStr, self.ErrorNum, self.ErrorInd, varlist)
-        result = [(varbind.tag, varbind.iid, varbind.val, varbind.type) for varbind in varlist]
+        varlist = self._request('getnext', [netsnmp.Varbind(oid) for oid in args])
+        result = [(varbind.tag, varbind.iid, self._value(varbind), varbind.type) for varbind in varlist]
         return result[0] if len(result) == 1 else result
     
+    @_instrumented
     def get_data(self, *args, **kwargs):
         '''
         Perform an SNMP getnext on the provided oids. Example:
@@ -359,11 +1390,11 @@ class SNMPythonSession(netsnmp.Session):
         @return: Returns a tuple containing the results. If no result was found, None is returned for that oid.
         @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
         '''
-        varlist = netsnmp.VarList(*[netsnmp.Varbind(oid) for oid in args])
-        result = self.get(varlist)
-        if self.ErrorStr: self.raise_error(self.ErrorStr, self.ErrorNum, self.ErrorInd, varlist)
+        varlist = self._get(args)
+        result = tuple([self._value(varbind) for varbind in varlist])
         return result[0] if len(result) == 1 else result
     
+    @_instrumented
     def get_data_oids(self, *args, **kwargs):
         '''
         Perform an SNMP get on the provided oids. This returns additional information about what was retrieved. 
@@ -380,22 +1411,303 @@ class SNMPythonSession(netsnmp.Session):
             If there was no data, it will return an entry that looks like this: ('ifEntry', '', '', 'NOSUCHOBJECT')
         @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
         '''
-        varlist = netsnmp.VarList(*[netsnmp.Varbind(oid) for oid in args])
-        self.get(varlist)
-        if self.ErrorStr: self.raise_error(self.ErrorStr, self.ErrorNum, self.ErrorInd, varlist)
-        return [(varbind.tag, varbind.iid, varbind.val, varbind.type) for varbind in varlist]
+        varlist = self._get(args)
+        return [(varbind.tag, varbind.iid, self._value(varbind), varbind.type) for varbind in varlist]
     
+    def _value(self, varbind):
+        return decode_value(varbind.val, varbind.type) if self.DecodeValues else varbind.val
+
     def _is_oid_numeric(self, oid):
         try: 
             oidlist = oid.split('.')
             if not oidlist[1:]: return False #Catch it if there was a single name
             for x in oidlist[1:]: int(x)
+            if oidlist[0]: int(oidlist[0]) #A name with an instance, like ifDescr.1, is not numeric
         except ValueError: return False
         else: return True
     
+    def translate(self, oid):
+        '''
+        Resolve a name to its long name and numeric OID. The results are kept in TRANSLATION_CACHE (shared by all sessions),
+        so only the first lookup of a name in the process costs requests to the agent.
+        Example:
+            session.translate('ifTable').numeric #'.1.3.6.1.2.1.2.2'
+        With a MIBIndex, names in the index are translated without asking the agent at all, and first is None.
+        @warning: Without a MIBIndex, the agent has to have at least one object under the name, we find it with getnext.
+        @param oid: A name, like ifTable or ifEntry.ifDescr
+        @return: An OIDTranslation, or None if the name is not in the MIBIndex and the agent has nothing under it.
+        @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
+        '''
+        if self.MIBIndex is not None: #The index remembers its own lookups, and other sessions may not have it
+            numeric = self.MIBIndex.numeric(oid)
+            if numeric is not None: return OIDTranslation(self.MIBIndex.long_name(numeric), numeric, None)
+
+        translation = TRANSLATION_CACHE.get(oid)
+        if translation is not None: return translation
+
+        oldUseLongNames = self.UseLongNames
+        oldUseNumeric = self.UseNumeric
+        self.UseLongNames = 1 #We need long names if we're using named lookups
+        try:
+            self.UseNumeric = 0
+            fullName = self.get_next_data_oids(oid)
+            if not fullName: return None #There are no more OIDs...
+            if fullName[0].rfind(oid) == -1: return None #There wasn't anything under the table
+            root = fullName[0][:fullName[0].rfind(oid)+len(oid)]
+
+            #Long names have one label per number, so the numeric root is just as long
+            self.UseNumeric = 1
+            numericName = self.get_next_data_oids(oid)
+            numeric = ('%s.%s' % (numericName[0], numericName[1])).strip('.').split('.')
+            numeric = '.' + '.'.join(numeric[:len(root.strip('.').split('.'))])
+        finally:
+            self.UseLongNames = oldUseLongNames
+            self.UseNumeric = oldUseNumeric
+
+        translation = OIDTranslation(root, numeric, fullName[0])
+        TRANSLATION_CACHE.put(oid, translation)
+        return translation
+
+    def _subtree_root(self, oid):
+        '''
+        Find the root that every OID in the subtree starts with, as the walk will see it.
+        @return: (root, numeric) where numeric tells if the walk has to use numeric OIDs, or None if there is nothing under the OID.
+        '''
+        #Silly user is using names and put a number in, help them out!
+        if self.UseNumeric or self._is_oid_numeric(oid): return oid, True
+
+        #If we're using names, we need the full root name
+        translation = self.translate(oid)
+        if translation is None: return None
+        return translation.root, False
+
+    def _getbulk_walk(self, varbinds, numeric, nonrepeaters=0):
+        #Walks always use long names so tags can be matched against the root, put the user's settings back between pages
+        oldUseLongNames = self.UseLongNames
+        oldUseNumeric = self.UseNumeric
+        self.UseLongNames = 1
+        if numeric: self.UseNumeric = 1
+        try:
+            return self._getbulk(nonrepeaters, varbinds)
+        finally: #In case of errors, make sure we restore the old settings
+            self.UseLongNames = oldUseLongNames
+            self.UseNumeric = oldUseNumeric
+
+    def iter_subtree(self, oid):
+        '''
+        Walk all the objects under the specified OID, yielding them one getbulk reply at a time.
+        This is the streaming version of get_subtree_data_oids: memory use stays flat no matter how big the
+        subtree is, and you can start working on the data before the walk is done.
+        Example:
+            for tag, iid, value, type in session.iter_subtree('ipRouteTable'): ...
+        @warning: The results use long names, like get_subtree_data_oids.
+        With a MIBIndex, the walk compares the numeric OIDs like iter_subtree_numeric, and the replies are named after.
+        @warning: If you are using names without a MIBIndex, and it hits OIDs it cannot translate, it will stop walking there.
+        @warning: When walking with numeric OIDs, we cannot properly get the index out of tables! It will consider the last number to be the index.
+        @param oid: A single OID, named or numeric.
+        @return: A generator of (tag, iid, value, type) tuples, see get_subtree_data_oids.
+        @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
+        '''
+        if self.MIBIndex is not None:
+            named = not (self.UseNumeric or self._is_oid_numeric(oid)) #Numeric OIDs walk with numeric tags, like below
+            for tag, iid, value, type in self.iter_subtree_numeric(oid):
+                found = self.MIBIndex.describe('%s.%s' % (tag, iid) if iid else tag) if named else None
+                if found is not None: tag, iid = found[2], found[3]
+                yield (tag, iid, value, type)
+            return
+
+        found = self._subtree_root(oid)
+        if found is None: return
+        root, numeric = found
+        prefix = root + '.'
+        pages, count = 0, 0
+
+        try:
+            varlist = self._getbulk_walk([netsnmp.Varbind(oid)], numeric)
+            pages += 1
+            while varlist:
+                for varbind in varlist:
+                    #First check adds '.' to make sure it is not a similar name on next elem, 2nd checks for leaves
+                    #Names can't be ordered, iter_subtree_numeric finds the end of the tree with a binary search instead
+                    tag = varbind.tag
+                    if not tag.startswith(prefix) and tag != root: return
+                    if varbind.type in _EXCEPTION_TYPES: return #endOfMibView repeats the last OID, it is not an object
+                    count += 1
+                    yield (varbind.tag, varbind.iid, self._value(varbind), varbind.type)
+                last = (varlist[-1].tag, varlist[-1].iid)
+                varlist = self._getbulk_walk([varlist[-1]], numeric) #The next request only needs the last OID in the returned list
+                pages += 1
+                if varlist and (varlist[-1].tag, varlist[-1].iid) == last: return #The agent is looping, or at the end of its MIB
+        finally:
+            if self.Instrumentation is not None: self.Instrumentation.walk_finished(self, oid, pages, count)
+
+    def iter_subtree_numeric(self, oid):
+        '''
+        Walk all the objects under the specified OID like iter_subtree, but with numeric OIDs only: no long names are
+        needed or compared. Only the first and last OIDs of a page are parsed, into tuples of numbers, to check the
+        walk is moving forward and still in the subtree, and the end of the subtree in the last page is found with a
+        binary search. This is the fastest way to walk, use it when you don't need the names.
+        Example:
+            for tag, iid, value, type in session.iter_subtree_numeric('ifDescr'):
+                print iid, value #The last number is the ifIndex
+        Agents that get the order wrong are handled: in a page that goes backwards, OIDs that don't come after the ones
+        already walked are dropped, and the walk stops when a page has nothing new under the OID, so a looping agent
+        can't keep it going forever.
+        @param oid: A single OID, named or numeric, or a name with an instance like ifTable.1. A name is translated
+                    once, see translate.
+        @return: A generator of (tag, iid, value, type) tuples like iter_subtree, with numeric tags.
+        @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
+        '''
+        numeric = self._numeric_root(oid)
+        if numeric is None: return
+        root = _oid_tuple(numeric)
+        depth = len(root)
+        end = root[:-1] + (root[-1] + 1,) #Everything in the subtree sorts before this
+        last = root
+        pages, count = 0, 0
+
+        try:
+            varlist = self._getbulk_walk([netsnmp.Varbind(numeric)], True)
+            pages += 1
+            while varlist:
+                size = len(varlist)
+                while size and varlist[size-1].type == 'ENDOFMIBVIEW': size -= 1 #They repeat the last OID
+                if not size: return
+                try:
+                    first = _oid_tuple(varlist[0].tag, varlist[0].iid)
+                    final = _oid_tuple(varlist[size-1].tag, varlist[size-1].iid)
+                except ValueError: return #Not numeric, we are outside of what netsnmp knows
+
+                if last < first <= final: #Going forward, the usual case
+                    stop = size
+                    if final >= end: #The subtree ends in this page, find where
+                        low, stop = 0, size - 1
+                        while low < stop:
+                            middle = (low + stop) // 2
+                            varbind = varlist[middle]
+                            if _oid_tuple(varbind.tag, varbind.iid) < end: low = middle + 1
+                            else: stop = middle
+                    for position in range(stop):
+                        varbind = varlist[position]
+                        yield (varbind.tag, varbind.iid, self._value(varbind), varbind.type)
+                    count += stop
+                    if stop < size: return
+                    following, last = varlist[size-1], final
+                else: #Out of order, keep the new OIDs in the subtree and carry on from the highest
+                    following, highest = None, last
+                    for position in range(size):
+                        varbind = varlist[position]
+                        try: found = _oid_tuple(varbind.tag, varbind.iid)
+                        except ValueError: continue
+                        if found <= last or found[:depth] != root: continue
+                        count += 1
+                        yield (varbind.tag, varbind.iid, self._value(varbind), varbind.type)
+                        if found > highest: following, highest = varbind, found
+                    if following is None: return #Nothing new, the agent is looping
+                    last = highest
+                varlist = self._getbulk_walk([following], True)
+                pages += 1
+        finally:
+            if self.Instrumentation is not None: self.Instrumentation.walk_finished(self, oid, pages, count)
+
+    def _numeric_root(self, oid):
+        #The numeric OID for a name (or a name with an instance, like sysUpTime.0), None if the agent has nothing under it
+        if self._is_oid_numeric(oid): return oid
+        if self.MIBIndex is not None: return self.MIBIndex.numeric(oid)
+        name, instance = oid, ''
+        while '.' in name and name.rsplit('.', 1)[1].isdigit(): #Split the instance off, the name may have dots too
+            name, number = name.rsplit('.', 1)
+            instance = '.%s%s' % (number, instance)
+        translation = self.translate(name)
+        if translation is None: return None
+        return translation.numeric + instance
+
+    def iter_subtrees(self, *roots):
+        '''
+        Walk several subtrees (and fetch scalars) together, sharing the getbulk requests instead of walking one after the other.
+        Scalars, roots ending in .0 like sysUpTime.0, go in the first getbulk as non-repeaters. Every other root gets
+        its own repeating varbind, and drops out of the requests once its subtree is done. The OIDs are compared as
+        numbers, like iter_subtree_numeric, so agents that loop or go backwards can't keep the walk going forever.
+        Example:
+            for root, (tag, iid, value, type) in session.iter_subtrees('sysUpTime.0', 'ifTable', 'ifXTable', 'entPhysicalTable'): ...
+        @param roots: OIDs, named or numeric. A name is translated once, see translate.
+        @return: A generator of (root, (tag, iid, value, type)) as the getbulk replies come in, with numeric tags.
+                 The root is as it was given. Each subtree comes in order, but the subtrees are interleaved.
+        @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
+        '''
+        scalars, walks = [], [] #(root as given, numeric OID)
+        for root in roots:
+            numeric = self._numeric_root(root)
+            if numeric is None: continue
+            if numeric.endswith('.0'): scalars.append((root, numeric))
+            else: walks.append((root, numeric))
+
+        prefixes = [_oid_tuple(numeric) for root, numeric in walks]
+        last = list(prefixes) #The last OID walked in each subtree, everything after it has to be greater
+        cursors = [netsnmp.Varbind(numeric) for root, numeric in walks] #Where each subtree continues from
+        active = list(range(len(walks))) #Subtrees still being walked
+        #A getnext of the scalar without its .0 gets the scalar
+        nonrepeaters = [netsnmp.Varbind(numeric[:-2]) for root, numeric in scalars]
+        pages, count = 0, 0
+
+        try:
+            while nonrepeaters or active:
+                varlist = self._getbulk_walk(nonrepeaters + [cursors[walk] for walk in active], True, len(nonrepeaters))
+                pages += 1
+                if not varlist: return #Nothing came back at all, don't spin on it
+
+                for position in range(min(len(nonrepeaters), len(varlist))):
+                    varbind = varlist[position]
+                    root, numeric = scalars[position]
+                    try: found = _oid_tuple(varbind.tag, varbind.iid)
+                    except ValueError: continue
+                    if found != _oid_tuple(numeric) or varbind.type in ('ENDOFMIBVIEW', 'NOSUCHOBJECT', 'NOSUCHINSTANCE'): continue
+                    count += 1
+                    yield root, (varbind.tag, varbind.iid, self._value(varbind), varbind.type)
+
+                #After the non-repeaters, the reply is laid out repetition by repetition: walk1, walk2, ... walkN, walk1...
+                done = set()
+                for position in range(len(nonrepeaters), len(varlist)):
+                    walk = active[(position - len(nonrepeaters)) % len(active)]
+                    if walk in done: continue
+                    varbind = varlist[position]
+                    try: found = _oid_tuple(varbind.tag, varbind.iid)
+                    except ValueError: found = None
+                    prefix = prefixes[walk]
+                    #Out of the subtree, at the end of the MIB, or the agent isn't moving forward
+                    if found is None or found[:len(prefix)] != prefix or found <= last[walk] or varbind.type == 'ENDOFMIBVIEW':
+                        done.add(walk)
+                        continue
+                    last[walk] = found
+                    cursors[walk] = varbind
+                    count += 1
+                    yield walks[walk][0], (varbind.tag, varbind.iid, self._value(varbind), varbind.type)
+                nonrepeaters = []
+                active = [walk for walk in active if walk not in done]
+        finally:
+            if self.Instrumentation is not None: self.Instrumentation.walk_finished(self, list(roots), pages, count)
+
+    @_instrumented
+    def get_subtrees(self, *roots):
+        '''
+        Get several subtrees and scalars from the agent at once, see iter_subtrees.
+        Example:
+            data = session.get_subtrees('sysUpTime.0', 'sysName.0', 'ifTable', 'ifXTable')
+            uptime = data['sysUpTime.0'][0][2]
+        @param roots: OIDs, named or numeric.
+        @return: An OrderedDict of root (as given) -> list of (tag, iid, value, type) in OID order, with numeric tags.
+                 A scalar has one entry, or none if the agent doesn't have it.
+        @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
+        '''
+        results = OrderedDict((root, []) for root in roots)
+        for root, entry in self.iter_subtrees(*roots): results[root].append(entry)
+        return results
+
+    @_instrumented
     def get_subtree_data_oids(self, oid):
         '''
         Get all the objects under the specified OID. This method retrieves the data using bulkget operations to minimize the impact of latency.
+        See iter_subtree if you would rather not hold the whole subtree in memory.
         @warning: This method will turn on UseLongNames for this operation, and the results will reflect that. 
         @warning: If you are using names, and it hits OIDs it cannot translate, it will stop walking there.
         @warning: When walking with numeric OIDs, we cannot properly get the index out of tables! It will consider the last number to be the index.
@@ -410,53 +1722,9 @@ class SNMPythonSession(netsnmp.Session):
             If there was no data, it will return an entry that looks like this: ('ifEntry', '', '', 'NOSUCHOBJECT')
         @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
         '''
-        oldUseLongNames = self.UseLongNames
-        oldUseNumeric = self.UseNumeric
-        self.UseLongNames = 1 #We need long names if we're using named lookups
-        
-        try:
-            #Silly user is using names and put a number in, help them out!
-            if not self.UseNumeric and self._is_oid_numeric(oid): self.UseNumeric = 1
-            
-            #If we're using names, we need a bit of extra logic to get the full root name
-            if not self.UseNumeric:
-                #@bug: The returns here will cause loss of the original Numeric/LongNames settings
-                fullName = self.get_next_data_oids(oid)
-                if self.ErrorStr: self.raise_error(self.ErrorStr, self.ErrorNum, self.ErrorInd)
-                if not fullName: return [] #There are no more OIDs...
-                if fullName[0].rfind(oid) == -1: return [] #There wasn't anything under the table
-                root = fullName[0][:fullName[0].rfind(oid)+len(oid)]
-            else: #Otherwise, just use the full numeric OID
-                root = oid
-
-            
-            varlist = netsnmp.VarList(netsnmp.Varbind(oid))
-            results = []
-    
-            #1000 is more than you're going to fit in a PDU, just get as many as will fit
-            self.getbulk(0, 1000, varlist)
-            if self.ErrorStr: self.raise_error(self.ErrorStr, self.ErrorNum, self.ErrorInd, varlist)
-     
-            #First check adds '.' to make sure it is not a similar name on next elem, 2nd checks for leaves
-            while varlist[-1].tag.find(root+'.') == 0 or varlist[-1].tag == root:
-                #Add all the results to the current list
-                results.extend([(varbind.tag, varbind.iid, varbind.val, varbind.type) for varbind in varlist])
-                varlist = netsnmp.VarList(varlist[-1]) #The next request only needs the last OID in the returned list
-                self.getbulk(0, 1000, varlist) 
-                if self.ErrorStr: self.raise_error(self.ErrorStr, self.ErrorNum, self.ErrorInd, varlist)
-    
-            #Start scanning the individual varbinds for the one outside the tree
-            #@todo: Should be able to do this in O(logn), don't know if it'll be faster for these sizes
-            for varbind in varlist:
-                #First check adds '.' to make sure it is not a similar name on next elem, 2nd checks for leaves
-                if varbind.tag.find(root+'.') != 0 and varbind.tag != root: break
-                results.append((varbind.tag, varbind.iid, varbind.val, varbind.type))
-        finally: #In case of errors, make sure we restore the old setting
-            self.UseLongNames = oldUseLongNames 
-            self.UseNumeric = oldUseNumeric
-            
-        return results
+        return list(self.iter_subtree(oid))
         
+    @_instrumented
     def get_subtree_data(self, oid):
         '''
         Get all the objects under the specified OID. This method retrieves the data using bulkget operations to minimize the impact of latency.
@@ -465,54 +1733,9 @@ class SNMPythonSession(netsnmp.Session):
         @return: Returns a list containing each element under the OID in order. Returns None if there was no data.
         @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
         '''
-        oldUseLongNames = self.UseLongNames
-        oldUseNumeric = self.UseNumeric
-        self.UseLongNames = 1 #We need long names if we're using named lookups
-        
-        try:
-            
-            #Silly user is using names and put a number in, help them out!
-            if not self.UseNumeric and self._is_oid_numeric(oid): self.UseNumeric = 1
-            
-            #If we're using names, we need a bit of extra logic to get the full root name
-            if not self.UseNumeric:
-                #@bug: The returns here will cause loss of the original Numeric/LongNames settings
-                fullName = self.get_next_data_oids(oid)
-                if self.ErrorStr: self.raise_error(self.ErrorStr, self.ErrorNum, self.ErrorInd)
-                if not fullName: return [] #There are no more OIDs...
-                if fullName[0].rfind(oid) == -1: return [] #There wasn't anything under the table
-                root = fullName[0][:fullName[0].rfind(oid)+len(oid)]
-            else: #Otherwise, just use the full numeric OID
-                root = oid
-     
-            varlist = netsnmp.VarList(netsnmp.Varbind(oid))
-            results = []
-    
-            #1000 is more than you're going to fit in a PDU, just get as many as will fit
-            resultBuf = self.getbulk(0, 1000, varlist)
-            if self.ErrorStr: self.raise_error(self.ErrorStr, self.ErrorNum, self.ErrorInd, varlist)
-     
-            while varlist[-1].tag.find(root+'.') == 0 or varlist[-1].tag == root:
-                #@todo: Faster way to flatten these lists? :(
-                results += resultBuf #Add all the results to the current list
-                varlist = netsnmp.VarList(varlist[-1]) #The next request only needs the last OID in the returned list
-                resultBuf = self.getbulk(0, 1000, varlist) 
-                if self.ErrorStr: self.raise_error(self.ErrorStr, self.ErrorNum, self.ErrorInd, varlist)
-    
-            #Start scanning the individual varbinds for the one outside the tree
-            #@todo: Should be able to do this in O(logn), don't know if it'll be faster/worth it for these sizes
-            for varbind in varlist:
-                if varbind.tag.find(root+'.') != 0 and varbind.tag != root: break
-                results.append(varbind.val)
-        finally: #In case of errors, make sure we restore the old settings
-            self.UseLongNames = oldUseLongNames 
-            self.UseNumeric = oldUseNumeric
-        
-        self.UseLongNames = oldUseLongNames 
-        self.UseNumeric = oldUseNumeric
-        
-        return results
+        return [entry[2] for entry in self.iter_subtree_numeric(oid)]
 
+    @_instrumented
     def get_row_data(self, index, *args):
         '''
         Get the data from a table row for the specified index and columns.
@@ -520,13 +1743,24 @@ class SNMPythonSession(netsnmp.Session):
         Example: Return the ifIndex and ifDescr for interface with ifIndex 2, and print the ifDescr:
             row = session.get_row_data('2', 'ifIndex', 'ifDescr')
             print row.ifDescr
-        @param index: The index of the row to access.
-        @param columns: The 
+        Several rows can be fetched at once by giving a list of indexes, the gets are split into PDUs as needed:
+            rows = session.get_row_data(['1', '2', '3'], 'ifDescr', 'ifOperStatus')
+            print rows['2'].ifDescr
+        @param index: The index of the row to access, or a list of them.
+        @param columns: The names of the columns to get.
+        @return: A named tuple with the columns as fields, or a dictionary of them keyed by index if a list of indexes was given.
         '''
-        RowData = namedtuple('RowData', list(args), rename=True)
-        return RowData(*self.get_data(*[ arg+'.'+index for arg in args ]))
+        RowData = _row_class('RowData', args)
+        single = isinstance(index, _STRING_TYPES)
+        indicies = [index] if single else list(index)
+        varlist = self._get([arg+'.'+iid for iid in indicies for arg in args])
+        values = [self._value(varbind) for varbind in varlist]
+        width = len(args)
+        rows = [RowData(*values[x*width:(x+1)*width]) for x in range(len(indicies))]
+        return rows[0] if single else dict(zip(indicies, rows))
   
     
+    @_instrumented
     def get_table_indicies(self, oid):
         '''
         Get the indicies from a table.
@@ -535,67 +1769,249 @@ class SNMPythonSession(netsnmp.Session):
         @return: A list of the indicies (rows) in the table.
         @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
         '''
+        #The rows of the first column come first in the walk, stop as soon as we're past them
+        indicies, walk = [], self.iter_subtree(oid)
+        for tag, iid, val, type in walk:
+            if indicies and tag != firstColumn: break
+            firstColumn = tag
+            indicies.append(iid)
+        walk.close()
+        return indicies
+
+    @_instrumented
+    def get_table_columns(self, oid):
+        '''
+        Find the names of the columns that have at least one row in a table.
+        The columns are probed in batches with getnext on the entry (ifEntry.1, ifEntry.2, ...),
+        so this usually takes one or two requests no matter how many rows the table has.
+        @warning: Requires that the MIBs are loaded and names are in use.
+        @param oid: The name of the table.
+        @return: A list of column names, in column order. Empty if the table has no rows.
+        @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
+        '''
+        translation = self.translate(oid)
+        if translation is None: return [] #There wasn't anything under the table
+        if translation.first is not None: entry = translation.first.rsplit('.', 1)[0] #The long name of the table entry, the columns are right under it
+        else: entry = self.MIBIndex.long_name(translation.numeric + '.1') #Translated with the MIBIndex, the entry of a table is always .1
+
         oldUseLongNames = self.UseLongNames
         self.UseLongNames = 1
-        
+
         try:
-            fullName = self.get_next_data_oids(oid)
+            columns, subid = [], 1
+            while True:
+                #Through _request, so the probe is split like any other request for agents that take fewer varbinds
+                varlist = self._request('getnext', [netsnmp.Varbind('%s.%d' % (entry, x)) for x in range(subid, subid+self.COLUMN_PROBE_SIZE)])
+                for varbind in varlist:
+                    if varbind.tag.find(entry+'.') != 0 or varbind.type in _EXCEPTION_TYPES: break #endOfMibView repeats the probe
+                    name = varbind.tag.split('.')[-1]
+                    if name not in columns: columns.append(name)
+                #Only keep probing if the last probe still landed inside the entry
+                if varlist[-1].tag.find(entry+'.') != 0 or varlist[-1].type in _EXCEPTION_TYPES: break
+                subid += self.COLUMN_PROBE_SIZE
         finally:
             self.UseLongNames = oldUseLongNames
-            
-        if not fullName: return [] #There are no more OIDs...
-        if fullName[0].rfind(oid) == -1: return [] #There wasn't anything under the table
-        
-        #Search for all entries of the first column, and return only the index.
-        return [entry[1] for entry in self.get_subtree_data_oids(fullName[0].split('.')[-1])]
-        
 
-    def get_table(self, oid):
+        return columns
+
+    def _walk_columns(self, columns):
+        '''
+        Walk several table columns side by side, with one repeating varbind per column in each getbulk.
+        A getbulk has at most as many columns as the agent takes varbinds (MaxVarbinds, or what was learned), the
+        columns take turns when there are more.
+        For every page returned by the agent, yields a list of (column number, iid, value, type) and
+        the column numbers that are still being walked.
+        '''
+        active = list(range(len(columns))) #Column numbers still being walked, the next ones to ask for first
+        cursors = [netsnmp.Varbind(column) for column in columns] #Where each column continues from
+        roots, lastIids = {}, {}
+        pages, count = 0, 0
+        state = self.agent_state()
+
+        try:
+            while active:
+                batch = active[:self.MaxVarbinds or state.max_varbinds]
+                oldUseLongNames = self.UseLongNames
+                self.UseLongNames = 1
+                try:
+                    varlist = self._getbulk(0, [cursors[col] for col in batch])
+                except SNMPTooBigError:
+                    if len(batch) == 1 or self.MaxVarbinds: raise
+                    state.max_varbinds = max(len(batch) // 2, 1) #Too many varbinds for the agent, even with few repetitions
+                    continue
+                finally:
+                    self.UseLongNames = oldUseLongNames
+                pages += 1
+
+                #The reply is laid out repetition by repetition: col1, col2, ... colN, col1, col2...
+                page, done = [], set()
+                for pos, varbind in enumerate(varlist):
+                    col = batch[pos % len(batch)]
+                    if col in done: continue
+                    if varbind.type in _EXCEPTION_TYPES: #endOfMibView repeats the OID asked for, it is not a row
+                        done.add(col)
+                        continue
+                    if col not in roots: #First varbind of the column tells us its full name, if it has any rows
+                        if varbind.tag.split('.')[-1] != columns[col].split('.')[-1]:
+                            done.add(col)
+                            continue
+                        roots[col] = varbind.tag
+                    #Left the column, or the agent stopped making progress on it
+                    if varbind.tag != roots[col] or varbind.iid == lastIids.get(col):
+                        done.add(col)
+                        continue
+                    lastIids[col] = varbind.iid
+                    cursors[col] = varbind
+                    page.append((col, varbind.iid, self._value(varbind), varbind.type))
+
+                if not varlist: break #Nothing came back at all, don't spin on it
+                active = [col for col in active[len(batch):] + batch if col not in done]
+                count += len(page)
+                if page or not active: yield page, active
+        finally:
+            if self.Instrumentation is not None: self.Instrumentation.walk_finished(self, list(columns), pages, count)
+
+    def _iid_key(self, iid):
+        #Table indexes sort as OIDs, not as strings ('10' comes after '9')
+        try: return tuple(int(x) for x in iid.split('.'))
+        except ValueError: return None
+
+    def iter_table(self, oid, columns=None):
+        '''
+        Walk a table and yield each row as soon as all of its columns have come in.
+        The columns are walked side by side (see get_table), so rows come out a getbulk reply at a time, in index order,
+        and memory only holds the rows still waiting on a column. The rows are the same named tuples as get_table.
+        Example:
+            for index, row in session.iter_table('ipNetToMediaTable'): print index, row.ipNetToMediaPhysAddress
+        @warning: Requires that the MIBs are loaded and names are in use.
+        @param oid: The name of the table.
+        @param columns: A list of column names to fetch, all of them if not given. (Optional)
+        @return: A generator of (index, row) tuples. A cell missing from a sparse table is None.
+        @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
+        '''
+        if columns is None: columns = self.get_table_columns(oid)
+        if not columns: return
+        TableRow = _row_class('TableRow', [column.split('.')[-1] for column in columns])
+        for iid, row in self._iter_table_rows(columns):
+            yield iid, TableRow(*row)
+
+    def _iter_table_rows(self, columns, types=None):
+        #The engine behind iter_table, yields (index, list of values). If given a list, the type of each column is put in it.
+        colCount = len(columns)
+        pending = {} #Rows still waiting on a column
+        reached = {} #How far each column has been walked
+        for page, active in self._walk_columns(columns):
+            for col, iid, val, type in page:
+                if iid not in pending: pending[iid] = [None]*colCount
+                pending[iid][col] = val
+                reached[col] = self._iid_key(iid)
+                if types is not None and types[col] is None: types[col] = type
+            if not active: break
+
+            #A row is done once every column still walking has gone past it
+            horizon = [reached.get(col) for col in active]
+            if None in horizon: continue
+            horizon = min(horizon)
+            ready = []
+            for iid in pending:
+                key = self._iid_key(iid)
+                if key is not None and key <= horizon: ready.append((key, iid))
+            for key, iid in sorted(ready):
+                yield iid, pending.pop(iid)
+
+        for key, iid in sorted((self._iid_key(iid) or (), iid) for iid in pending):
+            yield iid, pending[iid]
+
+    @_instrumented
+    def get_table_columnar(self, oid, columns=None, uptime=False):
+        '''
+        Get a table as a ColumnarTable: one compact column per MIB column, with numbers stored in arrays.
+        Use this instead of get_table for big tables, or when you want to work on whole columns (summing counters, etc).
+        The columns are walked side by side, see get_table.
+        Example:
+            table = session.get_table_columnar('ifTable', columns=['ifDescr', 'ifInOctets', 'ifOutOctets'])
+            print sum(table.column('ifInOctets')), table['2'].ifDescr
+        @warning: Requires that the MIBs are loaded and names are in use.
+        @param oid: The name of the table.
+        @param columns: A list of column names to fetch, all of them if not given. (Optional)
+        @param uptime: Also get sysUpTime.0 right before the walk, so the table can be used with rates.table_rates. (Optional)
+        @return: A ColumnarTable, empty if the table has no rows.
+        @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
+        '''
+        timestamp = time.time()
+        upTime = decode_value(self.get_data('sysUpTime.0'), 'TICKS') if uptime else None
+        if columns is None: columns = self.get_table_columns(oid)
+        table = ColumnarTable([column.split('.')[-1] for column in columns], timestamp, upTime)
+        if not columns: return table
+
+        types = [None]*len(columns)
+        for iid, row in self._iter_table_rows(columns, types):
+            table.append(iid, row, types)
+        return table
+
+    @_instrumented
+    def get_table(self, oid, columns=None, parallel=False):
         '''
-        Get the data from a table object and place it into a dictionary of named tuples. 
+        Get the data from a table object and place it into a dictionary of named tuples.
         Example: For the ifIndex table, you could access the if description of interface with ifIndex 10 using:
             session.get_table('ifTable')['2'].ifDescr
+
+        Passing the columns (or parallel=True to fetch all of them) walks the columns side by side instead of
+        one after the other, with one varbind per column in each getbulk. This takes roughly a column count
+        fewer round-trips, and only fetches the columns you ask for:
+            session.get_table('ifXTable', columns=['ifName', 'ifHCInOctets', 'ifHCOutOctets'])
+        Rows are put together by index in both modes, and a cell missing from a sparse table is None.
         @warning: This method will only work with the following conditions:
             - Target OID must be a table (no leaf objects)
             - Target OID needs to be a name
             - The MIB for the table must be available to netsnmp
         @param oid: The OID of the table to query.
+        @param columns: A list of column names to fetch in parallel. (Optional)
+        @param parallel: Fetch all columns in parallel. Ignored if columns are given. (Optional)
         @return: Returns a dictionary of named tuples. The key to the dictionary is the table index, and the
-                column names are the indicies to the named tuples.
+                column names are the indicies to the named tuples. An empty dictionary if the table has no rows,
+                in every mode.
         @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
-        @raise KeyError: I'm very sure that this thing will throw keyerrors like there is no tomorrow.
-        @todo: Fix KeyError conditions tomorrow.
         '''
-        data = self.get_subtree_data_oids(oid) 
-        if not data: return []
+        if columns is not None or parallel: return dict(self.iter_table(oid, columns))
 
+        colNames, rows = self._assemble_table(self.iter_subtree(oid))
+        if not rows: return {}
+        TableRow = _row_class('TableRow', colNames)
+        colCount = len(colNames)
         resultDict = {}
-        
-        #Find the number of rows and initialize the indicies.
-        firstColName, rowCount, entryCount = data[0][0], 0, len(data)
-        for entry in data:
-            if firstColName != entry[0]: break
-            rowCount += 1
-        
-        #Get the names of all the columns
-        colCount = entryCount/rowCount
-        colNames = []
-        for col in xrange(colCount):
-            #Take the furthest right name in the OID
-            colNames.append(data[col*rowCount][0].split('.')[-1])
-        #Create a new type with names for each column
-        TableRow = namedtuple('TableRow', colNames, rename=True)
-        
-        #Load the row data into the dicitonary
-        for row in xrange(rowCount):
-            rowData = []
-            for col in xrange(colCount):
-                rowData.append(data[(col*rowCount)+row][2])
-            resultDict[data[row][1]] = TableRow(*rowData)
-            
+        for iid, row in rows.items():
+            if len(row) < colCount: row.extend([None]*(colCount - len(row))) #Missing from the last columns
+            resultDict[iid] = TableRow(*row)
         return resultDict
-            
+
+    def _assemble_table(self, entries):
+        '''
+        Put a table walked column after column (like iter_subtree does) into rows, in one pass as the entries come in.
+        Only the values are kept, not the full tag of every entry, and each column name is interned so every table
+        shares the one copy. A row missing from a column gets None in it, a row missing from the last columns comes
+        back short.
+        @param entries: An iterable of (tag, iid, value, type).
+        @return: (list of column names, dictionary of index -> list of values), the rows in the order they first came in.
+        '''
+        colNames = []
+        colNumbers = {} #Tag -> column number
+        rows = {}
+        for tag, iid, val, type in entries:
+            col = colNumbers.get(tag)
+            if col is None:
+                col = colNumbers[tag] = len(colNames)
+                colNames.append(intern(tag.split('.')[-1])) #Take the furthest right name in the OID
+            row = rows.get(iid)
+            if row is None: row = rows[iid] = []
+            if len(row) > col: #The agent sent a cell twice, keep the last one
+                row[col] = val
+                continue
+            if len(row) < col: row.extend([None]*(col - len(row))) #Missing from the columns in between
+            row.append(val)
+        return colNames, rows
     
+    @_instrumented
     def set_data(self, *args):
         '''
         Set one or more OIDs.
@@ -604,19 +2020,159 @@ class SNMPythonSession(netsnmp.Session):
             session.set_data( ('sysContact.0','Carl'), ('sysLocation.0','Ottawa') )
         There is also a shorthand:
             session['sysContact.0 sysLocation.0'] = 'Carl','Ottawa'
-        @param pair: One or more tuple pairs of (oid, value) to set.
+        @warning: A set too big for one PDU is split up, and the parts are no longer applied all-or-nothing by the agent.
+        The python backend has no MIBs to look up the types in. Values without a type get the type the object has now,
+        which costs a get first, so for new objects (or to save the get) give the type in the tuple:
+            session.set_data( ('.1.3.6.1.2.1.1.4.0','Carl','OCTETSTR') )
+        @param pair: One or more tuples of (oid, value) or (oid, value, type) to set. The type is a netsnmp type name.
         @return: Returns the varlist after the set.
         @raise SNMPError: Will raise an SNMPError on any failure -- see documentation for specific exceptions.
         '''
         for arg in args: #This is messy, but we need some way of verifying all this, or netsnmp goes all nusty fagan
-            if not isinstance(arg, tuple) or len(arg) != 2 or arg[0] == None or arg[1] == None: raise SNMPError('Invalid Set Tuple', 2, 2)
-        varlist = netsnmp.VarList(*[netsnmp.Varbind(tag=arg[0], val=arg[1]) for arg in args])
-        self.set(varlist)
-        if self.ErrorStr: self.raise_error(self.ErrorStr, self.ErrorNum, self.ErrorInd)
-        return varlist
+            if not isinstance(arg, tuple) or len(arg) not in (2, 3) or arg[0] == None or arg[1] == None: raise SNMPError('Invalid Set Tuple', 2, 2)
+        types = {}
+        untyped = [arg[0] for arg in args if len(arg) == 2]
+        if self._backend is not None and untyped: #No MIBs to look the types up in, ask the agent what they are now
+            for oid, varbind in zip(untyped, self._get(untyped)):
+                if varbind.type not in _EXCEPTION_TYPES: types[oid] = varbind.type
+        try:
+            varlist = [netsnmp.Varbind(tag=arg[0], val=arg[1], type=arg[2] if len(arg) == 3 else types.get(arg[0])) for arg in args]
+            return netsnmp.VarList(*self._request('set', varlist))
+        finally: #Even a failed set may have changed something
+            if self.ResponseCache is not None: self.ResponseCache.invalidate(self, [arg[0] for arg in args])
     
    
 
+#What changed in a table between two refreshes, see TableRefresher
+#   added: Indexes of the new rows.
+#   removed: Indexes of the rows that are gone.
+#   changed: Dictionary of index -> tuple of the names of the columns whose value changed.
+TableChanges = namedtuple('TableChanges', ['added', 'removed', 'changed'])
+
+
+class TableRefresher(object):
+    '''
+    Keeps a copy of a table up to date by only fetching the columns that change, for tables polled over and over
+    where only a few counters move and rows come and go rarely.
+        refresher = TableRefresher(session, 'ifTable', volatile=['ifInOctets', 'ifOutOctets'])
+        refresher.refresh() #The first refresh gets the whole table
+        ...
+        changes = refresher.refresh() #Later ones only fetch ifInOctets and ifOutOctets
+        print changes.added, changes.removed, changes.changed
+        print refresher.table['3'].ifDescr
+
+    There are two ways to refetch the volatile columns:
+        walk (the default): Walk just the volatile columns side by side. The walk also tells which rows exist,
+                            so added rows are found (their other columns are fetched with a get) and removed rows are dropped.
+        get: Get the volatile columns of the rows we already know, in as few requests as possible. Rows that are gone
+             are dropped, but new rows are only seen by the full walk done every full_every refreshes.
+    A row that has none of the volatile columns is checked with a get of its first other column: if that is there,
+    the volatile columns are just sparse, and the row is kept with those cells missing (None), like get_table does.
+    @ivar table: The current table, a dictionary of named tuples like get_table returns.
+    @ivar columns: The names of all the columns kept in the table.
+    '''
+
+    def __init__(self, session, oid, volatile, columns=None, method='walk', full_every=None):
+        '''
+        @param session: The SNMPythonSession to use.
+        @param oid: The name of the table.
+        @param volatile: The names of the columns to refetch on every refresh.
+        @param columns: All the columns to keep in the table. Defaults to every column the table has. (Optional)
+        @param method: 'walk' or 'get', see above. (Optional)
+        @param full_every: Do a full walk of the table every this many refreshes, None to never do one again. (Optional)
+        '''
+        if method not in ('walk', 'get'): raise ValueError("method must be 'walk' or 'get'")
+        self.session = session
+        self.oid = oid
+        self.volatile = [column.split('.')[-1] for column in volatile]
+        self.columns = None if columns is None else [column.split('.')[-1] for column in columns]
+        self.method = method
+        self.full_every = full_every
+        self.table = None
+        self._refreshes = 0
+
+    def refresh(self):
+        '''
+        Bring the table up to date.
+        @return: A TableChanges with what changed since the last refresh. On the first refresh, every row is added.
+        @raise SNMPError: Raises an SNMPError if there was an error in netsnmp during the request. This includes timeouts.
+        '''
+        full = self.table is None or (self.full_every and self._refreshes % self.full_every == 0)
+        self._refreshes += 1
+        if full: return self._full()
+        if self.method == 'walk': return self._walk()
+        return self._get()
+
+    def _full(self):
+        if self.columns is None: self.columns = self.session.get_table_columns(self.oid)
+        for column in self.volatile:
+            if column not in self.columns: self.columns.append(column)
+        self.TableRow = _row_class('TableRow', self.columns)
+        rows = dict((iid, self.TableRow(*row)) for iid, row in self.session._iter_table_rows(self.columns))
+        return self._replace(rows, self.columns)
+
+    def _replace(self, rows, columns):
+        #Swap in the new rows, and work out what changed in the given columns
+        old = self.table or {}
+        added = [iid for iid in rows if iid not in old]
+        removed = [iid for iid in old if iid not in rows]
+        changed = {}
+        positions = [self.columns.index(column) for column in columns]
+        for iid, row in rows.items():
+            before = old.get(iid)
+            if before is None: continue
+            names = tuple([self.columns[x] for x in positions if row[x] != before[x]])
+            if names: changed[iid] = names
+        self.table = rows
+        return TableChanges(added, removed, changed)
+
+    def _update(self, iid, values):
+        #The row with the volatile columns replaced
+        return self.table[iid]._replace(**dict(zip(self.volatile, values)))
+
+    def _gone(self, iids):
+        #Which of the rows the volatile columns don't have are really gone, by getting the first other column
+        #A row can just be missing from sparse volatile columns, then it stays with those cells missing (None)
+        others = [column for column in self.columns if column not in self.volatile]
+        if not iids or not others: return set(iids)
+        fetched = self.session.get_data_oids(*['%s.%s' % (others[0], iid) for iid in iids])
+        return set(iid for iid, (tag, index, val, type) in zip(iids, fetched) if type in ('NOSUCHOBJECT', 'NOSUCHINSTANCE'))
+
+    def _walk(self):
+        rows = {}
+        for iid, values in self.session._iter_table_rows(self.volatile):
+            if iid in self.table: rows[iid] = self._update(iid, values)
+            else: rows[iid] = values #New row, filled in below
+        unseen = [iid for iid in self.table if iid not in rows]
+        gone = self._gone(unseen)
+        for iid in unseen:
+            if iid not in gone: rows[iid] = self._update(iid, [None]*len(self.volatile))
+
+        #Get the rest of the columns of the new rows
+        others = [column for column in self.columns if column not in self.volatile]
+        for iid in [iid for iid in rows if iid not in self.table]:
+            values = dict(zip(self.volatile, rows[iid]))
+            if others:
+                fetched = self.session.get_data_oids(*['%s.%s' % (column, iid) for column in others])
+                for column, (tag, index, val, type) in zip(others, fetched):
+                    values[column] = None if type in ('NOSUCHOBJECT', 'NOSUCHINSTANCE') else val
+            rows[iid] = self.TableRow(*[values.get(column) for column in self.columns])
+        return self._replace(rows, self.volatile)
+
+    def _get(self):
+        iids = list(self.table)
+        oids = ['%s.%s' % (column, iid) for iid in iids for column in self.volatile]
+        fetched = self.session.get_data_oids(*oids) if oids else []
+
+        rows, unseen, width = {}, [], len(self.volatile)
+        for x, iid in enumerate(iids):
+            cells = fetched[x*width:(x+1)*width]
+            if all(type in ('NOSUCHOBJECT', 'NOSUCHINSTANCE') for tag, index, val, type in cells): unseen.append(iid)
+            rows[iid] = self._update(iid, [None if type in ('NOSUCHOBJECT', 'NOSUCHINSTANCE') else val
+                                           for tag, index, val, type in cells])
+        for iid in self._gone(unseen): del rows[iid]
+        return self._replace(rows, self.volatile)
+
 
     
     
\ No newline at end of file
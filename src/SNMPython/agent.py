@@ -0,0 +1,369 @@
+'''
+@author: Carl Verge
+@contact: carlverge@gmail.com
+@version: 12.06
+@requires: Python 3
+
+A simulated SNMP v1/v2c agent on a localhost UDP port, for benchmarks and tests without real hardware.
+'''
+
+import bisect
+import heapq
+import random
+import re
+import select
+import socket
+import threading
+import time
+
+from . import ber
+
+#snmpwalk -On output type labels -> netsnmp type names
+WALK_TYPES = {
+            'INTEGER': 'INTEGER',
+            'STRING': 'OCTETSTR',
+            'Hex-STRING': 'OCTETSTR',
+            'OID': 'OBJECTID',
+            'IpAddress': 'IPADDR',
+            'Counter32': 'COUNTER',
+            'Counter64': 'COUNTER64',
+            'Gauge32': 'GAUGE',
+            'Unsigned32': 'GAUGE',
+            'Timeticks': 'TICKS',
+            'Opaque': 'OPAQUE',
+             }
+
+_WALK_LINE = re.compile(r'^(\.?[0-9.]+) = (?:([A-Za-z0-9-]+): ?)?(.*)$')
+
+#ifTable columns for synthetic_if_table: (column, type, value for row n)
+_IF_COLUMNS = (
+             (1, 'INTEGER', lambda n: n),
+             (2, 'OCTETSTR', lambda n: ('GigabitEthernet0/%d' % n).encode('ascii')),
+             (3, 'INTEGER', lambda n: 6),
+             (4, 'INTEGER', lambda n: 1500),
+             (5, 'GAUGE', lambda n: 1000000000),
+             (6, 'OCTETSTR', lambda n: bytes((0, 0x1b, 0x21, (n >> 16) & 0xFF, (n >> 8) & 0xFF, n & 0xFF))),
+             (7, 'INTEGER', lambda n: 1),
+             (8, 'INTEGER', lambda n: 1 if n % 4 else 2),
+             (9, 'TICKS', lambda n: 100 * n),
+             (10, 'COUNTER', lambda n: (n * 7919 * 104729) % 2**32),
+             (11, 'COUNTER', lambda n: n * 1009),
+             (12, 'COUNTER', lambda n: n * 13),
+             (13, 'COUNTER', lambda n: 0),
+             (14, 'COUNTER', lambda n: n % 3),
+             (15, 'COUNTER', lambda n: 0),
+             (16, 'COUNTER', lambda n: (n * 6007 * 104729) % 2**32),
+             (17, 'COUNTER', lambda n: n * 887),
+             (18, 'COUNTER', lambda n: n * 11),
+             (19, 'COUNTER', lambda n: 0),
+             (20, 'COUNTER', lambda n: n % 5),
+             (21, 'GAUGE', lambda n: 0),
+             (22, 'OBJECTID', lambda n: (0, 0)),
+              )
+
+IF_ENTRY = (1, 3, 6, 1, 2, 1, 2, 2, 1)
+
+
+class MIBStore(object):
+    '''
+    The objects an agent serves, kept sorted by OID so getnext is a binary search.
+        store = MIBStore()
+        store.update(synthetic_if_table(1000))
+        store.set((1, 3, 6, 1, 2, 1, 1, 5, 0), 'OCTETSTR', b'router1')
+    OIDs are tuples of ints, values are in the form ber.encode_value takes.
+    '''
+    def __init__(self, objects=None):
+        '''
+        @param objects: A dictionary of OID -> (type, value), or an iterable of (OID, type, value). (Optional)
+        '''
+        self._values = {}
+        self._oids = []
+        if objects: self.update(objects)
+
+    def update(self, objects):
+        if isinstance(objects, dict): objects = [(oid, type, value) for oid, (type, value) in objects.items()]
+        for oid, type, value in objects: self._values[tuple(oid)] = (type, value)
+        self._oids = sorted(self._values)
+
+    def set(self, oid, type, value):
+        oid = tuple(oid)
+        if oid not in self._values: bisect.insort(self._oids, oid)
+        self._values[oid] = (type, value)
+
+    def get(self, oid):
+        '''
+        @return: (type, value), or ('NOSUCHINSTANCE', None) if there is no such object.
+        '''
+        return self._values.get(oid, ('NOSUCHINSTANCE', None))
+
+    def getnext(self, oid):
+        '''
+        @return: (next OID, type, value), or (oid, 'ENDOFMIBVIEW', None) past the last object.
+        '''
+        x = bisect.bisect_right(self._oids, oid)
+        if x == len(self._oids): return oid, 'ENDOFMIBVIEW', None
+        nextOid = self._oids[x]
+        type, value = self._values[nextOid]
+        return nextOid, type, value
+
+    def __contains__(self, oid):
+        return oid in self._values
+
+    def __len__(self):
+        return len(self._oids)
+
+    def __iter__(self):
+        for oid in self._oids:
+            type, value = self._values[oid]
+            yield oid, type, value
+
+
+def synthetic_if_table(rows, columns=None):
+    '''
+    Build an ifTable with the given number of rows, plus the system group, for MIBStore.
+    @param rows: The number of interfaces.
+    @param columns: The ifEntry column numbers to fill (1-22). Defaults to all of them. (Optional)
+    @return: A dictionary of OID -> (type, value)
+    '''
+    objects = {
+            (1, 3, 6, 1, 2, 1, 1, 1, 0): ('OCTETSTR', b'SNMPython simulated agent'),
+            (1, 3, 6, 1, 2, 1, 1, 2, 0): ('OBJECTID', (1, 3, 6, 1, 4, 1, 8072, 3, 2, 10)),
+            (1, 3, 6, 1, 2, 1, 1, 3, 0): ('TICKS', 123456),
+            (1, 3, 6, 1, 2, 1, 1, 5, 0): ('OCTETSTR', b'simulated'),
+            (1, 3, 6, 1, 2, 1, 2, 1, 0): ('INTEGER', rows),
+              }
+    for column, type, value in _IF_COLUMNS:
+        if columns is not None and column not in columns: continue
+        for n in range(1, rows + 1): objects[IF_ENTRY + (column, n)] = (type, value(n))
+    return objects
+
+
+def _walk_value(label, text):
+    type = WALK_TYPES.get(label)
+    if type is None: return None, None
+    if type == 'OCTETSTR':
+        if label == 'Hex-STRING': return type, bytes.fromhex(text.replace(' ', ''))
+        if len(text) >= 2 and text.startswith('"') and text.endswith('"'): text = text[1:-1]
+        return type, text.encode('utf-8')
+    if type == 'OBJECTID': return type, ber.parse_oid(text) if text.lstrip('.')[:1].isdigit() else (0, 0)
+    if type == 'IPADDR': return type, text
+    if type == 'TICKS':
+        match = re.match(r'\((\d+)\)', text)
+        return type, int(match.group(1) if match else text.split()[0])
+    if type == 'OPAQUE': return type, text.encode('utf-8')
+    #Numbers, possibly with an enum label: "up(1)" or a unit suffix: "1500 octets"
+    match = re.search(r'\((-?\d+)\)$', text)
+    return type, int(match.group(1) if match else text.split()[0])
+
+def load_walk(path):
+    '''
+    Read a recorded walk, made with 'snmpwalk -On -v2c -c public host .1 > walk.txt', for MIBStore.
+    Lines the parser doesn't understand (wrapped strings, missing objects) are skipped.
+    @param path: The file name.
+    @return: A dictionary of OID -> (type, value)
+    '''
+    objects = {}
+    with open(path) as walk:
+        for line in walk:
+            match = _WALK_LINE.match(line.rstrip('\r\n'))
+            if not match: continue
+            oid, label, text = match.groups()
+            if label is None: #'""' for an empty string
+                label, text = 'STRING', text
+            type, value = _walk_value(label, text.strip())
+            if type is None: continue
+            objects[ber.parse_oid(oid)] = (type, value)
+    return objects
+
+
+class SimulatedAgent(object):
+    '''
+    An SNMP v1/v2c agent answering get, getnext, getbulk and set from a MIBStore (or a snapshot.Snapshot, which is
+    read-only and answers sets with notWritable), on a localhost UDP port.
+    It runs in a background thread, and can add latency, drop requests and limit the size of its responses
+    to behave like a slow, lossy or small agent.
+
+    To benchmark against 10000 interfaces with a 2ms round trip:
+        agent = SimulatedAgent(MIBStore(synthetic_if_table(10000)), latency=0.002)
+        agent.start()
+        session = SNMPythonSession(DestHost=agent.address, Community='public', Version=2)
+        print(session.get_subtree_data('.1.3.6.1.2.1.2.2.1.2'))
+        print(agent.stats)
+        agent.stop()
+
+    Or use it as a context manager, which starts and stops it.
+
+    @ivar port: The UDP port the agent is listening on, once started.
+    @ivar stats: Counters: requests, responses, dropped (loss), ignored (bad community or undecodable),
+                 too_big (tooBig responses), varbinds (sent in responses), and a count per PDU type name.
+    '''
+    PDU_NAMES = {ber.GET_REQUEST: 'get', ber.GET_NEXT_REQUEST: 'getnext', ber.GET_BULK_REQUEST: 'getbulk', ber.SET_REQUEST: 'set'}
+
+    def __init__(self, store, community='public', host='127.0.0.1', port=0, latency=0.0, jitter=0.0, loss=0.0,
+                 max_size=1472, max_varbinds=None, seed=0):
+        '''
+        @param store: The MIBStore or snapshot.Snapshot to serve.
+        @param community: The community to answer to, requests with any other community are ignored.
+        @param host: The address to listen on.
+        @param port: The UDP port to listen on. Defaults to any free port, see the port attribute.
+        @param latency: Seconds to hold each response for. Requests are still handled concurrently.
+        @param jitter: Up to this many seconds are randomly added to the latency.
+        @param loss: The probability (0-1) of dropping a request without answering.
+        @param max_size: The largest response in bytes. Bigger getbulk responses are truncated, any other gets tooBig.
+        @param max_varbinds: The most varbinds the agent accepts in a request, more gets tooBig. (Optional)
+        @param seed: Random seed for the loss and jitter, so runs can be repeated.
+        '''
+        self.store = store
+        self.community = community.encode('utf-8') if isinstance(community, str) else community
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.max_size = max_size
+        self.max_varbinds = max_varbinds
+        self.stats = {}
+        self._random = random.Random(seed)
+        self._socket = None
+        self._thread = None
+        self._running = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = dict(requests=0, responses=0, dropped=0, ignored=0, too_big=0, varbinds=0,
+                          get=0, getnext=0, getbulk=0, set=0)
+
+    def start(self):
+        '''Bind the socket and start answering requests.'''
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((self.host, self.port))
+        self.port = self._socket.getsockname()[1]
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, name='SimulatedAgent:%d' % self.port)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        '''Stop answering and close the socket. Responses still held back by the latency are dropped.'''
+        self._running = False
+        if self._thread is not None: self._thread.join()
+        if self._socket is not None: self._socket.close()
+        self._thread = self._socket = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def address(self):
+        '''The DestHost for sessions talking to this agent.'''
+        return '%s:%d' % (self.host, self.port)
+
+    def _serve(self):
+        #One thread does everything. Delayed responses wait in a heap of (due time, sequence, data, address).
+        pending = []
+        sequence = 0
+        while self._running:
+            timeout = 0.05
+            if pending: timeout = min(timeout, max(pending[0][0] - time.time(), 0))
+            readable = select.select([self._socket], [], [], timeout)[0]
+            if readable:
+                data, address = self._socket.recvfrom(65535)
+                response = self.handle(data)
+                if response is not None:
+                    delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+                    if delay <= 0:
+                        self._socket.sendto(response, address)
+                    else:
+                        sequence += 1
+                        heapq.heappush(pending, (time.time() + delay, sequence, response, address))
+            now = time.time()
+            while pending and pending[0][0] <= now:
+                due, x, response, address = heapq.heappop(pending)
+                try: self._socket.sendto(response, address)
+                except socket.error: pass #The client went away
+
+    def handle(self, data):
+        '''
+        Answer one request datagram.
+        @return: The response datagram, or None if the request is ignored or dropped.
+        '''
+        self.stats['requests'] += 1
+        try: request = ber.decode_message(data)
+        except ber.BERError:
+            self.stats['ignored'] += 1
+            return None
+        if request.community != self.community or request.pdu not in self.PDU_NAMES or \
+           (request.pdu == ber.GET_BULK_REQUEST and request.version == ber.VERSION_1):
+            self.stats['ignored'] += 1
+            return None
+        if self.loss and self._random.random() < self.loss:
+            self.stats['dropped'] += 1
+            return None
+        self.stats[self.PDU_NAMES[request.pdu]] += 1
+
+        if self.max_varbinds is not None and len(request.varbinds) > self.max_varbinds: return self._too_big(request)
+        errorStatus, errorIndex, varbinds = 0, 0, []
+        if request.pdu == ber.GET_REQUEST:
+            varbinds = [(oid,) + self.store.get(oid) for oid, t, v in request.varbinds]
+        elif request.pdu == ber.GET_NEXT_REQUEST:
+            varbinds = [self.store.getnext(oid) for oid, t, v in request.varbinds]
+        elif request.pdu == ber.SET_REQUEST:
+            if not hasattr(self.store, 'set'): return self._respond(request, 17, 1, []) #notWritable, a read-only store like a Snapshot
+            for oid, type, value in request.varbinds: self.store.set(oid, type, value)
+            varbinds = request.varbinds
+        else:
+            return self._getbulk(request)
+
+        if request.version == ber.VERSION_1:
+            #v1 has no exception values, the first missing object is a noSuchName error
+            for x, (oid, type, value) in enumerate(varbinds):
+                if type in ('NOSUCHOBJECT', 'NOSUCHINSTANCE', 'ENDOFMIBVIEW'):
+                    errorStatus, errorIndex, varbinds = 2, x + 1, request.varbinds
+                    break
+        encoded = [ber.encode_varbind(*varbind) for varbind in varbinds]
+        if sum([len(x) for x in encoded]) + ber.message_overhead(request.community) > self.max_size:
+            return self._too_big(request)
+        return self._respond(request, errorStatus, errorIndex, encoded)
+
+    def _getbulk(self, request):
+        nonRepeaters = max(min(request.error_status, len(request.varbinds)), 0)
+        maxRepetitions = max(request.error_index, 0)
+        space = self.max_size - ber.message_overhead(request.community)
+        encoded = []
+
+        for oid, t, v in request.varbinds[:nonRepeaters]:
+            data = ber.encode_varbind(*self.store.getnext(oid))
+            space -= len(data)
+            if space < 0: return self._too_big(request)
+            encoded.append(data)
+        cursors = [oid for oid, t, v in request.varbinds[nonRepeaters:]]
+        for repetition in range(maxRepetitions):
+            if not cursors: break
+            done = True
+            for x, oid in enumerate(cursors):
+                varbind = self.store.getnext(oid)
+                data = ber.encode_varbind(*varbind)
+                space -= len(data)
+                if space < 0:
+                    #Out of room, send what fits (RFC 3416 4.2.3), unless nothing does
+                    if not encoded: return self._too_big(request)
+                    return self._respond(request, 0, 0, encoded)
+                encoded.append(data)
+                cursors[x] = varbind[0]
+                if varbind[1] != 'ENDOFMIBVIEW': done = False
+            if done: break
+        return self._respond(request, 0, 0, encoded)
+
+    def _too_big(self, request):
+        self.stats['too_big'] += 1
+        return self._respond(request, 1, 0, [])
+
+    def _respond(self, request, errorStatus, errorIndex, encoded):
+        self.stats['responses'] += 1
+        self.stats['varbinds'] += len(encoded)
+        return ber.encode_message(request.version, request.community, ber.RESPONSE, request.request_id,
+                                  errorStatus, errorIndex, None, encoded)
@@ -0,0 +1,362 @@
+'''
+@author: Carl Verge
+@contact: carlverge@gmail.com
+@version: 12.06
+@requires: Python 3.7
+
+An asyncio session for SNMP v1 and v2c, native to the event loop. This module needs Python 3.7, the rest of the
+package still runs on Python 2.6. Each AsyncSNMPythonSession has one UDP socket (an asyncio.DatagramProtocol), every
+request is sent on it right away, and replies are matched to the waiting requests by request id: there are no threads,
+and thousands of requests can be in flight at once from one event loop.
+
+It uses the python backend's BER codec (see the backend module), not the net-snmp library, so like Backend='python'
+it has no MIBs: use numeric OIDs or give it a MIBIndex (see the mibindex module).
+'''
+
+import asyncio
+import socket
+from collections import namedtuple
+
+from . import ber
+from .SNMPython import SNMPythonSession, SNMPError, SNMPTooBigError, decode_value
+from .backend import PythonBackend, Varbind, VarList, TIMEOUT, parse_host
+
+_EXCEPTION_TYPES = ('NOSUCHOBJECT', 'NOSUCHINSTANCE', 'ENDOFMIBVIEW')
+
+
+class _SNMPProtocol(asyncio.DatagramProtocol):
+    #The session's socket: hands each reply to the request waiting for its request id
+    def __init__(self):
+        self.transport = None
+        self.pending = {} #Request id -> the future waiting for the reply
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        try: message = ber.decode_message(data)
+        except ber.BERError: return
+        future = self.pending.get(message.request_id)
+        if future is None or future.done() or message.pdu != ber.RESPONSE: return #A late reply to a request we gave up on
+        future.set_result(message)
+
+    def error_received(self, exc):
+        pass #Eg. ICMP unreachable, the request is retried like a lost datagram
+
+    def connection_lost(self, exc):
+        for future in self.pending.values():
+            if not future.done(): future.set_exception(SNMPError('The session was closed'))
+
+
+class AsyncSNMPythonSession(object):
+    '''
+    An asyncio session with coroutine versions of the SNMPythonSession request methods, taking the same arguments and
+    giving the same results. Errors raise the same SNMPError subclasses (see SNMPythonSession.ERROR_MAP), a timeout
+    is an SNMPTimeoutError.
+
+    To start a session:
+        session = AsyncSNMPythonSession(DestHost='192.168.1.1', Community='private', Version=2)
+
+    To get variables:
+        print(await session['.1.3.6.1.2.1.1.3.0'])
+        print(await session.get_data('.1.3.6.1.2.1.1.1.0', '.1.3.6.1.2.1.1.6.0', timeout=2.0))
+        results = await asyncio.gather(*[session.get_data(oid) for oid in oids]) #All in flight at once
+
+    Checking for the existance of an object (the 'in' operator can't be awaited):
+        if await session.contains('.1.3.6.1.2.1.2.2.1.2.2'): ...
+
+    Timeouts and cancellation:
+        Each request waits Timeout microseconds for the reply and is sent again up to Retries times, like netsnmp.
+        Every method also takes an optional timeout (in seconds) for the whole call, walks and tables included: when it
+        runs out, SNMPTimeoutError is raised and nothing more is sent. Cancelling the awaiting task stops the request
+        the same way: its request id is forgotten, so there are no more retries and a late reply is dropped.
+
+    Requests with more varbinds than MaxVarbinds are split up and sent at once, and so are requests the agent answers
+    with tooBig. Walks use getbulk with MaxRepetitions (getnext with SNMP v1), halving it on tooBig. The columns of
+    get_table are walked side by side, one walk per column all in flight at once.
+    The learned limits, the response cache, instrumentation, adaptive timeouts and the circuit breaker of
+    SNMPythonSession are not used here.
+
+    Close the session when done (or use 'async with'):
+        await session.close()
+    '''
+    ERROR_MAP = SNMPythonSession.ERROR_MAP
+    error_class = SNMPythonSession.error_class
+    raise_error = SNMPythonSession.raise_error
+
+    #The getbulk max-repetitions for walks, when MaxRepetitions isn't set
+    BULK_INITIAL = 25
+
+    #The socket receive buffer we ask for, for replies to many requests arriving at once
+    RECEIVE_BUFFER = 4 * 1024 * 1024
+
+    def __init__(self, timeout=None, **kwargs):
+        '''
+        @param timeout: Default timeout in seconds for every call, None to rely on Timeout/Retries only.
+        @param kwargs: Session arguments like SNMPythonSession's (DestHost, Community, Version, RemotePort, Timeout,
+                       Retries, UseLongNames, UseNumeric), and DecodeValues, MaxRepetitions, MaxVarbinds and MIBIndex.
+        @raise ValueError: The session asks for SNMP v3.
+        '''
+        self.timeout = timeout
+        self.DecodeValues = kwargs.pop('DecodeValues', 0)
+        self.MaxRepetitions = kwargs.pop('MaxRepetitions', None)
+        self.MaxVarbinds = kwargs.pop('MaxVarbinds', None)
+        self.MIBIndex = kwargs.pop('MIBIndex', None)
+        kwargs.pop('Backend', None) #Always the python backend's codec
+        self._codec = PythonBackend(self, **kwargs) #Sets up the session attributes, it never opens its socket
+        self._connecting = None #The task making the socket, shared by the first requests
+
+    async def _connect(self):
+        loop = asyncio.get_running_loop()
+        address = parse_host(self.DestHost, int(self.RemotePort))
+        transport, protocol = await loop.create_datagram_endpoint(_SNMPProtocol, remote_addr=address)
+        try: transport.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.RECEIVE_BUFFER)
+        except OSError: pass #Keep the default buffer
+        return transport, protocol
+
+    async def _protocol(self):
+        #The socket, made on first use so it binds to the running loop
+        if self._connecting is None: self._connecting = asyncio.get_running_loop().create_task(self._connect())
+        try:
+            transport, protocol = await asyncio.shield(self._connecting) #One caller giving up doesn't stop it for the others
+        except OSError as e:
+            self._connecting = None
+            raise SNMPError('Cannot reach %s: %s' % (self.DestHost, e))
+        return protocol
+
+    def _deadline(self, timeout):
+        if timeout is None: timeout = self.timeout
+        return None if timeout is None else asyncio.get_running_loop().time() + timeout
+
+    async def _send(self, op, varlist, args, deadline):
+        #One PDU, retried on its own. The results go in the varlist, like with netsnmp
+        try: requestId, data = self._codec.encode(op, varlist, args)
+        except ValueError as e: self.raise_error(str(e), 0, 0, varlist)
+        protocol = await self._protocol()
+        loop = asyncio.get_running_loop()
+        future = protocol.pending[requestId] = loop.create_future()
+        perTry = self.Timeout / 1000000.0 if self.Timeout > 0 else 1.0
+        message = None
+        try:
+            for attempt in range(int(self.Retries) + 1):
+                wait = perTry if deadline is None else min(perTry, deadline - loop.time())
+                if wait <= 0: break
+                protocol.transport.sendto(data)
+                await asyncio.wait((future,), timeout=wait)
+                if future.done():
+                    message = future.result()
+                    break
+        finally: #Done, timed out or cancelled: a late reply has nowhere to go
+            del protocol.pending[requestId]
+            if not future.done(): future.cancel()
+        if message is None: self.raise_error('Timeout', TIMEOUT, TIMEOUT, varlist)
+        errstring, errno, errind = self._codec.apply(op, varlist, message)
+        if errstring: self.raise_error(errstring, errno, errind, varlist)
+        return varlist
+
+    async def _request(self, op, varbinds, deadline):
+        #A get, getnext or set of any size: split into PDUs of MaxVarbinds, and again on tooBig. Returns the varbinds
+        size = self.MaxVarbinds or len(varbinds)
+        chunks = [varbinds[x:x+size] for x in range(0, len(varbinds), size)]
+        if len(chunks) > 1:
+            if op == 'set': #One at a time, in order, like SNMPythonSession
+                for chunk in chunks: await self._request(op, chunk, deadline)
+                return varbinds
+            await asyncio.gather(*[self._request(op, chunk, deadline) for chunk in chunks])
+            return varbinds
+        try:
+            await self._send(op, VarList(*varbinds), (), deadline)
+        except SNMPTooBigError:
+            if len(varbinds) == 1: raise
+            half = len(varbinds) // 2
+            if op == 'set':
+                await self._request(op, varbinds[:half], deadline)
+                await self._request(op, varbinds[half:], deadline)
+            else:
+                await asyncio.gather(self._request(op, varbinds[:half], deadline), self._request(op, varbinds[half:], deadline))
+        return varbinds
+
+    def _to_numeric(self, varbinds):
+        index = self.MIBIndex
+        if index is None: return
+        for varbind in varbinds:
+            oid = '%s.%s' % (varbind.tag, varbind.iid) if varbind.iid else varbind.tag
+            numeric = index.numeric(oid)
+            if numeric is None: raise SNMPError('Unknown object %s, it is not in the MIBIndex' % oid, None, None, varbinds)
+            varbind.tag, varbind.iid = numeric, ''
+
+    def _name(self, varbind, longNames=False):
+        #Name a reply (numeric, from the codec) the way SNMPythonSession would with a MIBIndex
+        if self.MIBIndex is None or self.UseNumeric: return varbind.tag, varbind.iid
+        found = self.MIBIndex.describe('%s.%s' % (varbind.tag, varbind.iid))
+        if found is None: return varbind.tag, varbind.iid #Outside of the index, leave it numeric
+        numeric, label, longName, iid = found
+        return (longName if longNames or self.UseLongNames else label), iid
+
+    def _value(self, varbind):
+        return decode_value(varbind.val, varbind.type) if self.DecodeValues else varbind.val
+
+    async def _fetch(self, op, oids, deadline):
+        varbinds = [Varbind(oid) for oid in oids]
+        self._to_numeric(varbinds)
+        return await self._request(op, varbinds, deadline)
+
+    def _numeric_root(self, oid):
+        #The numeric OID to walk from, None if the MIBIndex doesn't know it
+        if self.MIBIndex is not None: return self.MIBIndex.numeric(oid)
+        try: ber.parse_oid(oid)
+        except ValueError: self.raise_error('Unknown Object Identifier %s, use numeric OIDs or a MIBIndex' % oid, 0, 0)
+        return oid
+
+    async def _walk(self, oid, deadline):
+        #All the varbinds under the OID, in order. The OIDs are compared as numbers, a walk that stops moving forward ends
+        numeric = self._numeric_root(oid)
+        if numeric is None: return []
+        root = ber.parse_oid(numeric)
+        depth, last, cursor = len(root), root, numeric
+        repetitions = self.MaxRepetitions or self.BULK_INITIAL
+        walked = []
+        while True:
+            varlist = VarList(Varbind(cursor))
+            try:
+                if int(self.Version) == 1: await self._send('getnext', varlist, (), deadline)
+                else: await self._send('getbulk', varlist, (0, repetitions), deadline)
+            except SNMPTooBigError:
+                if repetitions == 1: raise
+                repetitions = max(repetitions // 2, 1)
+                continue
+            if not len(varlist): return walked
+            for varbind in varlist:
+                if varbind.type in _EXCEPTION_TYPES: return walked #endOfMibView
+                found = ber.parse_oid('%s.%s' % (varbind.tag, varbind.iid))
+                if found <= last or found[:depth] != root: return walked
+                walked.append(varbind)
+                last = found
+            cursor = ber.format_oid(last)
+
+    async def get_data(self, *args, timeout=None):
+        '''See SNMPythonSession.get_data'''
+        varbinds = await self._fetch('get', args, self._deadline(timeout))
+        result = tuple([self._value(varbind) for varbind in varbinds])
+        return result[0] if len(result) == 1 else result
+
+    async def get_data_oids(self, *args, timeout=None):
+        '''See SNMPythonSession.get_data_oids'''
+        varbinds = await self._fetch('get', args, self._deadline(timeout))
+        return [self._name(varbind) + (self._value(varbind), varbind.type) for varbind in varbinds]
+
+    async def get_next_data(self, *args, timeout=None):
+        '''See SNMPythonSession.get_next_data'''
+        varbinds = await self._fetch('getnext', args, self._deadline(timeout))
+        result = tuple([self._value(varbind) for varbind in varbinds])
+        return result[0] if len(result) == 1 else result
+
+    async def get_next_data_oids(self, *args, timeout=None):
+        '''See SNMPythonSession.get_next_data_oids'''
+        varbinds = await self._fetch('getnext', args, self._deadline(timeout))
+        result = [self._name(varbind) + (self._value(varbind), varbind.type) for varbind in varbinds]
+        return result[0] if len(result) == 1 else result
+
+    async def get_subtree_data(self, oid, timeout=None):
+        '''See SNMPythonSession.get_subtree_data'''
+        return [self._value(varbind) for varbind in await self._walk(oid, self._deadline(timeout))]
+
+    async def get_subtree_data_oids(self, oid, timeout=None):
+        '''See SNMPythonSession.get_subtree_data_oids, the names are long names when a MIBIndex is used.'''
+        return [self._name(varbind, True) + (self._value(varbind), varbind.type)
+                for varbind in await self._walk(oid, self._deadline(timeout))]
+
+    async def get_row_data(self, index, *args, timeout=None):
+        '''See SNMPythonSession.get_row_data'''
+        RowData = namedtuple('RowData', [arg.split('.')[-1] for arg in args], rename=True)
+        single = isinstance(index, str)
+        indicies = [index] if single else list(index)
+        varbinds = await self._fetch('get', [arg+'.'+iid for iid in indicies for arg in args], self._deadline(timeout))
+        values = [self._value(varbind) for varbind in varbinds]
+        width = len(args)
+        rows = [RowData(*values[x*width:(x+1)*width]) for x in range(len(indicies))]
+        return rows[0] if single else dict(zip(indicies, rows))
+
+    async def get_table_indicies(self, oid, timeout=None):
+        '''See SNMPythonSession.get_table_indicies'''
+        indicies, firstColumn = [], None
+        for varbind in await self._walk(oid, self._deadline(timeout)):
+            tag, iid = self._name(varbind, True)
+            if indicies and tag != firstColumn: break
+            firstColumn = tag
+            indicies.append(iid)
+        return indicies
+
+    async def get_table(self, oid, columns=None, timeout=None):
+        '''
+        See SNMPythonSession.get_table. Without columns the table is walked in one pass, with them the columns are
+        walked side by side, all in flight at once.
+        @return: A dictionary of named tuples keyed by index, empty if the table has no rows. A missing cell is None.
+        '''
+        deadline = self._deadline(timeout)
+        if columns is None:
+            walks = [await self._walk(oid, deadline)]
+        else:
+            walks = await asyncio.gather(*[self._walk(column, deadline) for column in columns])
+        names, numbers, rows = [], {}, {}
+        for walk in walks:
+            for varbind in walk:
+                tag, iid = self._name(varbind, True)
+                col = numbers.get(tag)
+                if col is None:
+                    col = numbers[tag] = len(names)
+                    names.append(tag.split('.')[-1])
+                rows.setdefault(iid, {})[col] = self._value(varbind)
+        if columns is not None: names = [column.split('.')[-1] for column in columns] #Even the ones with no rows
+        if not rows: return {}
+        TableRow = namedtuple('TableRow', names, rename=True)
+        return dict((iid, TableRow(*[row.get(col) for col in range(len(names))])) for iid, row in rows.items())
+
+    async def set_data(self, *args, timeout=None):
+        '''See SNMPythonSession.set_data. Values without a type get the type the object has now, with a get first.'''
+        deadline = self._deadline(timeout)
+        for arg in args:
+            if len(arg) not in (2, 3): raise SNMPError('Invalid set tuple %r, it needs an OID and a value' % (arg,))
+        types = {}
+        untyped = [arg[0] for arg in args if len(arg) == 2]
+        if untyped:
+            for oid, varbind in zip(untyped, await self._fetch('get', untyped, deadline)):
+                if varbind.type not in _EXCEPTION_TYPES: types[oid] = varbind.type
+        varbinds = [Varbind(arg[0], val=arg[1], type=arg[2] if len(arg) == 3 else types.get(arg[0])) for arg in args]
+        self._to_numeric(varbinds)
+        await self._request('set', varbinds, deadline)
+        return varbinds
+
+    def __getitem__(self, key):
+        '''
+        Does an snmp get on the target for one or more varbinds. Returns an awaitable:
+            print(await session['.1.3.6.1.2.1.2.2.1.2.2 .1.3.6.1.2.1.2.2.1.8.2'])
+        @return: Awaits to a single value if one OID was given, or a tuple of values if multiple OIDs were given.
+        '''
+        return self.get_data(*key.replace(',', ' ').split())
+
+    def __contains__(self, key):
+        raise TypeError("The 'in' operator can't be awaited, use 'await session.contains(key)'")
+
+    async def contains(self, key, timeout=None):
+        '''
+        Async version of 'key in session', see SNMPythonSession.__contains__
+        @return: True if the object is in the target's MIB, false otherwise (including SNMP timeouts).
+        '''
+        try: varbinds = await self._fetch('get', [key], self._deadline(timeout))
+        except SNMPError: return False
+        return varbinds[0].type not in _EXCEPTION_TYPES
+
+    async def close(self):
+        '''Close the socket. Requests still waiting for a reply raise SNMPError.'''
+        connecting, self._connecting = self._connecting, None
+        if connecting is None: return
+        try: transport, protocol = await connecting
+        except Exception: return
+        transport.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
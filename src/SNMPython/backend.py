@@ -0,0 +1,303 @@
+'''
+@author: Carl Verge
+@contact: carlverge@gmail.com
+@version: 12.06
+@requires: Python 3
+
+A pure python backend for SNMPythonSession: SNMP v1/v2c over plain UDP sockets with the ber codec,
+in place of the net-snmp C library. Select it with the Backend constructor flag:
+    session = SNMPythonSession(DestHost='192.168.1.1', Community='private', Version=2, Backend='python')
+
+The backend has no MIBs, so use numeric OIDs or give the session a MIBIndex (see the mibindex module).
+Values come back as strings like they do from netsnmp. Octet strings are decoded as latin-1, one character per byte,
+so binary values like MAC addresses survive: val.encode('latin-1') gives the bytes back.
+Sets need the type in the varbind (netsnmp.Varbind(tag, iid, val, 'INTEGER')), there is no MIB to look it up in:
+set_data takes it as the third item of the set tuple, session.set_data(('.1.3.6.1.2.1.1.4.0', 'Carl', 'OCTETSTR')),
+and otherwise gets the object first to use the type it has now.
+
+The backend doesn't need the net-snmp python bindings. Without them, SNMPython uses the Varbind, VarList and Session
+stand-ins below in their place, and Backend='python' is the default.
+
+Any number of requests can be in flight at once on the one socket, matched up by request id: the session uses this
+to send a split get or getnext all at once when pipelining, instead of a thread and a netsnmp session per PDU.
+'''
+
+import random
+import re
+import select
+import socket
+import time
+
+from . import ber
+
+#The session attributes the backend sets up, with the same defaults as netsnmp (except the version)
+SESSION_DEFAULTS = {
+                'DestHost': 'localhost',
+                'Community': 'public',
+                'Version': 2,
+                'RemotePort': 161,
+                'Timeout': 1000000, #Microseconds
+                'Retries': 3,
+                'UseLongNames': 0,
+                'UseNumeric': 0,
+                'UseSprintValue': 0,
+                'UseEnums': 0,
+                'ErrorStr': '',
+                'ErrorNum': 0,
+                'ErrorInd': 0,
+               }
+
+#What netsnmp reports for a timeout, in both ErrorNum and ErrorInd
+TIMEOUT = -24
+
+#Error status names, the ErrorStr of a response with that error status
+ERROR_NAMES = ('noError', 'tooBig', 'noSuchName', 'badValue', 'readOnly', 'genErr', 'noAccess', 'wrongType', 'wrongLength',
+               'wrongEncoding', 'wrongValue', 'noCreation', 'inconsistentValue', 'resourceUnavailable', 'commitFailed',
+               'undoFailed', 'authorizationError', 'notWritable', 'inconsistentName')
+
+PDU_TYPES = {'get': ber.GET_REQUEST, 'getnext': ber.GET_NEXT_REQUEST, 'getbulk': ber.GET_BULK_REQUEST, 'set': ber.SET_REQUEST}
+
+STRING_ENCODING = 'latin-1'
+
+#How netsnmp splits a tag into the object and instance when no iid is given
+_TAG_IID = re.compile(r'^((?:\.\d+)+|(?:\w+(?:[-:]*\w+)+))\.?(.*)$')
+
+
+def parse_host(host, port=161):
+    '''
+    Split a netsnmp style DestHost ('host', 'host:port', 'udp:host:port', '[::1]:port', 'udp6:[::1]:port') into (host, port).
+    '''
+    for prefix in ('udp:', 'udp6:'):
+        if host.startswith(prefix): host = host[len(prefix):]
+    if host.startswith('['):
+        end = host.index(']')
+        if host[end+1:end+2] == ':': port = int(host[end+2:])
+        return host[1:end], port
+    if host.count(':') == 1:
+        host, port = host.split(':')
+        port = int(port)
+    return host, port
+
+
+def ber_value(type, val):
+    '''
+    Convert a netsnmp style value (a string, usually) of the given netsnmp type to the form ber.encode_value takes.
+    '''
+    if isinstance(val, str) and type in ('OCTETSTR', 'OPAQUE'):
+        try: return val.encode(STRING_ENCODING)
+        except UnicodeEncodeError: return val.encode('utf-8')
+    return val
+
+
+def netsnmp_value(type, value):
+    '''
+    Convert a value decoded by ber to the string netsnmp would have returned for it, see the module documentation.
+    '''
+    if value is None: return None
+    if type in ('OCTETSTR', 'OPAQUE'): return value.decode(STRING_ENCODING)
+    if type == 'OBJECTID': return ber.format_oid(value)
+    if type == 'IPADDR': return value
+    return str(value)
+
+
+class Varbind(object):
+    '''
+    Stands in for netsnmp.Varbind when the net-snmp python bindings aren't installed, with the same attributes.
+    '''
+    def __init__(self, tag=None, iid=None, val=None, type=None):
+        self.tag = tag
+        self.iid = iid
+        self.val = val
+        self.type = type
+        if iid is None and tag is not None: #Split the instance off like netsnmp does
+            match = _TAG_IID.match(str(tag))
+            if match: self.tag, self.iid = match.groups()
+
+    def __repr__(self):
+        return 'Varbind(%r, %r, %r, %r)' % (self.tag, self.iid, self.val, self.type)
+
+class VarList(object):
+    '''
+    Stands in for netsnmp.VarList, see Varbind. Arguments that aren't Varbinds are taken as tags.
+    '''
+    def __init__(self, *varbinds):
+        self.varbinds = [varbind if isinstance(varbind, Varbind) else Varbind(varbind) for varbind in varbinds]
+
+    def __len__(self): return len(self.varbinds)
+    def __getitem__(self, index): return self.varbinds[index]
+    def __setitem__(self, index, varbind): self.varbinds[index] = varbind
+    def __iter__(self): return iter(self.varbinds)
+    def append(self, varbind): self.varbinds.append(varbind)
+
+class Session(object):
+    '''
+    Stands in for netsnmp.Session as the base class of SNMPythonSession, see Varbind. Only the python backend works with it.
+    '''
+    pass
+
+
+class PythonBackend(object):
+    '''
+    Sends a session's requests with a UDP socket, see the module documentation.
+    The session settings are read on every request (DestHost, Community, Version, Timeout, Retries...), and the
+    results and errors are put in the varlists and ErrorStr/ErrorNum/ErrorInd just like the netsnmp methods do.
+    '''
+    #The largest datagram we can receive
+    BUFFER_SIZE = 65535
+
+    def __init__(self, session, **kwargs):
+        '''
+        @param session: The session to send the requests for. Its attributes are set up here, in place of netsnmp.Session.__init__
+        @param kwargs: The session arguments (DestHost, Community, Version, Timeout, Retries...)
+        @raise ValueError: The session asks for SNMP v3.
+        '''
+        for name, value in SESSION_DEFAULTS.items(): setattr(session, name, value)
+        for name, value in kwargs.items(): setattr(session, name, value)
+        if int(session.Version) not in (1, 2): raise ValueError('The python backend only supports SNMP v1 and v2c')
+        self.session = session
+        self._socket = None
+        self._target = None
+        self._buffer = bytearray(self.BUFFER_SIZE)
+        self._requestId = random.randrange(1, 2**30)
+
+    def _connection(self):
+        #The socket, connected to the session's agent. A new one if DestHost or RemotePort changed.
+        session = self.session
+        target = (session.DestHost, session.RemotePort)
+        if self._socket is None or target != self._target:
+            self.close()
+            host, port = parse_host(session.DestHost, int(session.RemotePort))
+            family, type, proto, name, address = socket.getaddrinfo(host, port, 0, socket.SOCK_DGRAM)[0]
+            self._socket = socket.socket(family, socket.SOCK_DGRAM)
+            self._socket.connect(address) #Only the agent's replies get through
+            self._socket.setblocking(False)
+            self._target = target
+        return self._socket
+
+    def close(self):
+        if self._socket is not None: self._socket.close()
+        self._socket = None
+
+    def encode(self, op, varlist, args=()):
+        '''
+        Build the datagram for a request, with the next request id. See call for the arguments.
+        @return: (request id, datagram)
+        @raise ValueError: The request can't be sent, the message is the ErrorStr (eg. an OID that isn't numeric).
+        '''
+        session = self.session
+        version = ber.VERSION_1 if int(session.Version) == 1 else ber.VERSION_2C
+        if op == 'getbulk' and version == ber.VERSION_1: raise ValueError('getbulk needs SNMP v2c')
+        varbinds = []
+        for varbind in varlist:
+            oid = '%s.%s' % (varbind.tag, varbind.iid) if varbind.iid else varbind.tag
+            try: oid = ber.parse_oid(oid)
+            except ValueError: raise ValueError('Unknown Object Identifier %s, the python backend needs numeric OIDs or a MIBIndex' % oid)
+            if op == 'set':
+                if varbind.type is None: raise ValueError('Type of value unknown for %s, the python backend needs a type for sets (a third item in the set tuple)' % varbind.tag)
+                varbinds.append((oid, varbind.type, ber_value(varbind.type, varbind.val)))
+            else:
+                varbinds.append((oid, 'NULL', None))
+        errorStatus, errorIndex = args if op == 'getbulk' else (0, 0) #Non-repeaters and max-repetitions go in their place
+        self._requestId = self._requestId % (2**31 - 1) + 1
+        try:
+            data = ber.encode_message(version, session.Community, PDU_TYPES[op], self._requestId, errorStatus, errorIndex, varbinds)
+        except ber.BERError as e: raise ValueError(str(e))
+        return self._requestId, data
+
+    def call(self, op, varlist, args=()):
+        '''
+        Send one request and wait for the reply, like the netsnmp Session method op.
+        @param op: get, getnext, getbulk or set.
+        @param varlist: The netsnmp.VarList, updated with the results.
+        @param args: (non-repeaters, max-repetitions) for getbulk.
+        @return: A tuple of the values, or None on errors.
+        '''
+        session = self.session
+        session.ErrorStr, session.ErrorNum, session.ErrorInd = self.call_many([(op, varlist, args)])[0]
+        if session.ErrorStr: return None
+        return tuple([varbind.val for varbind in varlist])
+
+    def call_many(self, requests):
+        '''
+        Send several requests at once and wait for all the replies. Each is retried on its own.
+        @param requests: A list of (op, varlist, args), see call.
+        @return: A list of (ErrorStr, ErrorNum, ErrorInd) for each request, ('', 0, 0) if it worked.
+        '''
+        session = self.session
+        results = [('', 0, 0)]*len(requests)
+        pending = {} #Request id -> [position, datagram, deadline, tries]
+        for position, (op, varlist, args) in enumerate(requests):
+            try: requestId, data = self.encode(op, varlist, args)
+            except ValueError as e:
+                results[position] = (str(e), 0, 0)
+                continue
+            pending[requestId] = [position, data, None, 0]
+        if not pending: return results
+
+        sock = self._connection()
+        timeout = session.Timeout / 1000000.0 if session.Timeout > 0 else 1.0
+        now = time.time()
+        for entry in pending.values():
+            self._transmit(sock, entry, now + timeout)
+
+        while pending:
+            wait = min([entry[2] for entry in pending.values()]) - time.time()
+            if wait > 0:
+                if select.select([sock], [], [], wait)[0]: self._receive(sock, pending, requests, results)
+                continue
+            now = time.time()
+            for requestId, entry in list(pending.items()):
+                if entry[2] > now: continue
+                if entry[3] >= session.Retries:
+                    results[entry[0]] = ('Timeout', TIMEOUT, TIMEOUT)
+                    del pending[requestId]
+                else:
+                    entry[3] += 1
+                    self._transmit(sock, entry, now + timeout)
+        return results
+
+    def _transmit(self, sock, entry, deadline):
+        entry[2] = deadline
+        try: sock.send(entry[1])
+        except socket.error: pass #Eg. ICMP unreachable from an earlier send, it is retried like a lost datagram
+
+    def _receive(self, sock, pending, requests, results):
+        #Read every datagram waiting on the socket. They are decoded straight out of the receive buffer.
+        view = memoryview(self._buffer)
+        while pending:
+            try: size = sock.recv_into(self._buffer)
+            except (BlockingIOError, InterruptedError): return
+            except socket.error: return #ICMP errors, the request times out like it would with netsnmp
+            try: message = ber.decode_message(view[:size])
+            except ber.BERError: continue
+            entry = pending.get(message.request_id)
+            if entry is None or message.pdu != ber.RESPONSE: continue #A late reply to an earlier request
+            del pending[message.request_id]
+            op, varlist, args = requests[entry[0]]
+            results[entry[0]] = self.apply(op, varlist, message)
+
+    def apply(self, op, varlist, message):
+        '''
+        Put the reply to a request in its varlist, see encode.
+        @param message: The ber.Message of the reply.
+        @return: (ErrorStr, ErrorNum, ErrorInd), ('', 0, 0) if it worked.
+        '''
+        if message.error_status:
+            status = message.error_status
+            name = ERROR_NAMES[status] if status < len(ERROR_NAMES) else 'error %d' % status
+            return '(%s) The agent returned an error' % name, status, message.error_index
+        if op == 'getbulk':
+            varbindClass = varlist[0].__class__
+            varlist.varbinds[:] = [self._varbind(varbindClass(), *varbind) for varbind in message.varbinds]
+        elif op != 'set':
+            if len(message.varbinds) != len(varlist): return 'The reply has the wrong number of varbinds', 0, 0
+            for varbind, result in zip(varlist, message.varbinds): self._varbind(varbind, *result)
+        return '', 0, 0
+
+    def _varbind(self, varbind, oid, type, value):
+        #Without MIBs, netsnmp splits the tag and iid at the last number
+        varbind.tag = ber.format_oid(oid[:-1])
+        varbind.iid = str(oid[-1])
+        varbind.type = type
+        varbind.val = netsnmp_value(type, value)
+        return varbind
@@ -0,0 +1,220 @@
+'''
+@author: Carl Verge
+@contact: carlverge@gmail.com
+@version: 12.06
+@requires: Python 3
+
+Benchmarks for the session's walks, tables and gets against a SimulatedAgent on localhost, so results can be
+repeated anywhere and compared between versions. From the command line:
+    python -m SNMPython.benchmark --rows 5000 --latency 0.002
+    python -m SNMPython.benchmark --walk router1.walk --scenarios subtree --json results.json
+
+For each scenario it reports the throughput in varbinds per second, the time spent in python rather than waiting on
+the agent (see SessionHooks), the latency percentiles of the individual requests, the requests sent and PDUs answered
+by the agent, and the peak memory (measured in one extra run with tracemalloc, so it doesn't slow down the timed runs).
+The table scenarios need the name ifTable: IF-MIB loaded in netsnmp, or a --mib-index with the python backend.
+Without it they are skipped, the others are numeric.
+'''
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+from .SNMPython import SNMPythonSession, SessionHooks, SNMPError
+from .agent import SimulatedAgent, MIBStore, synthetic_if_table, load_walk, IF_ENTRY
+from .ber import format_oid
+from .mibindex import MIBIndex
+
+IF_DESCR = format_oid(IF_ENTRY + (2,))
+
+#Scenario name -> (description, function(session, options) returning the number of varbinds fetched, needs names)
+SCENARIOS = {}
+
+def scenario(name, description, names=False):
+    #names: The scenario needs ifTable's name to be known, see _can_name
+    def register(function):
+        SCENARIOS[name] = (description, function, names)
+        return function
+    return register
+
+@scenario('subtree', 'get_subtree_data of a column (or --root)')
+def _subtree(session, options):
+    return len(session.get_subtree_data(options.root or IF_DESCR))
+
+@scenario('table', 'get_table of ifTable, one column after the other', names=True)
+def _table(session, options):
+    table = session.get_table('ifTable')
+    return sum([len(row) for row in table.values()])
+
+@scenario('table-parallel', 'get_table of ifTable, all columns side by side', names=True)
+def _table_parallel(session, options):
+    table = session.get_table('ifTable', parallel=True)
+    return sum([len(row) for row in table.values()])
+
+@scenario('get', 'get_data of --get-oids instances of ifDescr')
+def _get(session, options):
+    oids = ['%s.%d' % (IF_DESCR, x) for x in range(1, options.get_oids + 1)]
+    return len(session.get_data(*oids))
+
+
+class BenchmarkHooks(SessionHooks):
+    '''
+    Instrumentation that keeps the round-trip of every request, and the python side time of every call.
+    '''
+    def __init__(self):
+        self.latencies = []
+        self.assembly = 0.0
+
+    def request_finished(self, session, op, varbinds, returned, rtt, error):
+        self.latencies.append(rtt)
+
+    def call_finished(self, session, method, elapsed, assembly, error):
+        self.assembly += assembly
+
+
+def percentile(values, fraction):
+    '''
+    @return: The nearest-rank percentile of the sorted values, eg. fraction=0.99 for the 99th. None if there are no values.
+    '''
+    if not values: return None
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def _can_name(agent, session_kwargs):
+    #Is ifTable known by name, from netsnmp's MIBs or the MIBIndex?
+    session = SNMPythonSession(DestHost=agent.address, **session_kwargs)
+    try: return session.translate('ifTable') is not None
+    except SNMPError: return False
+
+
+def run_scenario(name, agent, options, session_kwargs):
+    '''
+    Run one scenario options.repeat times against the agent, plus once more to measure the peak memory.
+    @return: A dictionary of the results.
+    '''
+    description, function, names = SCENARIOS[name]
+    session = SNMPythonSession(DestHost=agent.address, **session_kwargs)
+    session.reset_agent_state() #Start from scratch, not from what the previous scenario learned about the agent
+    if options.warmup: function(session, options)
+
+    hooks = session.Instrumentation = BenchmarkHooks()
+    agent.reset_stats()
+    varbinds, elapsed = 0, 0.0
+    for x in range(options.repeat):
+        start = time.perf_counter()
+        varbinds += function(session, options)
+        elapsed += time.perf_counter() - start
+    latencies = sorted(hooks.latencies)
+    stats = dict(agent.stats)
+
+    session.Instrumentation = None
+    tracemalloc.start()
+    try:
+        function(session, options)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+            'scenario': name,
+            'runs': options.repeat,
+            'seconds': elapsed,
+            'varbinds': varbinds,
+            'varbinds_per_second': varbinds / elapsed if elapsed else None,
+            'assembly_seconds': hooks.assembly,
+            'requests': len(latencies),
+            'pdus': stats['responses'],
+            'too_big': stats['too_big'],
+            'dropped': stats['dropped'],
+            'latency_ms': dict((label, None if value is None else value * 1000) for label, value in
+                               (('p50', percentile(latencies, 0.5)), ('p90', percentile(latencies, 0.9)),
+                                ('p99', percentile(latencies, 0.99)), ('max', latencies[-1] if latencies else None))),
+            'peak_memory_kib': peak / 1024.0,
+           }
+
+
+def run_benchmarks(store, scenarios, options, **session_kwargs):
+    '''
+    Start a SimulatedAgent for the store with the options' latency, loss and size limits, and run the scenarios against it.
+    Scenarios that need names are skipped (with a note on stderr) when ifTable can't be named.
+    @param store: The MIBStore to serve.
+    @param scenarios: The scenario names to run, see SCENARIOS.
+    @param options: The parsed command line options (see main), or anything with the same attributes.
+    @param session_kwargs: Extra SNMPythonSession arguments (MaxRepetitions, PipelineDepth, MIBIndex...)
+    @return: A list of result dictionaries, one per scenario that ran.
+    '''
+    agent = SimulatedAgent(store, community=options.community, latency=options.latency, jitter=options.jitter,
+                           loss=options.loss, max_size=options.max_size, max_varbinds=options.max_varbinds, seed=options.seed)
+    session_kwargs.setdefault('Community', options.community)
+    session_kwargs.setdefault('Version', 2)
+    session_kwargs.setdefault('Timeout', int(options.timeout * 1000000))
+    session_kwargs.setdefault('Retries', options.retries)
+    with agent:
+        named = [name for name in scenarios if SCENARIOS[name][2]]
+        if named and not _can_name(agent, session_kwargs):
+            sys.stderr.write('Skipping %s: ifTable has no name, load IF-MIB or give a --mib-index\n' % ', '.join(named))
+            scenarios = [name for name in scenarios if name not in named]
+        return [run_scenario(name, agent, options, session_kwargs) for name in scenarios]
+
+
+def _format(value, spec):
+    return '-' if value is None else spec % value
+
+def report(results, out=sys.stdout):
+    '''Print the results as a table.'''
+    header = '%-15s %10s %12s %10s %9s %7s %8s %8s %8s %8s %11s' % (
+             'scenario', 'varbinds', 'varbinds/s', 'python s', 'requests', 'pdus', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'peak KiB')
+    out.write(header + '\n' + '-' * len(header) + '\n')
+    for result in results:
+        latency = result['latency_ms']
+        out.write('%-15s %10d %12s %10.3f %9d %7d %8s %8s %8s %8s %11.1f\n' % (
+                  result['scenario'], result['varbinds'], _format(result['varbinds_per_second'], '%.0f'), result['assembly_seconds'],
+                  result['requests'], result['pdus'], _format(latency['p50'], '%.2f'), _format(latency['p90'], '%.2f'),
+                  _format(latency['p99'], '%.2f'), _format(latency['max'], '%.2f'), result['peak_memory_kib']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m SNMPython.benchmark', description=__doc__.split('\n\n')[1].strip())
+    parser.add_argument('--scenarios', default=','.join(sorted(SCENARIOS)),
+                        help='Comma separated scenarios to run: %s' % ', '.join(sorted(SCENARIOS)))
+    parser.add_argument('--rows', type=int, default=1000, help='Rows in the synthetic ifTable')
+    parser.add_argument('--walk', help="Serve a recorded walk (snmpwalk -On output) instead of the synthetic ifTable")
+    parser.add_argument('--root', help='The subtree the subtree scenario walks, numeric. Defaults to ifDescr')
+    parser.add_argument('--get-oids', type=int, default=100, help='OIDs fetched by the get scenario')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs of each scenario')
+    parser.add_argument('--no-warmup', dest='warmup', action='store_false', help="Don't run each scenario once before timing it")
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds the agent holds each response for')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many seconds are randomly added to the latency')
+    parser.add_argument('--loss', type=float, default=0.0, help='Probability (0-1) of the agent dropping a request')
+    parser.add_argument('--max-size', type=int, default=1472, help='Largest response PDU in bytes')
+    parser.add_argument('--max-varbinds', type=int, help='Most varbinds the agent accepts in a request')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the loss and jitter')
+    parser.add_argument('--community', default='public')
+    parser.add_argument('--timeout', type=float, default=1.0, help='Session timeout in seconds')
+    parser.add_argument('--retries', type=int, default=3, help='Session retries')
+    parser.add_argument('--max-repetitions', type=int, help='Fixed getbulk max-repetitions, instead of learning it')
+    parser.add_argument('--pipeline-depth', type=int, default=1, help='PDUs of a split get in flight at once')
+    parser.add_argument('--backend', help="The session Backend, 'netsnmp' or 'python'. Defaults to the session's default")
+    parser.add_argument('--mib-index', help='A MIB index file (see the mibindex module) to name OIDs with instead of MIBs')
+    parser.add_argument('--json', help='Also write the results to this file, for comparing runs')
+    options = parser.parse_args(argv)
+
+    scenarios = [name.strip() for name in options.scenarios.split(',') if name.strip()]
+    for name in scenarios:
+        if name not in SCENARIOS: parser.error('Unknown scenario %s' % name)
+    store = MIBStore(load_walk(options.walk) if options.walk else synthetic_if_table(options.rows))
+
+    session_kwargs = dict(MaxRepetitions=options.max_repetitions, PipelineDepth=options.pipeline_depth)
+    if options.backend: session_kwargs['Backend'] = options.backend
+    if options.mib_index: session_kwargs['MIBIndex'] = MIBIndex(options.mib_index)
+    results = run_benchmarks(store, scenarios, options, **session_kwargs)
+    report(results)
+    if options.json:
+        with open(options.json, 'w') as out: json.dump({'options': vars(options), 'results': results}, out, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
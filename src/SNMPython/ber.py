@@ -0,0 +1,316 @@
+'''
+@author: Carl Verge
+@contact: carlverge@gmail.com
+@version: 12.06
+@requires: Python 3
+
+A small BER codec for SNMP v1/v2c messages, with no dependency on netsnmp.
+
+Varbinds are (oid, type, value) tuples:
+    oid: A tuple of ints, eg. (1, 3, 6, 1, 2, 1, 1, 1, 0)
+    type: The netsnmp type name (INTEGER, OCTETSTR, COUNTER64, NOSUCHINSTANCE...), so they line up with varbind.type
+    value: An int for numbers, bytes for strings and opaques, a tuple of ints for object IDs, a dotted string
+           for IP addresses, and None for NULL and the noSuchObject/noSuchInstance/endOfMibView exceptions.
+
+Decoding works on a memoryview of the datagram, only the final values are copied out of it.
+    data = encode_message(VERSION_2C, b'public', GET_REQUEST, 1234, 0, 0, [((1, 3, 6, 1, 2, 1, 1, 1, 0), 'NULL', None)])
+    message = decode_message(data)
+    print(message.request_id, message.varbinds)
+'''
+
+from collections import namedtuple
+
+VERSION_1 = 0
+VERSION_2C = 1
+
+#PDU tags
+GET_REQUEST = 0xA0
+GET_NEXT_REQUEST = 0xA1
+RESPONSE = 0xA2
+SET_REQUEST = 0xA3
+TRAP_V1 = 0xA4
+GET_BULK_REQUEST = 0xA5
+INFORM_REQUEST = 0xA6
+TRAP_V2 = 0xA7
+REPORT = 0xA8
+
+#Value tags, by netsnmp type name
+TYPE_TAGS = {
+            'INTEGER': 0x02,
+            'INTEGER32': 0x02,
+            'OCTETSTR': 0x04,
+            'NULL': 0x05,
+            'OBJECTID': 0x06,
+            'IPADDR': 0x40,
+            'COUNTER': 0x41,
+            'GAUGE': 0x42,
+            'UNSIGNED32': 0x42,
+            'UINTEGER': 0x42,
+            'TICKS': 0x43,
+            'OPAQUE': 0x44,
+            'COUNTER64': 0x46,
+            'NOSUCHOBJECT': 0x80,
+            'NOSUCHINSTANCE': 0x81,
+            'ENDOFMIBVIEW': 0x82,
+           }
+
+#And the other way around, picking the name netsnmp reports
+TAG_TYPES = {
+            0x02: 'INTEGER',
+            0x04: 'OCTETSTR',
+            0x05: 'NULL',
+            0x06: 'OBJECTID',
+            0x40: 'IPADDR',
+            0x41: 'COUNTER',
+            0x42: 'GAUGE',
+            0x43: 'TICKS',
+            0x44: 'OPAQUE',
+            0x46: 'COUNTER64',
+            0x80: 'NOSUCHOBJECT',
+            0x81: 'NOSUCHINSTANCE',
+            0x82: 'ENDOFMIBVIEW',
+           }
+
+_SEQUENCE = 0x30
+_SIGNED_TAGS = (0x02,)
+_UNSIGNED_TAGS = (0x41, 0x42, 0x43, 0x46)
+_STRING_TAGS = (0x04, 0x44)
+_EMPTY_TAGS = (0x05, 0x80, 0x81, 0x82)
+
+#A decoded message. For GetBulk, error_status and error_index hold non-repeaters and max-repetitions.
+Message = namedtuple('Message', ['version', 'community', 'pdu', 'request_id', 'error_status', 'error_index', 'varbinds'])
+
+#A decoded SNMPv1 trap, its PDU is laid out differently. The agent address is a dotted string, the timestamp in TimeTicks.
+TrapV1 = namedtuple('TrapV1', ['version', 'community', 'enterprise', 'agent_address', 'generic_trap', 'specific_trap',
+                               'timestamp', 'varbinds'])
+
+
+class BERError(ValueError):
+    '''The data is not a valid SNMP message.'''
+
+
+def _length(n):
+    if n < 0x80: return bytes((n,))
+    encoded = n.to_bytes((n.bit_length() + 7) // 8, 'big')
+    return bytes((0x80 | len(encoded),)) + encoded
+
+def _tlv(tag, payload):
+    return bytes((tag,)) + _length(len(payload)) + payload
+
+def encode_integer(value, tag=0x02):
+    #Two's complement, as short as possible. Unsigned types use the same encoding, never negative.
+    size = (value.bit_length() + 8) // 8 if value >= 0 else ((-value - 1).bit_length() + 8) // 8
+    return _tlv(tag, value.to_bytes(size, 'big', signed=True))
+
+def encode_oid(oid):
+    if len(oid) < 2: raise BERError('An OID needs at least two numbers: %r' % (oid,))
+    out = bytearray()
+    for arc in [oid[0] * 40 + oid[1]] + list(oid[2:]):
+        if arc < 0x80:
+            out.append(arc)
+            continue
+        chunk = []
+        while arc:
+            chunk.append(arc & 0x7F)
+            arc >>= 7
+        chunk.reverse()
+        out.extend([x | 0x80 for x in chunk[:-1]])
+        out.append(chunk[-1])
+    return _tlv(0x06, bytes(out))
+
+def encode_value(type, value):
+    '''
+    Encode a value of the given netsnmp type name.
+    '''
+    tag = TYPE_TAGS.get(type)
+    if tag is None: raise BERError('Unknown type %s' % type)
+    if tag in _EMPTY_TAGS: return bytes((tag, 0))
+    if tag in _SIGNED_TAGS or tag in _UNSIGNED_TAGS: return encode_integer(int(value), tag)
+    if tag == 0x06:
+        if isinstance(value, str): value = parse_oid(value)
+        return encode_oid(value)
+    if tag == 0x40:
+        if isinstance(value, str): value = bytes(int(x) for x in value.split('.'))
+        return _tlv(tag, bytes(value))
+    if isinstance(value, str): value = value.encode('utf-8')
+    return _tlv(tag, bytes(value))
+
+def encode_varbind(oid, type, value):
+    return _tlv(_SEQUENCE, encode_oid(oid) + encode_value(type, value))
+
+def encode_pdu(pdu, request_id, error_status, error_index, varbinds, encoded=None):
+    '''
+    @param encoded: Already encoded varbinds (from encode_varbind) to use instead of varbinds. (Optional)
+    '''
+    if encoded is None: encoded = [encode_varbind(*varbind) for varbind in varbinds]
+    return _tlv(pdu, encode_integer(request_id) + encode_integer(error_status) + encode_integer(error_index) +
+                     _tlv(_SEQUENCE, b''.join(encoded)))
+
+def encode_message(version, community, pdu, request_id, error_status, error_index, varbinds, encoded=None):
+    '''
+    Encode a whole v1/v2c message.
+    @param community: The community, as bytes or str.
+    @param encoded: Already encoded varbinds (from encode_varbind) to use instead of varbinds. (Optional)
+    @return: The message as bytes.
+    '''
+    if isinstance(community, str): community = community.encode('utf-8')
+    return _tlv(_SEQUENCE, encode_integer(version) + _tlv(0x04, community) +
+                           encode_pdu(pdu, request_id, error_status, error_index, varbinds, encoded))
+
+def encode_trap_v1(community, enterprise, agent_address, generic_trap, specific_trap, timestamp, varbinds):
+    '''
+    Encode an SNMPv1 trap message.
+    @param enterprise: The enterprise OID, a tuple of ints.
+    @param agent_address: The agent's IP address, a dotted string.
+    '''
+    if isinstance(community, str): community = community.encode('utf-8')
+    pdu = (encode_oid(enterprise) + encode_value('IPADDR', agent_address) + encode_integer(generic_trap) +
+           encode_integer(specific_trap) + encode_integer(timestamp, 0x43) +
+           _tlv(_SEQUENCE, b''.join([encode_varbind(*varbind) for varbind in varbinds])))
+    return _tlv(_SEQUENCE, encode_integer(VERSION_1) + _tlv(0x04, community) + _tlv(TRAP_V1, pdu))
+
+def message_overhead(community):
+    '''
+    @return: An upper bound on the bytes a message takes on top of its encoded varbinds.
+    '''
+    return 40 + len(community)
+
+
+def _header(buf, pos, end):
+    #Read a tag and length at pos, returns (tag, start of the value, end of the value)
+    if pos + 2 > end: raise BERError('Truncated at %d' % pos)
+    tag = buf[pos]
+    length = buf[pos + 1]
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7F
+        if not size or pos + size > end: raise BERError('Bad length at %d' % pos)
+        length = int.from_bytes(buf[pos:pos + size], 'big')
+        pos += size
+    if pos + length > end: raise BERError('Truncated at %d' % pos)
+    return tag, pos, pos + length
+
+def _expect(buf, pos, end, tag):
+    found, start, stop = _header(buf, pos, end)
+    if found != tag: raise BERError('Expected tag 0x%02x at %d, found 0x%02x' % (tag, pos, found))
+    return start, stop
+
+def decode_oid(buf, start=0, end=None):
+    '''
+    @return: The OID in buf[start:end] (just the contents, no tag or length) as a tuple of ints.
+    '''
+    if end is None: end = len(buf)
+    arcs = []
+    arc = 0
+    for pos in range(start, end):
+        byte = buf[pos]
+        arc = (arc << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            arcs.append(arc)
+            arc = 0
+    if not arcs: raise BERError('Empty OID')
+    first = arcs[0]
+    head = (first // 40, first % 40) if first < 80 else (2, first - 80)
+    return head + tuple(arcs[1:])
+
+def decode_value(tag, buf, start, end):
+    '''
+    @return: The python value for the contents buf[start:end] of a value with the tag.
+    '''
+    if tag in _SIGNED_TAGS: return int.from_bytes(buf[start:end], 'big', signed=True)
+    if tag in _UNSIGNED_TAGS: return int.from_bytes(buf[start:end], 'big')
+    if tag in _STRING_TAGS: return bytes(buf[start:end])
+    if tag == 0x06: return decode_oid(buf, start, end)
+    if tag == 0x40: return '.'.join([str(x) for x in buf[start:end]])
+    if tag in _EMPTY_TAGS: return None
+    raise BERError('Unknown value tag 0x%02x' % tag)
+
+def decode_varbinds(buf, pos, end):
+    '''
+    @return: The list of (oid, type, value) in the varbind list whose contents are buf[pos:end].
+    '''
+    varbinds = []
+    while pos < end:
+        start, stop = _expect(buf, pos, end, _SEQUENCE)
+        oidStart, oidEnd = _expect(buf, start, stop, 0x06)
+        tag, valStart, valEnd = _header(buf, oidEnd, stop)
+        type = TAG_TYPES.get(tag)
+        if type is None: raise BERError('Unknown value tag 0x%02x' % tag)
+        varbinds.append((decode_oid(buf, oidStart, oidEnd), type, decode_value(tag, buf, valStart, valEnd)))
+        pos = stop
+    return varbinds
+
+def _decode_integer(buf, pos, end):
+    start, stop = _expect(buf, pos, end, 0x02)
+    return int.from_bytes(buf[start:stop], 'big', signed=True), stop
+
+def decode_message(data):
+    '''
+    Decode a v1/v2c message with a get/getnext/getbulk/set/response/inform/v2 trap/report PDU.
+    @param data: The datagram, anything that supports the buffer protocol (bytes, bytearray, memoryview).
+    @return: A Message.
+    @raise BERError: The data is not a message we understand.
+    '''
+    buf = memoryview(data)
+    end = len(buf)
+    start, end = _expect(buf, 0, end, _SEQUENCE)
+    version, pos = _decode_integer(buf, start, end)
+    commStart, commEnd = _expect(buf, pos, end, 0x04)
+    community = bytes(buf[commStart:commEnd])
+    pdu, pos, pduEnd = _header(buf, commEnd, end)
+    if pdu == TRAP_V1: raise BERError('A v1 trap, see decode_trap_v1')
+    if pdu < GET_REQUEST or pdu > REPORT: raise BERError('Unsupported PDU 0x%02x' % pdu)
+    requestId, pos = _decode_integer(buf, pos, pduEnd)
+    errorStatus, pos = _decode_integer(buf, pos, pduEnd)
+    errorIndex, pos = _decode_integer(buf, pos, pduEnd)
+    start, stop = _expect(buf, pos, pduEnd, _SEQUENCE)
+    return Message(version, community, pdu, requestId, errorStatus, errorIndex, decode_varbinds(buf, start, stop))
+
+def decode_trap_v1(data):
+    '''
+    Decode an SNMPv1 trap message.
+    @param data: The datagram, anything that supports the buffer protocol.
+    @return: A TrapV1.
+    @raise BERError: The data is not a v1 trap.
+    '''
+    buf = memoryview(data)
+    start, end = _expect(buf, 0, len(buf), _SEQUENCE)
+    version, pos = _decode_integer(buf, start, end)
+    commStart, commEnd = _expect(buf, pos, end, 0x04)
+    community = bytes(buf[commStart:commEnd])
+    pos, pduEnd = _expect(buf, commEnd, end, TRAP_V1)
+    start, stop = _expect(buf, pos, pduEnd, 0x06)
+    enterprise = decode_oid(buf, start, stop)
+    start, stop = _expect(buf, stop, pduEnd, 0x40)
+    agentAddress = decode_value(0x40, buf, start, stop)
+    genericTrap, pos = _decode_integer(buf, stop, pduEnd)
+    specificTrap, pos = _decode_integer(buf, pos, pduEnd)
+    start, stop = _expect(buf, pos, pduEnd, 0x43)
+    timestamp = decode_value(0x43, buf, start, stop)
+    start, stop = _expect(buf, stop, pduEnd, _SEQUENCE)
+    return TrapV1(version, community, enterprise, agentAddress, genericTrap, specificTrap, timestamp,
+                  decode_varbinds(buf, start, stop))
+
+def pdu_type(data):
+    '''
+    @return: The PDU tag of a message, to tell which decode function it needs, without decoding the rest.
+    @raise BERError: The data is not a message.
+    '''
+    buf = memoryview(data)
+    start, end = _expect(buf, 0, len(buf), _SEQUENCE)
+    version, pos = _decode_integer(buf, start, end)
+    commStart, commEnd = _expect(buf, pos, end, 0x04)
+    return _header(buf, commEnd, end)[0]
+
+
+def parse_oid(oid):
+    '''
+    @return: A numeric OID string like '.1.3.6.1' as a tuple of ints.
+    '''
+    return tuple([int(x) for x in oid.strip('.').split('.')])
+
+def format_oid(oid):
+    '''
+    @return: A tuple of ints as a numeric OID string like '.1.3.6.1'
+    '''
+    return '.' + '.'.join([str(x) for x in oid])
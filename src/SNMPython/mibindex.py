@@ -0,0 +1,312 @@
+'''
+@author: Carl Verge
+@contact: carlverge@gmail.com
+@version: 12.06
+@requires: Python 2.6, net-snmp tools (snmptranslate) to build an index
+
+Fast startup without loading MIBs: a precompiled name <-> OID index, built once from snmptranslate and
+memory-mapped by every process that needs it. Opening it reads nothing up front, and each lookup is a binary search,
+so cold start takes milliseconds instead of the seconds netsnmp spends parsing every MIB.
+
+To build the index (once, or whenever the MIBs change):
+    python -m SNMPython.mibindex build mibs.idx             #All the MIBs netsnmp can find (snmptranslate -Tz -m ALL)
+    python -m SNMPython.mibindex build mibs.idx -m IF-MIB:IP-MIB -M /usr/share/snmp/mibs:~/mibs
+
+To use it, keep netsnmp from loading MIBs and give the index to the sessions:
+    use_mibs()                                               #Before the first session is created
+    index = MIBIndex('mibs.idx')
+    session = SNMPythonSession(DestHost='192.168.1.1', Community='private', Version=2, MIBIndex=index)
+    print session.get_table('ifTable')['2'].ifDescr
+
+Or load only the MIB modules you need into netsnmp, without an index:
+    use_mibs('IF-MIB', 'IP-MIB')
+'''
+
+import mmap
+import os
+import re
+import struct
+import subprocess
+import sys
+
+from .SNMPython import LRUCache
+
+MAGIC = b'SNMPYMI1'
+_HEADER = struct.Struct('<8sIII') #Magic, number of labels, number of OIDs, size of the records
+_OFFSET = struct.Struct('<I')
+
+#A line of snmptranslate -Tz output: "ifDescr"		"1.3.6.1.2.1.2.2.1.2"
+_TZ_LINE = re.compile(r'^"([^"]+)"\s+"([0-9.]+)"')
+
+
+def use_mibs(*modules, **kwargs):
+    '''
+    Choose the MIB modules netsnmp loads. This has to be called before the first session is created,
+    netsnmp reads the MIBs once per process.
+    @param modules: The MIB module names, eg. 'IF-MIB'. None at all loads no MIBs, for sessions using a MIBIndex.
+    @param dirs: A list of directories to find the MIB files in, instead of netsnmp's defaults. (Optional)
+    '''
+    os.environ['MIBS'] = ':'.join(modules)
+    dirs = kwargs.get('dirs')
+    if dirs is not None: os.environ['MIBDIRS'] = ':'.join(dirs)
+
+
+def _oid_key(oid):
+    return tuple([int(x) for x in oid.strip('.').split('.')])
+
+
+def parse_tz(lines):
+    '''
+    Read snmptranslate -Tz output.
+    @return: A generator of (label, numeric OID) tuples, the OIDs without a leading '.'.
+    '''
+    for line in lines:
+        if not isinstance(line, str): line = line.decode('ascii', 'replace')
+        match = _TZ_LINE.match(line)
+        if match: yield match.group(1), match.group(2).strip('.')
+
+
+def snmptranslate_tz(modules='ALL', dirs=None, command='snmptranslate'):
+    '''
+    Run snmptranslate -Tz for the given MIB modules.
+    @param modules: The -m argument, eg. 'ALL' or 'IF-MIB:IP-MIB'.
+    @param dirs: The -M argument, the directories the MIBs are in. (Optional)
+    @return: A list of (label, numeric OID) tuples, see parse_tz.
+    @raise OSError: snmptranslate could not be run, or failed.
+    '''
+    args = [command, '-Tz', '-m', modules]
+    if dirs: args += ['-M', dirs]
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = process.communicate()
+    if process.returncode: raise OSError('%s failed: %s' % (' '.join(args), err.decode('ascii', 'replace').strip()))
+    return list(parse_tz(out.splitlines()))
+
+
+def build_index(entries, path):
+    '''
+    Write an index file.
+    A label defined by more than one MIB keeps the first OID it was given, and an OID with more than one label the first label.
+    Layout: header, the record offsets sorted by label, the record offsets sorted by OID, then the records ('label\\0oid\\n').
+    @param entries: An iterable of (label, numeric OID), eg. from snmptranslate_tz or parse_tz.
+    @param path: The file to write.
+    @return: The number of entries written.
+    '''
+    byLabel, byOid = {}, {}
+    for label, oid in entries:
+        oid = oid.strip('.')
+        if label not in byLabel: byLabel[label] = oid
+        if oid not in byOid: byOid[oid] = label
+    #One record per (label, OID) pair, shared by both orders
+    pairs = set(byLabel.items()) | set((label, oid) for oid, label in byOid.items())
+    records, offsets, size = [], {}, 0
+    for label, oid in sorted(pairs):
+        record = ('%s\0%s\n' % (label, oid)).encode('ascii')
+        offsets[(label, oid)] = size
+        records.append(record)
+        size += len(record)
+
+    labelOrder = [offsets[(label, byLabel[label])] for label in sorted(byLabel)]
+    oidOrder = [offsets[(byOid[oid], oid)] for oid in sorted(byOid, key=_oid_key)]
+    out = open(path + '.tmp', 'wb')
+    try:
+        out.write(_HEADER.pack(MAGIC, len(labelOrder), len(oidOrder), size))
+        out.write(struct.pack('<%dI' % len(labelOrder), *labelOrder))
+        out.write(struct.pack('<%dI' % len(oidOrder), *oidOrder))
+        out.write(b''.join(records))
+    finally:
+        out.close()
+    os.rename(path + '.tmp', path) #Processes that already mapped the old file keep it until they close it
+    return len(oidOrder)
+
+
+class MIBIndex(object):
+    '''
+    A memory-mapped name <-> OID index, see build_index. It is read-only, so one index can be shared by
+    every session and thread, and forked workers share its pages.
+        index = MIBIndex('mibs.idx')
+        index.numeric('ifDescr.3') #'.1.3.6.1.2.1.2.2.1.2.3'
+        index.describe('.1.3.6.1.2.1.2.2.1.2.3') #('.1.3.6.1.2.1.2.2.1.2', 'ifDescr', '.iso.org.dod...ifEntry.ifDescr', '3')
+    '''
+    #How many lookups of each kind are remembered
+    CACHE_SIZE = 4096
+
+    def __init__(self, path):
+        '''
+        @param path: An index file made by build_index.
+        @raise ValueError: The file is not an index.
+        '''
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except:
+            self._file.close()
+            raise
+        magic, self._labelCount, self._oidCount, size = (_HEADER.unpack_from(self._map, 0) if len(self._map) >= _HEADER.size
+                                                         else (None, 0, 0, 0))
+        if magic != MAGIC:
+            self.close()
+            raise ValueError('%s is not a MIB index' % path)
+        self._byLabel = _HEADER.size
+        self._byOid = self._byLabel + self._labelCount * _OFFSET.size
+        self._records = self._byOid + self._oidCount * _OFFSET.size
+        self._oids, self._nodes, self._longNames = [LRUCache(self.CACHE_SIZE) for x in range(3)]
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __len__(self):
+        return self._oidCount
+
+    def _record(self, table, position):
+        #The (label, oid string) of the position'th entry of a sorted offset table
+        start = self._records + _OFFSET.unpack_from(self._map, table + position * _OFFSET.size)[0]
+        end = self._map.find(b'\n', start)
+        label, oid = self._map[start:end].decode('ascii').split('\0')
+        return label, oid
+
+    def _remember(self, cache, key, value):
+        cache.put(key, value)
+        return value
+
+    def oid(self, label):
+        '''
+        @param label: A MIB object name, eg. 'ifDescr' or 'IF-MIB::ifDescr'.
+        @return: Its numeric OID, eg. '.1.3.6.1.2.1.2.2.1.2', or None if it isn't in the index.
+        '''
+        label = label.split('::')[-1]
+        oid = self._oids.get(label)
+        if oid is not None: return oid
+        low, high = 0, self._labelCount
+        while low < high:
+            middle = (low + high) // 2
+            found, oid = self._record(self._byLabel, middle)
+            if found < label: low = middle + 1
+            elif found > label: high = middle
+            else: return self._remember(self._oids, label, '.' + oid)
+        return None
+
+    def _floor(self, key):
+        #The position of the last OID <= key, -1 if there is none
+        low, high = 0, self._oidCount
+        while low < high:
+            middle = (low + high) // 2
+            if _oid_key(self._record(self._byOid, middle)[1]) <= key: low = middle + 1
+            else: high = middle
+        return low - 1
+
+    def node(self, oid):
+        '''
+        Find the MIB object an OID is under (the longest OID in the index that is a prefix of it).
+        @param oid: A numeric OID, eg. '.1.3.6.1.2.1.2.2.1.2.3'
+        @return: (numeric OID of the object, its label), or None if the OID is outside of every object in the index.
+        '''
+        key = _oid_key(oid)
+        while key:
+            position = self._floor(key)
+            if position < 0: return None
+            label, found = self._record(self._byOid, position)
+            found = _oid_key(found)
+            if key[:len(found)] == found: return '.' + '.'.join([str(x) for x in found]), label
+            #Nothing between found and key can be a prefix of key longer than what the two have in common
+            common = 0
+            while common < len(found) and found[common] == key[common]: common += 1
+            key = key[:common]
+        return None
+
+    def long_name(self, oid):
+        '''
+        @param oid: The numeric OID of an object in the index.
+        @return: The name with one label per number, the way netsnmp's UseLongNames shows it, eg. '.iso.org.dod.internet'.
+                 Numbers without a label in the index are left as numbers.
+        '''
+        longName = self._longNames.get(oid)
+        if longName is not None: return longName
+        numbers = oid.strip('.').split('.')
+        labels = []
+        for x in range(1, len(numbers) + 1):
+            prefix = '.'.join(numbers[:x])
+            position = self._floor(_oid_key(prefix))
+            label, found = self._record(self._byOid, position) if position >= 0 else (None, None)
+            labels.append(label if found == prefix else numbers[x-1])
+        return self._remember(self._longNames, oid, '.' + '.'.join(labels))
+
+    def numeric(self, name):
+        '''
+        Translate a name to a numeric OID.
+        @param name: A name with an optional index, like 'ifDescr.3', 'IF-MIB::ifDescr.3' or a long name like
+                     '.iso.org.dod.internet.mgmt.mib-2.system.sysDescr.0'. Numeric OIDs are returned as they are.
+        @return: The numeric OID with a leading '.', or None if the name isn't in the index.
+        '''
+        parts = name.strip('.').split('.')
+        last = len(parts) - 1
+        while last >= 0 and parts[last].isdigit(): last -= 1
+        if last < 0: return '.' + '.'.join(parts) #Already numeric
+        oid = self.oid(parts[last])
+        if oid is None: return None
+        return '.'.join([oid] + parts[last+1:])
+
+    def describe(self, oid):
+        '''
+        Split a numeric OID of an object instance into the object and the index, the way netsnmp does with MIBs loaded.
+        @param oid: A numeric OID, eg. '.1.3.6.1.2.1.2.2.1.2.3'
+        @return: (numeric OID of the object, label, long name, index), eg.
+                 ('.1.3.6.1.2.1.2.2.1.2', 'ifDescr', '.iso.org...ifEntry.ifDescr', '3'). The index is '' for the OID of an
+                 object itself, like '.1.3.6.1.2.1.2.2' (ifTable). None if it isn't under an object in the index.
+        '''
+        #Instances of the same object share their parent, which makes it a good cache key for tables with simple indexes
+        parent = oid.rsplit('.', 1)[0]
+        found = self._nodes.get(parent)
+        if found is None:
+            node = self.node(parent) if parent else None
+            if node is not None: node = (node[0], node[1], self.long_name(node[0]))
+            #Objects under the parent come right after it in the index. Without any, the OID can't be an object itself
+            key = _oid_key(parent) if parent else ()
+            position = self._floor(key) + 1 if key else 0
+            children = position < self._oidCount and _oid_key(self._record(self._byOid, position)[1])[:len(key)] == key
+            found = self._remember(self._nodes, parent, (node, children))
+        node, children = found
+        if children: #The OID may be an object itself, then there is no index to split off
+            position = self._floor(_oid_key(oid))
+            label, exact = self._record(self._byOid, position) if position >= 0 else (None, None)
+            if exact == oid.strip('.'): node = ('.' + exact, label, self.long_name('.' + exact))
+        if node is None: return None
+        numeric, label, longName = node
+        return numeric, label, longName, oid[len(numeric)+1:]
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m SNMPython.mibindex', description='Build a MIB index file for MIBIndex.')
+    commands = parser.add_subparsers(dest='command')
+    build = commands.add_parser('build', help='Build an index from snmptranslate -Tz')
+    build.add_argument('path', help='The index file to write')
+    build.add_argument('-m', dest='modules', default='ALL', help='The MIB modules to include (snmptranslate -m), default ALL')
+    build.add_argument('-M', dest='dirs', help='The directories the MIBs are in (snmptranslate -M)')
+    build.add_argument('--input', help="Read saved 'snmptranslate -Tz' output from this file ('-' for stdin) instead of running it")
+    lookup = commands.add_parser('lookup', help='Translate names or numeric OIDs with an index')
+    lookup.add_argument('path', help='The index file')
+    lookup.add_argument('oids', nargs='+')
+    options = parser.parse_args(argv)
+
+    if options.command == 'build':
+        if options.input == '-': entries = list(parse_tz(sys.stdin))
+        elif options.input:
+            with open(options.input) as tz: entries = list(parse_tz(tz))
+        else: entries = snmptranslate_tz(options.modules, options.dirs)
+        print('Wrote %d objects to %s' % (build_index(entries, options.path), options.path))
+    elif options.command == 'lookup':
+        index = MIBIndex(options.path)
+        for oid in options.oids:
+            numeric = index.numeric(oid)
+            described = index.describe(numeric) if numeric else None
+            print('%s: %s %s' % (oid, numeric, described))
+    else:
+        parser.print_help()
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+'''
+@author: Carl Verge
+@contact: carlverge@gmail.com
+@version: 12.06
+@requires: Python 2.6, net-snmp python bindings
+'''
+
+import threading
+from collections import deque
+
+try: import queue
+except ImportError: import Queue as queue #Python 2
+
+from .SNMPython import SNMPythonSession, SNMPError
+from .pool import SessionPool
+
+
+class SNMPythonPoller(object):
+    '''
+    Polls many agents at once by fanning the requests out over a bounded pool of worker threads.
+    Each worker drives its own SNMPythonSession, so a poll cycle takes about as long as the slowest host
+    instead of the sum of all of them.
+
+    To poll a set of hosts:
+        poller = SNMPythonPoller(max_workers=32, Community='public', Version=2)
+        for target, result in poller.poll_many(['10.0.0.1', '10.0.0.2'], 'sysUpTime.0', 'sysDescr.0'):
+            if isinstance(result, SNMPError): print target, 'failed:', result
+            else: print target, result
+
+    Targets can be a host string, or a dictionary of SNMPythonSession keyword arguments that
+    override the defaults given to the poller:
+        poller.get_table_many([{'DestHost': '10.0.0.1', 'Community': 'secret'}, '10.0.0.2'], 'ifTable')
+
+    Results are yielded as soon as each host finishes, so they come back in completion order, not target order.
+    A host that fails yields its SNMPError (or subclass) instead of raising, so one bad host never stops the cycle.
+
+    Sessions come from a SessionPool, so polling the same hosts again reuses them instead of building new ones.
+    Pass your own pool to share sessions with the rest of the program.
+    '''
+
+    #The size of the poller's own SessionPool, if it isn't given one
+    POOL_SIZE = 64
+
+    def __init__(self, max_workers=16, max_per_host=1, session_factory=SNMPythonSession, pool=None, **kwargs):
+        '''
+        @param max_workers: The maximum number of requests in flight across all hosts.
+        @param max_per_host: The maximum number of requests in flight to any single host.
+        @param session_factory: Callable used to build a session from keyword arguments. Defaults to SNMPythonSession.
+                                Ignored if a pool is given.
+        @param pool: The SessionPool to take sessions from. Defaults to a pool of its own, keeping the sessions
+                     of up to POOL_SIZE (or max_workers) targets between runs. (Optional)
+        @param kwargs: Default SNMPythonSession arguments for every target (Community, Version, Timeout...)
+        '''
+        if max_workers < 1 or max_per_host < 1: raise ValueError('max_workers and max_per_host must be at least 1')
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.session_factory = session_factory
+        self.session_kwargs = kwargs
+        if pool is None: pool = SessionPool(max_size=max(self.POOL_SIZE, max_workers), session_factory=session_factory)
+        self.pool = pool
+
+    def _target_kwargs(self, target):
+        kwargs = dict(self.session_kwargs)
+        if isinstance(target, dict): kwargs.update(target)
+        else: kwargs['DestHost'] = target
+        return kwargs
+
+    def _host_key(self, target):
+        return target.get('DestHost') if isinstance(target, dict) else target
+
+    def _run_job(self, target, method, args):
+        with self.pool.session(**self._target_kwargs(target)) as session:
+            return getattr(session, method)(*args)
+
+    def _worker(self, jobs, results):
+        while True:
+            job = jobs.get()
+            if job is None: return #Sentinel, the run is over
+            jobid, target, method, args = job
+            try:
+                result = self._run_job(target, method, args)
+            except SNMPError as e:
+                result = e
+            except Exception as e: #Keep the worker alive, and report it against the host like any other failure
+                result = SNMPError('%s: %s' % (e.__class__.__name__, e))
+            results.put((jobid, target, result))
+
+    def run(self, jobs):
+        '''
+        Run arbitrary SNMPythonSession methods against many targets.
+        Example:
+            poller.run([('10.0.0.1', 'get_data', ('sysUpTime.0',)), ('10.0.0.1', 'get_table', ('ifTable',))])
+        @param jobs: An iterable of (target, method name, argument tuple).
+        @return: A generator yielding (target, result) as each job completes. The result is whatever the
+                 method returned, or the SNMPError it raised.
+        '''
+        for jobid, target, result in self._run(jobs): yield target, result
+
+    def _run(self, jobs):
+        #run, yielding (job number, target, result) so the results can be matched up with the jobs
+        pending = deque(enumerate(jobs))
+        if not pending: return
+
+        jobQueue, resultQueue = queue.Queue(), queue.Queue()
+        workers = [threading.Thread(target=self._worker, args=(jobQueue, resultQueue))
+                   for x in range(min(self.max_workers, len(pending)))]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        inFlight = {} #Host key -> number of requests currently out to it
+        waiting = {} #Host key -> deque of its jobs held back by max_per_host
+        ready = deque() #Jobs that were waiting, with the slot of the request to their host that finished
+        active = 0
+        try:
+            while pending or ready or active:
+                #Hand out as much work as the global and per-host caps allow, keeping the order otherwise
+                while (pending or ready) and active < self.max_workers:
+                    if ready:
+                        jobid, (target, method, args) = ready.popleft()
+                    else:
+                        jobid, (target, method, args) = pending.popleft()
+                        host = self._host_key(target)
+                        if inFlight.get(host, 0) >= self.max_per_host:
+                            waiting.setdefault(host, deque()).append((jobid, (target, method, args)))
+                            continue
+                        inFlight[host] = inFlight.get(host, 0) + 1
+                    active += 1
+                    jobQueue.put((jobid, target, method, tuple(args)))
+
+                jobid, target, result = resultQueue.get()
+                host = self._host_key(target)
+                active -= 1
+                held = waiting.get(host)
+                if held: #Its next job takes over the slot
+                    ready.append(held.popleft())
+                    if not held: del waiting[host]
+                else:
+                    inFlight[host] -= 1
+                    if not inFlight[host]: del inFlight[host]
+                yield jobid, target, result
+        finally: #Also runs if the caller stops iterating early, jobs not yet handed out are dropped
+            for worker in workers: jobQueue.put(None)
+
+    def poll_many(self, targets, *oids):
+        '''
+        Perform get_data for the same OIDs on every target.
+        @param targets: An iterable of host strings or dictionaries of session arguments.
+        @param oids: One or more OIDs, named or numeric.
+        @return: A generator yielding (target, result) as each host completes. The result is the value
+                 (or tuple of values) from get_data, or the SNMPError for that host.
+        '''
+        return self.run([(target, 'get_data', oids) for target in targets])
+
+    def get_table_many(self, targets, table):
+        '''
+        Perform get_table for the same table on every target.
+        @param targets: An iterable of host strings or dictionaries of session arguments.
+        @param table: The table name, see SNMPythonSession.get_table
+        @return: A generator yielding (target, result) as each host completes. The result is the table
+                 from get_table, or the SNMPError for that host.
+        '''
+        return self.run([(target, 'get_table', (table,)) for target in targets])
@@ -0,0 +1,180 @@
+'''
+@author: Carl Verge
+@contact: carlverge@gmail.com
+@version: 12.06
+@requires: Python 2.6, net-snmp python bindings
+'''
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .SNMPython import SNMPythonSession, SNMPError
+
+
+class SessionPool(object):
+    '''
+    A thread safe pool of SNMPythonSessions, reused for every target with the same session arguments
+    (host, version, community or v3 credentials, timeouts...). Building a netsnmp session is expensive, more so
+    with lots of MIBs loaded, so job runners that make a session per task spend most of their time on it.
+
+    To run a task against a host:
+        pool = SessionPool(max_size=32, Community='public', Version=2)
+        with pool.session(DestHost='10.0.0.1') as session:
+            print session['sysUpTime.0']
+
+    Sessions are only built when no idle one with the same arguments is left, and each is handed to one user at a time.
+    On the way back in, the per-call settings (UseLongNames, UseNumeric, DecodeValues, MaxRepetitions...)
+    are put back to what they were when the session was built, so one task can't change how the next one behaves.
+    When the pool is full, the session idle the longest is dropped to make room, and if every session is in use
+    acquire waits for one to come back. Sessions idle for more than idle_timeout seconds are dropped as well.
+    Dropped sessions are closed (see SNMPythonSession.close), so their sockets don't linger until garbage collection.
+
+    @ivar stats: Counters: created, reused, evicted (to make room), expired (idle too long), waits (for a full pool).
+    '''
+    #Session attributes put back to their initial values when a session comes back to the pool
+    RESET_ATTRIBUTES = ('UseLongNames', 'UseNumeric', 'UseEnums', 'UseSprintValue', 'DecodeValues', 'MaxRepetitions',
+                        'MaxVarbinds', 'PipelineDepth', 'ResponseCache', 'Instrumentation', 'MIBIndex',
+                        'AdaptiveTimeout', 'BreakerThreshold')
+
+    def __init__(self, max_size=64, idle_timeout=300, session_factory=SNMPythonSession, **kwargs):
+        '''
+        @param max_size: The most sessions the pool holds, idle or in use.
+        @param idle_timeout: Seconds an idle session is kept for, None to keep them until the pool is full.
+        @param session_factory: Callable used to build a session from keyword arguments. Defaults to SNMPythonSession.
+        @param kwargs: Default SNMPythonSession arguments for every session (Community, Version, Timeout...)
+        '''
+        if max_size < 1: raise ValueError('max_size must be at least 1')
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.session_factory = session_factory
+        self.session_kwargs = kwargs
+        self.stats = dict(created=0, reused=0, evicted=0, expired=0, waits=0)
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = {} #Key -> idle sessions, the most recently used last
+        self._idleOrder = OrderedDict() #id(session) -> (key, session, time it came back), the longest idle first
+        self._inUse = {} #id(session) -> key
+        self._defaults = {} #id(session) -> the RESET_ATTRIBUTES it was built with
+        self._creating = 0 #Sessions being built outside the lock
+
+    def _key(self, kwargs):
+        #Every argument matters, sessions with a different Timeout (say) aren't interchangeable
+        return tuple(sorted(kwargs.items()))
+
+    def __len__(self):
+        '''@return: The number of sessions in the pool, idle or in use.'''
+        with self._cond: return len(self._idleOrder) + len(self._inUse) + self._creating
+
+    def _take_idle(self, sessionId):
+        #Take a session out of the idle lists. Called with the lock held
+        key, session, released = self._idleOrder.pop(sessionId)
+        sessions = self._idle[key]
+        sessions.remove(session)
+        if not sessions: del self._idle[key]
+        return session
+
+    def _drop(self, sessionId):
+        #Forget an idle session for good. Called with the lock held
+        self._close(self._take_idle(sessionId))
+        del self._defaults[sessionId]
+
+    def _close(self, session):
+        #Sessions from a session_factory may not have close
+        close = getattr(session, 'close', None)
+        if close is not None: close()
+
+    def _expire(self):
+        #Called with the lock held
+        if self.idle_timeout is None: return
+        cutoff = time.time() - self.idle_timeout
+        while self._idleOrder:
+            sessionId, (key, session, released) = next(iter(self._idleOrder.items()))
+            if released > cutoff: break
+            self._drop(sessionId)
+            self.stats['expired'] += 1
+
+    def acquire(self, timeout=None, **kwargs):
+        '''
+        Check a session out of the pool, building one if there is no idle session with the same arguments.
+        Give it back with release when done, or use the session context manager.
+        @param timeout: The most seconds to wait for a session when the pool is full of sessions in use, None to wait forever.
+        @param kwargs: SNMPythonSession arguments, on top of the pool's defaults.
+        @return: The session, nobody else gets it until it is released.
+        @raise SNMPError: No session came free before the timeout.
+        '''
+        args = dict(self.session_kwargs)
+        args.update(kwargs)
+        key = self._key(args)
+        deadline = None if timeout is None else time.time() + timeout
+
+        with self._cond:
+            while True:
+                self._expire()
+                sessions = self._idle.get(key)
+                if sessions:
+                    session = self._take_idle(id(sessions[-1]))
+                    self._inUse[id(session)] = key
+                    self.stats['reused'] += 1
+                    return session
+                if len(self._idleOrder) + len(self._inUse) + self._creating < self.max_size: break
+                if self._idleOrder: #Make room by dropping the session idle the longest
+                    self._drop(next(iter(self._idleOrder)))
+                    self.stats['evicted'] += 1
+                    break
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0: raise SNMPError('No free session in the pool')
+                self.stats['waits'] += 1
+                self._cond.wait(remaining)
+            self._creating += 1
+
+        #Building the session is the slow part, don't hold up everybody else for it
+        try:
+            session = self.session_factory(**args)
+        except:
+            with self._cond:
+                self._creating -= 1
+                self._cond.notify()
+            raise
+        defaults = dict((name, getattr(session, name)) for name in self.RESET_ATTRIBUTES if hasattr(session, name))
+        with self._cond:
+            self._creating -= 1
+            self._inUse[id(session)] = key
+            self._defaults[id(session)] = defaults
+            self.stats['created'] += 1
+        return session
+
+    def release(self, session, discard=False):
+        '''
+        Give a session back to the pool.
+        @param discard: Drop (and close) the session instead of keeping it for reuse, eg. if it was left in a bad state.
+        @raise ValueError: The session isn't checked out of this pool.
+        '''
+        with self._cond:
+            key = self._inUse.pop(id(session), None)
+            if key is None: raise ValueError('The session is not checked out of this pool')
+            if discard:
+                del self._defaults[id(session)]
+                self._close(session)
+            else:
+                for name, value in self._defaults[id(session)].items(): setattr(session, name, value)
+                self._idle.setdefault(key, []).append(session)
+                self._idleOrder[id(session)] = (key, session, time.time())
+            self._cond.notify()
+
+    @contextmanager
+    def session(self, timeout=None, **kwargs):
+        '''
+        Check a session out for the length of a with block, see acquire.
+            with pool.session(DestHost='10.0.0.1', Community='secret') as session: ...
+        '''
+        session = self.acquire(timeout, **kwargs)
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    def clear(self):
+        '''Drop and close every idle session. Sessions in use are kept for reuse when they come back.'''
+        with self._cond:
+            for sessionId in list(self._idleOrder): self._drop(sessionId)
@@ -0,0 +1,153 @@
+'''
+@author: Carl Verge
+@contact: carlverge@gmail.com
+@version: 12.06
+@requires: Python 2.6, net-snmp python bindings
+'''
+
+from array import array
+
+#Counters that wrap back to 0 after these values. A Counter64 going down means the counter was reset, not a wrap.
+COUNTER_WRAPS = {'COUNTER': 2**32}
+
+#sysUpTime is a 32 bit TimeTicks (hundredths of a second), it wraps after about 497 days
+UPTIME_WRAP = 2**32
+
+#The numeric types we can compute deltas on
+COUNTER_TYPES = ('COUNTER', 'COUNTER64')
+NUMERIC_TYPES = ('COUNTER', 'COUNTER64', 'GAUGE', 'UINTEGER', 'UNSIGNED32', 'INTEGER', 'INTEGER32', 'TICKS')
+
+#Deltas of gauges can be negative, so they need a signed 64 bit array
+DELTA_TYPECODE = 'q' if 'q' in getattr(array, 'typecodes', '') else ('l' if array('l').itemsize >= 8 else 'd')
+
+
+class TableRates(object):
+    '''
+    The per-row deltas and rates between two snapshots of a table, see table_rates.
+        rates = table_rates(old, new)
+        print rates.rate('ifInOctets', '3') #Octets per second on interface 3, None if it couldn't be computed
+        print sum(rates.rates['ifHCInOctets']) #Total over all interfaces
+    @ivar index: The row indexes found in both snapshots, in the same order as the columns.
+    @ivar positions: Maps each row index to its position in the columns.
+    @ivar interval: The seconds between the two snapshots.
+    @ivar discontinuity: True if the agent restarted between the snapshots. Every cell is invalid then.
+    @ivar deltas: Column name -> array of the change in value for each row.
+    @ivar rates: Column name -> array of the change per second for each row.
+    @ivar invalid: Column name -> set of row positions with no usable value (missing cell, counter reset). Their delta and rate are 0.
+    '''
+    def __init__(self, index, interval, discontinuity=False):
+        self.index = index
+        self.positions = dict((iid, x) for x, iid in enumerate(index))
+        self.interval = interval
+        self.discontinuity = discontinuity
+        self.deltas = {}
+        self.rates = {}
+        self.invalid = {}
+
+    def delta(self, column, iid):
+        position = self.positions[iid]
+        return None if position in self.invalid[column] else self.deltas[column][position]
+
+    def rate(self, column, iid):
+        position = self.positions[iid]
+        return None if position in self.invalid[column] else self.rates[column][position]
+
+    def __len__(self):
+        return len(self.index)
+
+
+def _interval(old, new, interval):
+    #Returns (seconds between the snapshots, did the agent restart)
+    wall = None
+    if old.timestamp is not None and new.timestamp is not None: wall = new.timestamp - old.timestamp
+    if old.uptime is None or new.uptime is None:
+        if interval is None: interval = wall
+        if not interval or interval <= 0: raise ValueError('Need a positive interval, or tables with timestamps or uptimes')
+        return interval, False
+
+    ticks = new.uptime - old.uptime
+    if ticks < 0:
+        #Either sysUpTime wrapped (it was close to the top), or the agent restarted
+        if wall is not None and old.uptime + (wall + 1) * 200 >= UPTIME_WRAP: ticks += UPTIME_WRAP
+        else: return interval or wall or 0, True
+    elif wall is not None and new.uptime < (wall - 1) * 100:
+        return interval or wall, True #The agent has been up for less time than between the polls
+    if interval is None: interval = ticks / 100.0 #The agent's own clock is more accurate than ours
+    if interval <= 0: raise ValueError('The snapshots are not far enough apart to compute rates')
+    return interval, False
+
+
+def table_rates(old, new, columns=None, interval=None):
+    '''
+    Compute the deltas and per-second rates between two snapshots of the same table, for every row in both.
+    Counter32 wraps are handled, and a Counter64 going down marks the cell invalid (it was reset).
+    If both snapshots have an uptime (get_table_columnar(..., uptime=True)), the agent's clock is used for the interval,
+    and a restart of the agent between the snapshots is detected: every cell is invalid and discontinuity is set.
+    Example:
+        old = session.get_table_columnar('ifXTable', columns=['ifHCInOctets', 'ifHCOutOctets'], uptime=True)
+        time.sleep(30)
+        new = session.get_table_columnar('ifXTable', columns=['ifHCInOctets', 'ifHCOutOctets'], uptime=True)
+        rates = table_rates(old, new)
+    @param old: The older ColumnarTable.
+    @param new: The newer ColumnarTable.
+    @param columns: The columns to compute. Defaults to every counter column. (Optional)
+    @param interval: The seconds between the snapshots, if you know better than their timestamps and uptimes. (Optional)
+    @return: A TableRates.
+    @raise ValueError: The interval between the snapshots can't be found, or a column isn't numeric.
+    '''
+    interval, discontinuity = _interval(old, new, interval)
+    if columns is None: columns = [name for name, type in zip(new.columns, new.types) if type in COUNTER_TYPES]
+
+    #Line the rows of both snapshots up. Polls of a steady table usually have the very same rows, so check for that first.
+    if old.index == new.index:
+        index, oldPositions, newPositions = new.index, None, None
+    else:
+        oldPos = old.positions
+        pairs = [(oldPos[iid], x, iid) for x, iid in enumerate(new.index) if iid in oldPos]
+        index = [iid for op, np, iid in pairs]
+        oldPositions = [op for op, np, iid in pairs]
+        newPositions = [np for op, np, iid in pairs]
+
+    result = TableRates(index, interval, discontinuity)
+    for name in columns:
+        type = new.types[new.columns.index(name)]
+        if type is not None and type not in NUMERIC_TYPES: raise ValueError('Column %s is not numeric (%s)' % (name, type))
+        wrap = COUNTER_WRAPS.get(type)
+        resets = type == 'COUNTER64'
+        oldCol, newCol = old.column(name), new.column(name)
+        if oldPositions is not None:
+            oldCol = [oldCol[x] for x in oldPositions]
+            newCol = [newCol[x] for x in newPositions]
+        oldMissing, newMissing = old.missing(name), new.missing(name)
+
+        deltas = array(DELTA_TYPECODE, [0]*len(index))
+        rates = array('d', [0.0]*len(index))
+        invalid = set()
+        if discontinuity:
+            invalid.update(range(len(index)))
+        else:
+            for x, (before, after) in enumerate(zip(oldCol, newCol)):
+                try: delta = after - before
+                except TypeError: #Missing cell, or a value that isn't a number
+                    invalid.add(x)
+                    continue
+                if delta < 0:
+                    if wrap: delta += wrap
+                    elif resets:
+                        invalid.add(x)
+                        continue
+                deltas[x] = delta
+                rates[x] = delta / interval
+            #Cells missing from either snapshot
+            if oldMissing or newMissing:
+                for x in range(len(index)):
+                    op = x if oldPositions is None else oldPositions[x]
+                    np = x if newPositions is None else newPositions[x]
+                    if op in oldMissing or np in newMissing:
+                        invalid.add(x)
+                        deltas[x], rates[x] = 0, 0.0
+
+        result.deltas[name] = deltas
+        result.rates[name] = rates
+        result.invalid[name] = invalid
+    return result
@@ -0,0 +1,365 @@
+'''
+@author: Carl Verge
+@contact: carlverge@gmail.com
+@version: 12.06
+@requires: Python 2.6, net-snmp python bindings
+'''
+
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import namedtuple
+
+try: import queue
+except ImportError: import Queue as queue #Python 2
+
+from .SNMPython import SNMPythonSession, SNMPError, SNMPTimeoutError, SNMPHostDownError
+from .pool import SessionPool
+
+#Polls are scheduled on a clock that doesn't jump when the system time is set
+try: _clock = time.monotonic
+except AttributeError: _clock = time.time #Python 2
+
+#A poll result, given to the callback or put in the queue
+#   job: The PollJob it is for
+#   result: What the session method returned, or the SNMPError it raised (an SNMPTimeoutError if it missed its deadline)
+#   scheduled: When the poll was due, seconds since the epoch
+#   collected: When the result came back from the agent (or the deadline passed)
+#   elapsed: Seconds the poll took, from the request going out to collected (0 if it missed its deadline before going out)
+PollResult = namedtuple('PollResult', ['job', 'result', 'scheduled', 'collected', 'elapsed'])
+
+
+class PollJob(object):
+    '''
+    A session method run against a target every interval seconds, see PollScheduler.add_job.
+    @ivar target: A host string, or a dictionary of session arguments.
+    @ivar method: The SNMPythonSession method, eg. get_data or get_table.
+    @ivar args: The arguments for the method.
+    @ivar interval: Seconds between polls.
+    @ivar deadline: Seconds after a poll was due that it is given up on.
+    @ivar name: A name for the job, for the caller. Defaults to the method and arguments.
+    @ivar skipped: The number of polls skipped because the host was still busy with an earlier one.
+    '''
+    def __init__(self, target, method, args, interval, deadline, name=None):
+        self.target = target
+        self.method = method
+        self.args = tuple(args)
+        self.interval = interval
+        self.deadline = deadline
+        self.name = name or '%s%r' % (method, self.args)
+        self.skipped = 0
+        self._base = None #When the next poll is due, before the jitter
+        self._due = None
+        self._removed = False
+
+    def __repr__(self):
+        return '<PollJob %s %s every %ss>' % (self.name, self.target, self.interval)
+
+
+class _Poll(object):
+    #One request to a host for one or more jobs (several get_data jobs merged into one)
+    def __init__(self, host, jobs, deadline):
+        self.host = host
+        self.jobs = jobs #(job, when it was due) pairs
+        self.deadline = deadline
+        self.started = None
+        self.expired = False
+
+
+class PollScheduler(object):
+    '''
+    Runs get_data, get_table (or any session method) jobs against many hosts on fixed intervals, with a bounded pool of
+    worker threads. Results go to a callback or a queue, stamped with when they were collected.
+        scheduler = PollScheduler(max_workers=32, callback=store, Community='public', Version=2)
+        scheduler.add('10.0.0.1', ['sysUpTime.0', 'ifNumber.0'], 30)
+        scheduler.add_table('10.0.0.1', 'ifXTable', 30)
+        scheduler.add_table('10.0.0.1', 'entPhysicalTable', 300)
+        scheduler.start()
+
+    Start times are spread over the first interval at random, so jobs added together don't all go out at once, and
+    every poll gets up to jitter seconds of random delay on top. Polls stay on the interval they started on
+    (the next one is due interval seconds after the last one was due, not after it finished), so they don't drift.
+
+    Only one poll goes to a host at a time. When a poll comes due while the host is still busy with an earlier one,
+    the overlap policy decides what happens:
+        'skip' : The poll is skipped (and counted in the job's skipped), the job polls again on its next interval.
+        'merge' : The poll waits for the host to be free, along with any others that came due meanwhile. The
+                  waiting get_data jobs are merged into one get_data, the others run one after the other.
+
+    A poll that isn't done by its deadline gives an SNMPTimeoutError result when the deadline passes. The deadline
+    counts from when the poll was due, so time spent waiting for a free worker (or, when merging, for the host) uses
+    it up too, and a poll still waiting when it passes is never sent. A request can't be interrupted, so the host
+    stays busy until it returns, and its late result is dropped. To keep that short, each request's Timeout is cut
+    down so that all its retries fit in the time left before the deadline.
+
+    When a merged get_data fails (say one job asks for an OID the agent doesn't have, with SNMP v1), the jobs are
+    tried again one at a time, so only the job at fault gets the error. Timeouts aren't retried, the host is down.
+
+    @ivar results: The queue results are put in, when there is no callback.
+    @ivar stats: Counters: polls (requests sent), results, errors, skipped, merged (jobs sent along with another), late.
+    '''
+    #Deadlines default to this fraction of the interval
+    DEADLINE_FRACTION = 0.9
+
+    #The size of the scheduler's own SessionPool, if it isn't given one
+    POOL_SIZE = 64
+
+    def __init__(self, max_workers=16, callback=None, results=None, jitter=1.0, overlap='skip', pool=None,
+                 session_factory=SNMPythonSession, **kwargs):
+        '''
+        @param max_workers: The maximum number of polls in flight across all hosts.
+        @param callback: Called with each PollResult, from the worker threads. (Optional)
+        @param results: A queue (anything with put) for the PollResults, if there is no callback.
+                        Defaults to a new queue.Queue, see the results attribute. (Optional)
+        @param jitter: Up to this many seconds of random delay is added to each poll.
+        @param overlap: What to do with a poll that comes due while its host is busy, 'skip' or 'merge'.
+        @param pool: The SessionPool to take sessions from. Defaults to a pool of its own. (Optional)
+        @param session_factory: Callable used to build a session from keyword arguments. Ignored if a pool is given.
+        @param kwargs: Default SNMPythonSession arguments for every target (Community, Version, Timeout...)
+        '''
+        if max_workers < 1: raise ValueError('max_workers must be at least 1')
+        if overlap not in ('skip', 'merge'): raise ValueError("overlap must be 'skip' or 'merge'")
+        self.max_workers = max_workers
+        self.callback = callback
+        self.results = queue.Queue() if results is None and callback is None else results
+        self.jitter = jitter
+        self.overlap = overlap
+        self.session_kwargs = kwargs
+        if pool is None: pool = SessionPool(max_size=max(self.POOL_SIZE, max_workers), session_factory=session_factory)
+        self.pool = pool
+        self.stats = dict(polls=0, results=0, errors=0, skipped=0, merged=0, late=0)
+        self._cond = threading.Condition(threading.Lock())
+        self._heap = [] #(due, sequence, job)
+        self._sequence = itertools.count()
+        self._busy = {} #Host -> the _Poll running on it
+        self._waiting = {} #Host -> [(job, due)] waiting for it to be free, when merging
+        self._work = queue.Queue()
+        self._threads = []
+        self._loopStop = None #Set to stop the scheduling thread, a new one for each start
+        self._stopped = True
+
+    def _host_key(self, target):
+        return target.get('DestHost') if isinstance(target, dict) else target
+
+    def add_job(self, target, method, args, interval, deadline=None, name=None):
+        '''
+        Poll a target with any session method every interval seconds.
+        @param target: A host string, or a dictionary of session arguments that override the scheduler's.
+        @param method: The SNMPythonSession method name.
+        @param args: The arguments for the method.
+        @param interval: Seconds between polls.
+        @param deadline: Seconds after it is due that a poll has to be done by.
+                         Defaults to DEADLINE_FRACTION of the interval.
+        @param name: A name for the job, given back in the results. (Optional)
+        @return: The PollJob, see remove.
+        '''
+        if interval <= 0: raise ValueError('interval must be positive')
+        job = PollJob(target, method, args, interval, deadline or interval * self.DEADLINE_FRACTION, name)
+        with self._cond:
+            job._base = _clock() + random.uniform(0, interval) #Spread the start times
+            self._push(job)
+            self._cond.notify()
+        return job
+
+    def add(self, target, oids, interval, deadline=None, name=None):
+        '''
+        Poll OIDs with get_data every interval seconds, see add_job.
+        @param oids: A list of OIDs, or a string of them separated by spaces.
+        '''
+        if isinstance(oids, str): oids = oids.replace(',', ' ').split()
+        return self.add_job(target, 'get_data', oids, interval, deadline, name)
+
+    def add_table(self, target, table, interval, deadline=None, name=None):
+        '''
+        Poll a table with get_table every interval seconds, see add_job.
+        '''
+        return self.add_job(target, 'get_table', (table,), interval, deadline, name or table)
+
+    def remove(self, job):
+        '''Stop polling a job. A poll already running for it still delivers its result.'''
+        with self._cond: job._removed = True
+
+    def jobs(self):
+        '''@return: A list of the scheduled PollJobs.'''
+        with self._cond: return [job for due, sequence, job in self._heap if not job._removed]
+
+    def _push(self, job):
+        #Called with the lock held
+        job._due = job._base + random.uniform(0, self.jitter) if self.jitter else job._base
+        heapq.heappush(self._heap, (job._due, next(self._sequence), job))
+
+    def start(self):
+        '''Start the worker threads and the scheduling thread. They are daemon threads.'''
+        with self._cond:
+            if not self._stopped: return
+            self._stopped = False
+            self._loopStop = threading.Event()
+            #Polls that came due while stopped were missed, not late, the jobs carry on from their next interval
+            now, heap, self._heap = _clock(), self._heap, []
+            for due, sequence, job in heap:
+                if job._removed: continue
+                while job._base <= now: job._base += job.interval
+                self._push(job)
+        self._threads = [threading.Thread(target=self._worker) for x in range(self.max_workers)]
+        self._threads.append(threading.Thread(target=self._loop, args=(self._loopStop,)))
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def stop(self, wait=True):
+        '''
+        Stop scheduling polls. Polls already running finish and deliver their results.
+        @param wait: Wait for the running polls to finish.
+        '''
+        with self._cond:
+            self._stopped = True
+            if self._loopStop is not None: self._loopStop.set()
+            self._cond.notify_all()
+        for thread in self._threads[:-1]: self._work.put(None) #One for each worker, the last thread is _loop
+        if wait:
+            for thread in self._threads: thread.join()
+        self._threads = []
+
+    def _loop(self, stop):
+        with self._cond:
+            while not stop.is_set():
+                now = _clock()
+                for poll in list(self._busy.values()):
+                    if not poll.expired and poll.deadline <= now: self._expire(poll, now)
+                while self._heap and self._heap[0][0] <= now:
+                    due, sequence, job = heapq.heappop(self._heap)
+                    if job._removed: continue
+                    job._base += job.interval
+                    while job._base <= now: job._base += job.interval #Missed whole intervals, eg. the machine slept
+                    self._push(job)
+                    self._due(job, due)
+                wakeups = [self._heap[0][0]] if self._heap else []
+                wakeups.extend([poll.deadline for poll in self._busy.values() if not poll.expired])
+                self._cond.wait(max(min(wakeups) - now, 0.001) if wakeups else None)
+
+    def _due(self, job, due):
+        #A poll came due. Called with the lock held
+        host = self._host_key(job.target)
+        if host not in self._busy:
+            self._send(host, [(job, due)])
+        elif self.overlap == 'skip':
+            job.skipped += 1
+            self.stats['skipped'] += 1
+        else:
+            waiting = self._waiting.setdefault(host, [])
+            if job not in [waiting_job for waiting_job, waiting_due in waiting]: waiting.append((job, due))
+
+    def _send(self, host, jobs):
+        #Called with the lock held. The deadline runs from when the jobs were due, not from when a worker gets to them
+        poll = _Poll(host, jobs, min([due + job.deadline for job, due in jobs]))
+        self._busy[host] = poll
+        self._work.put(poll)
+        self._cond.notify() #The scheduling thread wakes up for the deadline
+
+    def _expire(self, poll, now):
+        #Called with the lock held
+        poll.expired = True
+        self.stats['late'] += len(poll.jobs)
+        for job, due in poll.jobs:
+            error = SNMPTimeoutError('The poll missed its deadline of %gs' % job.deadline)
+            result = self._result(job, error, due, now, poll)
+            self._count(result)
+            if self.callback is None: self.results.put(result)
+            else: self._work.put(result) #Don't hold up the scheduler with the callback, a worker calls it
+
+    def _result(self, job, value, due, now, poll):
+        #The scheduling runs on _clock, the results are stamped with the time of day
+        wallTime = time.time()
+        return PollResult(job, value, wallTime - (now - due), wallTime, 0.0 if poll.started is None else now - poll.started)
+
+    def _count(self, result):
+        #Called with the lock held
+        self.stats['results'] += 1
+        if isinstance(result.result, SNMPError): self.stats['errors'] += 1
+
+    def _deliver(self, result):
+        if self.callback is None:
+            self.results.put(result)
+            return
+        try: self.callback(result)
+        except Exception: pass #A broken callback mustn't take the workers down with it
+
+    def _worker(self):
+        while True:
+            item = self._work.get()
+            if item is None: return
+            if isinstance(item, PollResult):
+                self._deliver(item)
+                continue
+            self._run(item)
+
+    def _run(self, poll):
+        with self._cond:
+            if poll.expired: #It waited past its deadline and has been reported late, don't send it at all
+                self._free(poll)
+                return
+            poll.started = _clock()
+            self.stats['polls'] += 1
+
+        results, gets = [], {}
+        for job, due in poll.jobs:
+            if job.method == 'get_data': gets.setdefault(repr(job.target), []).append((job, due))
+            else:
+                result = self._call(job.target, job.method, job.args, poll.deadline)
+                results.append(self._result(job, result, due, _clock(), poll))
+        for merged in gets.values(): results.extend(self._run_gets(poll, merged))
+
+        with self._cond:
+            self._free(poll)
+            if poll.expired: return
+            for result in results: self._count(result)
+        for result in results: self._deliver(result)
+
+    def _free(self, poll):
+        #The host is done with the poll, send it the polls that waited for it. Called with the lock held
+        del self._busy[poll.host]
+        waiting = self._waiting.pop(poll.host, None)
+        if waiting and not self._stopped: self._send(poll.host, waiting)
+        if len(poll.jobs) > 1: self.stats['merged'] += len(poll.jobs) - 1
+
+    def _run_gets(self, poll, gets):
+        #One get_data for all the jobs with the same target, the values handed back to each
+        oids = [oid for job, due in gets for oid in job.args]
+        result = self._call(gets[0][0].target, 'get_data', oids, poll.deadline)
+        now = _clock()
+        if isinstance(result, SNMPError) and len(gets) > 1 and not isinstance(result, (SNMPTimeoutError, SNMPHostDownError)):
+            #One job's bad OID fails them all, find out which one it was
+            return [single for get in gets for single in self._run_gets(poll, [get])]
+        if len(oids) == 1: result = (result,)
+        results, position = [], 0
+        for job, due in gets:
+            if isinstance(result, SNMPError): value = result
+            else:
+                value = result[position:position+len(job.args)]
+                if len(job.args) == 1: value = value[0]
+            position += len(job.args)
+            results.append(self._result(job, value, due, now, poll))
+        return results
+
+    def _call(self, target, method, args, deadline):
+        kwargs = dict(self.session_kwargs)
+        if isinstance(target, dict): kwargs.update(target)
+        else: kwargs['DestHost'] = target
+        try:
+            with self.pool.session(**kwargs) as session:
+                timeout = session.Timeout
+                try:
+                    remaining = deadline - _clock()
+                    if remaining <= 0: raise SNMPTimeoutError('Request timed out', None, -24)
+                    #Give up by the deadline, every try gets its share of the time left
+                    perTry = max(int(remaining * 1000000 / (int(session.Retries) + 1)), 1)
+                    if timeout <= 0 or perTry < timeout: session.Timeout = perTry
+                    return getattr(session, method)(*args)
+                finally:
+                    session.Timeout = timeout #The session goes back to the pool
+        except SNMPError as e:
+            return e
+        except Exception as e: #Report it against the job like any other failure
+            return SNMPError('%s: %s' % (e.__class__.__name__, e))
@@ -0,0 +1,229 @@
+'''
+@author: Carl Verge
+@contact: carlverge@gmail.com
+@version: 12.06
+@requires: Python 3.3, net-snmp python bindings
+'''
+
+import heapq
+import multiprocessing
+import time
+from multiprocessing.connection import wait
+
+from . import SNMPython
+from .SNMPython import SNMPError
+from .poller import SNMPythonPoller
+
+
+class _ShardPoller(SNMPythonPoller):
+    #Times every job, so the parent learns what each host costs
+    def _run_job(self, target, method, args):
+        start = time.time()
+        try:
+            result = SNMPythonPoller._run_job(self, target, method, args)
+        except SNMPError as e:
+            result = e
+        return time.time() - start, result
+
+
+def _pack(result):
+    '''
+    A compact, picklable form of a result. Tables go as plain tuples with the column names sent once, row classes
+    are built on the fly and can't be pickled, and errors lose their netsnmp varlist.
+    '''
+    if isinstance(result, SNMPError):
+        return ('error', result.__class__.__name__, result.errstring, result.errno, result.errind)
+    if isinstance(result, dict) and result:
+        row = next(iter(result.values()))
+        if hasattr(row, '_fields'):
+            return ('rows', row.__class__.__name__, row._fields, [(index, tuple(row)) for index, row in result.items()])
+    if hasattr(result, '_fields'):
+        return ('row', result.__class__.__name__, result._fields, tuple(result))
+    return ('value', result)
+
+def _unpack(packed):
+    kind = packed[0]
+    if kind == 'error':
+        name, errstring, errno, errind = packed[1:]
+        errorClass = getattr(SNMPython, name, SNMPError)
+        return errorClass(errstring, errno, errind)
+    if kind == 'rows':
+        rowClass = SNMPython._row_class(packed[1], packed[2])
+        return dict((index, rowClass(*values)) for index, values in packed[3])
+    if kind == 'row':
+        return SNMPython._row_class(packed[1], packed[2])(*packed[3])
+    return packed[1]
+
+
+def _shard_worker(connection, jobs, threads, max_per_host, session_kwargs):
+    #Runs in the worker process: poll the shard with threads, and send (job number, seconds, packed result) as each finishes
+    poller = _ShardPoller(max_workers=threads, max_per_host=max_per_host, **session_kwargs)
+    jobids = [jobid for jobid, job in jobs]
+    for position, target, result in poller._run([job for jobid, job in jobs]):
+        if isinstance(result, SNMPError): elapsed = None #It failed outside of the session, see SNMPythonPoller._worker
+        else: elapsed, result = result
+        connection.send((jobids[position], elapsed, _pack(result)))
+    connection.send(None) #Done
+    connection.close()
+
+
+class ShardedPoller(object):
+    '''
+    Polls many agents with a pool of worker processes, each running a SNMPythonPoller over its share of the targets.
+    Decoding replies and building tables is python code that holds the GIL, so one process tops out at one core
+    however many threads it runs. Use this for big estates, where a cycle is CPU bound rather than waiting on the agents.
+
+    It has the same interface as SNMPythonPoller:
+        poller = ShardedPoller(processes=8, threads=32, Community='public', Version=2)
+        for target, result in poller.get_table_many(hosts, 'ifTable'):
+            if isinstance(result, SNMPError): print target, 'failed:', result
+            else: print target, len(result)
+
+    Each run splits the jobs into one shard per process, balanced by the expected cost of each host: the time its
+    last job took (learned as the runs go), or what the cost function says. Results are streamed back as each host
+    finishes in a compact form (tables as tuples, the column names once per table) and rebuilt in this process.
+
+    A worker that dies, or sends nothing for stall_timeout seconds, is killed and the jobs it hadn't finished
+    are handed to a new worker, up to retries times. After that they yield an SNMPError, the rest of the cycle carries on.
+    Session arguments, targets and job arguments have to be picklable.
+
+    @ivar costs: Host -> the seconds its last job took, smoothed. Used to balance the shards.
+    '''
+
+    #Seconds a worker may go without finishing a job before it is considered stuck
+    STALL_TIMEOUT = 300
+
+    def __init__(self, processes=None, threads=16, max_per_host=1, stall_timeout=None, retries=1, cost=None, **kwargs):
+        '''
+        @param processes: The number of worker processes. Defaults to the number of cores.
+        @param threads: The requests in flight at once in each worker, see SNMPythonPoller max_workers.
+        @param max_per_host: The requests in flight to any single host, within a worker.
+        @param stall_timeout: Seconds without a result before a worker is killed. Defaults to STALL_TIMEOUT.
+        @param retries: How many times the jobs of a failed worker are handed to a new one.
+        @param cost: A function of the target giving its expected cost, for balancing the shards. (Optional)
+                     Defaults to the learned costs, or their average for hosts that haven't been seen yet.
+        @param kwargs: Default SNMPythonSession arguments for every target (Community, Version, Timeout...)
+        '''
+        if threads < 1 or max_per_host < 1: raise ValueError('threads and max_per_host must be at least 1')
+        self.processes = processes or multiprocessing.cpu_count()
+        self.threads = threads
+        self.max_per_host = max_per_host
+        self.stall_timeout = stall_timeout or self.STALL_TIMEOUT
+        self.retries = retries
+        self.cost = cost
+        self.session_kwargs = kwargs
+        self.costs = {}
+
+    def _host_key(self, target):
+        return target.get('DestHost') if isinstance(target, dict) else target
+
+    def expected_cost(self, target):
+        '''@return: What a job for the target is expected to cost, see the cost constructor argument.'''
+        if self.cost is not None: return self.cost(target)
+        cost = self.costs.get(self._host_key(target))
+        if cost is not None: return cost
+        return sum(self.costs.values()) / len(self.costs) if self.costs else 1.0
+
+    def shard(self, jobs, shards):
+        '''
+        Split the jobs into shards of about the same total cost: the most expensive job first, to the cheapest shard.
+        @param jobs: A list of (job number, (target, method, args)).
+        @return: A list of up to shards lists of jobs.
+        '''
+        costed = sorted(jobs, key=lambda job: self.expected_cost(job[1][0]), reverse=True)
+        heap = [(0.0, number, []) for number in range(min(shards, len(jobs)))]
+        for job in costed:
+            total, number, shard = heapq.heappop(heap)
+            shard.append(job)
+            heapq.heappush(heap, (total + self.expected_cost(job[1][0]), number, shard))
+        return [shard for total, number, shard in sorted(heap, key=lambda entry: entry[1])]
+
+    def _start(self, shard):
+        #A worker process for the shard. Returns [process, connection, jobs not yet finished, time of the last result]
+        parent, child = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=_shard_worker, args=(child, shard, self.threads, self.max_per_host,
+                                                                      self.session_kwargs))
+        process.daemon = True
+        process.start()
+        child.close()
+        return [process, parent, dict(shard), time.time()]
+
+    def _learn(self, target, elapsed):
+        host = self._host_key(target)
+        previous = self.costs.get(host)
+        self.costs[host] = elapsed if previous is None else (previous + elapsed) / 2.0
+
+    def run(self, jobs):
+        '''
+        Run arbitrary SNMPythonSession methods against many targets, see SNMPythonPoller.run.
+        @param jobs: An iterable of (target, method name, argument tuple).
+        @return: A generator yielding (target, result) as each job completes. The result is whatever the
+                 method returned, or the SNMPError it raised or the worker failure.
+        '''
+        jobs = list(enumerate(jobs))
+        if not jobs: return
+        failures = {} #Job number -> times its worker failed
+        workers = {} #Connection -> worker, see _start
+        for shard in self.shard(jobs, self.processes):
+            worker = self._start(shard)
+            workers[worker[1]] = worker
+
+        try:
+            while workers:
+                broken = set() #Connections closed by the worker without saying it was done
+                for connection in wait(list(workers), timeout=1.0):
+                    worker = workers[connection]
+                    try: message = connection.recv()
+                    except (EOFError, OSError):
+                        broken.add(connection)
+                        continue
+                    if message is None: #Done
+                        del workers[connection]
+                        connection.close()
+                        worker[0].join()
+                    else:
+                        jobid, elapsed, packed = message
+                        target = worker[2].pop(jobid)[0]
+                        worker[3] = time.time()
+                        if elapsed is not None: self._learn(target, elapsed)
+                        yield target, _unpack(packed)
+
+                now = time.time()
+                for connection, worker in list(workers.items()):
+                    process, unfinished = worker[0], worker[2]
+                    stuck = process.is_alive()
+                    if connection not in broken:
+                        if stuck and now - worker[3] < self.stall_timeout: continue
+                        if not stuck and connection.poll(): continue #Read what it sent before it exited first
+                    #Dead or stuck, hand its unfinished jobs to a new worker
+                    process.terminate()
+                    process.join()
+                    connection.close()
+                    del workers[connection]
+                    retry = []
+                    for jobid, job in unfinished.items():
+                        failures[jobid] = failures.get(jobid, 0) + 1
+                        if failures[jobid] > self.retries:
+                            reason = 'stuck' if stuck else 'exit code %s' % process.exitcode
+                            yield job[0], SNMPError('The worker process polling it failed (%s)' % reason)
+                        else:
+                            retry.append((jobid, job))
+                    if retry:
+                        worker = self._start(retry)
+                        workers[worker[1]] = worker
+        finally: #Also runs if the caller stops iterating early
+            for process, connection, unfinished, last in workers.values():
+                process.terminate()
+                connection.close()
+
+    def poll_many(self, targets, *oids):
+        '''
+        Perform get_data for the same OIDs on every target, see SNMPythonPoller.poll_many.
+        '''
+        return self.run([(target, 'get_data', oids) for target in targets])
+
+    def get_table_many(self, targets, table):
+        '''
+        Perform get_table for the same table on every target, see SNMPythonPoller.get_table_many.
+        '''
+        return self.run([(target, 'get_table', (table,)) for target in targets])
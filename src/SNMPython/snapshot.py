@@ -0,0 +1,296 @@
+'''
+@author: Carl Verge
+@contact: carlverge@gmail.com
+@version: 12.06
+@requires: Python 3
+
+Snapshots of walk results on disk, for archiving polls, historical queries and testing against real data offline.
+A snapshot file keeps the OIDs and the values in separate columns, sorted by OID, and is memory-mapped when opened:
+nothing is read up front, a lookup is a binary search, and a prefix scan only touches the pages it covers.
+
+To archive a walk (with numeric OIDs, or names and a MIBIndex):
+    write_snapshot(from_varbinds(session.iter_subtree_numeric('.1.3.6.1.2.1.2')), 'router1-1339000000.snap')
+
+To query it, compare it with another poll, or answer requests with it:
+    snapshot = Snapshot('router1-1339000000.snap')
+    snapshot.get('.1.3.6.1.2.1.2.2.1.2.3') #('OCTETSTR', b'GigabitEthernet0/3')
+    for oid, type, value in snapshot.scan('.1.3.6.1.2.1.2.2.1.10'): ...
+    for oid, old, new in snapshot.diff(Snapshot('router1-1339000300.snap')): ...
+    agent = SimulatedAgent(snapshot).start() #See the agent module, sessions can get_data, walk and getbulk it
+
+OIDs and values are in the form MIBStore uses: tuples of ints, and values as ber.encode_value takes them.
+'''
+
+import mmap
+import os
+import struct
+import time
+
+from . import ber
+from .backend import ber_value, netsnmp_value
+
+MAGIC = b'SNMPYSS1'
+_HEADER = struct.Struct('<8sIdII') #Magic, number of objects, timestamp, size of the OIDs, size of the values
+_OFFSET = struct.Struct('<I')
+_SPAN = struct.Struct('<II')
+
+#Types that say there is no object, they are not stored
+_EXCEPTIONS = ('NOSUCHOBJECT', 'NOSUCHINSTANCE', 'ENDOFMIBVIEW')
+
+
+def _key(oid, parents=None):
+    #OIDs are stored so they sort as bytes the way they do as tuples, and a prefix is a prefix: each number on its own
+    #is one byte under 0x80, or a first byte saying how many follow (0x80-0xBF one, 0xC0-0xDF two, 0xE0 four), big endian.
+    #Given a dictionary, the keys of the parents are remembered in it: a walk has few of them, and long indexes are slow
+    if isinstance(oid, str): oid = ber.parse_oid(oid)
+    if parents is not None and len(oid) > 1:
+        parent = parents.get(oid[:-1])
+        if parent is None: parent = parents[oid[:-1]] = _key(oid[:-1])
+        return parent + _key(oid[-1:])
+    if not oid or max(oid) < 0x80: return bytes(oid) #Most of them
+    out = bytearray()
+    for n in oid:
+        if n < 0x80: out.append(n)
+        elif n < 0x4000: out.extend((0x80 | n >> 8, n & 0xFF))
+        elif n < 0x200000: out.extend((0xC0 | n >> 16, n >> 8 & 0xFF, n & 0xFF))
+        elif n < 2**32: out.extend(b'\xe0' + n.to_bytes(4, 'big'))
+        else: raise ValueError('The numbers of an OID have to fit in 32 bits: %r' % (oid,))
+    return bytes(out)
+
+def _oid(key):
+    if max(key) < 0x80: return tuple(key)
+    oid, pos = [], 0
+    while pos < len(key):
+        first = key[pos]
+        if first < 0x80: size, n = 1, first
+        elif first < 0xC0: size, n = 2, first & 0x3F
+        elif first < 0xE0: size, n = 3, first & 0x1F
+        else: size, n = 5, 0
+        for byte in key[pos+1:pos+size]: n = n << 8 | byte
+        oid.append(n)
+        pos += size
+    return tuple(oid)
+
+def _contents(encoded):
+    #The tag and the contents of an encoded value
+    length = encoded[1]
+    return encoded[0], encoded[2 + (length & 0x7F if length & 0x80 else 0):]
+
+
+def from_varbinds(entries, mib_index=None):
+    '''
+    Turn session results into objects for write_snapshot.
+    @param entries: An iterable of (tag, iid, value, type), like get_subtree_data_oids or iter_subtree_numeric return.
+    @param mib_index: A mibindex.MIBIndex to translate named tags with. Without one the tags have to be numeric. (Optional)
+    @return: A generator of (OID, type, value).
+    @raise ValueError: A tag is a name that can't be translated.
+    '''
+    for tag, iid, val, type in entries:
+        name = '%s.%s' % (tag, iid) if iid else tag
+        if mib_index is not None: name = mib_index.numeric(name) or name
+        try: oid = ber.parse_oid(name)
+        except ValueError: raise ValueError('Unknown Object Identifier %s, snapshots need numeric OIDs or a MIBIndex' % name)
+        yield oid, type, ber_value(type, val)
+
+
+def write_snapshot(objects, path, timestamp=None):
+    '''
+    Write a snapshot file.
+    Layout: header, the OID offsets, the value offsets, one type tag byte per object, the OIDs, then the value contents.
+    The offsets have one extra entry, the end of the last one.
+    @param objects: A dictionary of OID -> (type, value), or an iterable of (OID, type, value), in any order.
+                    OIDs can be tuples or numeric strings. A later object replaces an earlier one with the same OID.
+    @param path: The file to write.
+    @param timestamp: When the data was polled, seconds since the epoch. Defaults to now.
+    @return: The number of objects written.
+    @raise ValueError: The OIDs or values add up to more than 4GB.
+    '''
+    if isinstance(objects, dict): objects = [(oid, type, value) for oid, (type, value) in objects.items()]
+    encoded, parents = {}, {}
+    for oid, type, value in objects:
+        if type in _EXCEPTIONS: continue
+        encoded[_key(oid, parents)] = _contents(ber.encode_value(type, value))
+    keys = sorted(encoded)
+
+    oidOffsets, valueOffsets, types, values = [0], [0], bytearray(), []
+    for key in keys:
+        tag, contents = encoded[key]
+        oidOffsets.append(oidOffsets[-1] + len(key))
+        valueOffsets.append(valueOffsets[-1] + len(contents))
+        types.append(tag)
+        values.append(contents)
+    if oidOffsets[-1] >= 2**32 or valueOffsets[-1] >= 2**32: raise ValueError('A snapshot can hold up to 4GB of OIDs and of values')
+
+    if timestamp is None: timestamp = time.time()
+    out = open(path + '.tmp', 'wb')
+    try:
+        out.write(_HEADER.pack(MAGIC, len(keys), timestamp, oidOffsets[-1], valueOffsets[-1]))
+        out.write(struct.pack('<%dI' % len(oidOffsets), *oidOffsets))
+        out.write(struct.pack('<%dI' % len(valueOffsets), *valueOffsets))
+        out.write(types)
+        out.write(b''.join(keys))
+        out.write(b''.join(values))
+    finally:
+        out.close()
+    os.rename(path + '.tmp', path) #Readers that already mapped the old file keep it until they close it
+    return len(keys)
+
+
+class Snapshot(object):
+    '''
+    A memory-mapped snapshot file, see write_snapshot and the module documentation. It is read-only, so one snapshot
+    can be shared by every thread, and it has the get and getnext of a MIBStore so a SimulatedAgent can serve it.
+
+    @ivar timestamp: When the data was polled, seconds since the epoch.
+    '''
+    #The objects read at a time when scanning
+    CHUNK = 1024
+
+    def __init__(self, path):
+        '''
+        @param path: A file made by write_snapshot.
+        @raise ValueError: The file is not a snapshot.
+        '''
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except:
+            self._file.close()
+            raise
+        magic, self._count, self.timestamp, oidSize, valueSize = (_HEADER.unpack_from(self._map, 0) if len(self._map) >= _HEADER.size
+                                                                  else (None, 0, 0, 0, 0))
+        if magic != MAGIC:
+            self.close()
+            raise ValueError('%s is not a snapshot' % path)
+        self._oidOffsets = _HEADER.size
+        self._valueOffsets = self._oidOffsets + (self._count + 1) * _OFFSET.size
+        self._types = self._valueOffsets + (self._count + 1) * _OFFSET.size
+        self._oids = self._types + self._count
+        self._values = self._oids + oidSize
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def _key(self, position):
+        start, end = _SPAN.unpack_from(self._map, self._oidOffsets + position * _OFFSET.size)
+        return self._map[self._oids + start:self._oids + end]
+
+    def _value(self, position):
+        #(type, value) of the position'th object, decoded straight out of the map
+        tag = self._map[self._types + position]
+        start, end = _SPAN.unpack_from(self._map, self._valueOffsets + position * _OFFSET.size)
+        return ber.TAG_TYPES[tag], ber.decode_value(tag, self._map, self._values + start, self._values + end)
+
+    def _find(self, key, after=False):
+        #The position of the first OID >= key (> key if after)
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            found = self._key(middle)
+            if found < key or (after and found == key): low = middle + 1
+            else: high = middle
+        return low
+
+    def _raw(self, start, stop=None):
+        #(key, tag, encoded contents) of the objects from position start, a chunk of offsets at a time
+        if stop is None: stop = self._count
+        data = self._map
+        for chunk in range(start, stop, self.CHUNK):
+            count = min(self.CHUNK, stop - chunk)
+            oidOffsets = struct.unpack_from('<%dI' % (count + 1), data, self._oidOffsets + chunk * _OFFSET.size)
+            valueOffsets = struct.unpack_from('<%dI' % (count + 1), data, self._valueOffsets + chunk * _OFFSET.size)
+            types = data[self._types + chunk:self._types + chunk + count]
+            for x in range(count):
+                yield (data[self._oids + oidOffsets[x]:self._oids + oidOffsets[x+1]], types[x],
+                       data[self._values + valueOffsets[x]:self._values + valueOffsets[x+1]])
+
+    def get(self, oid):
+        '''
+        @param oid: An OID, a tuple or a numeric string.
+        @return: (type, value), or ('NOSUCHINSTANCE', None) if there is no such object.
+        '''
+        key = _key(oid)
+        position = self._find(key)
+        if position == self._count or self._key(position) != key: return 'NOSUCHINSTANCE', None
+        return self._value(position)
+
+    def getnext(self, oid):
+        '''
+        @return: (next OID, type, value), or (oid, 'ENDOFMIBVIEW', None) past the last object.
+        '''
+        position = self._find(_key(oid), after=True)
+        if position == self._count: return oid, 'ENDOFMIBVIEW', None
+        return (_oid(self._key(position)),) + self._value(position)
+
+    def __contains__(self, oid):
+        key = _key(oid)
+        position = self._find(key)
+        return position < self._count and self._key(position) == key
+
+    def scan(self, prefix=()):
+        '''
+        The objects under an OID, in order.
+        @param prefix: An OID, a tuple or a numeric string. Defaults to all the objects.
+        @return: A generator of (OID, type, value).
+        '''
+        prefix = _key(prefix)
+        for key, tag, contents in self._raw(self._find(prefix)):
+            if not key.startswith(prefix): return
+            yield (_oid(key),) + self._decode((key, tag, contents))
+
+    def __iter__(self):
+        return self.scan()
+
+    def walk(self, prefix=()):
+        '''
+        The objects under an OID the way a session walk returns them.
+        @return: A generator of (tag, iid, value, type) with numeric tags, like iter_subtree_numeric.
+        '''
+        for oid, type, value in self.scan(prefix):
+            yield ber.format_oid(oid[:-1]), str(oid[-1]), netsnmp_value(type, value), type
+
+    def diff(self, other, prefix=()):
+        '''
+        Compare with another snapshot, usually a later poll of the same agent. Both are read in order side by side,
+        and only the objects that changed are decoded.
+        Example:
+            for oid, old, new in Snapshot('before.snap').diff(Snapshot('after.snap'), '.1.3.6.1.2.1.2.2.1.8'):
+                print(oid[-1], 'ifOperStatus', old and old[1], '->', new and new[1])
+        @param other: The Snapshot to compare with.
+        @param prefix: Only compare the objects under this OID. (Optional)
+        @return: A generator of (OID, (type, value) here, (type, value) in other) in OID order, for every object that
+                 is different. Objects only in one of them have None for the other.
+        '''
+        prefix = _key(prefix)
+        mine = self._raw(self._find(prefix))
+        theirs = other._raw(other._find(prefix))
+        old, new = next(mine, None), next(theirs, None)
+        if old is not None and not old[0].startswith(prefix): old = None
+        if new is not None and not new[0].startswith(prefix): new = None
+        while old is not None or new is not None:
+            if new is None or (old is not None and old[0] < new[0]):
+                yield _oid(old[0]), self._decode(old), None
+                old = next(mine, None)
+            elif old is None or new[0] < old[0]:
+                yield _oid(new[0]), None, self._decode(new)
+                new = next(theirs, None)
+            else:
+                if old[1:] != new[1:]: yield _oid(old[0]), self._decode(old), self._decode(new)
+                old, new = next(mine, None), next(theirs, None)
+            if old is not None and not old[0].startswith(prefix): old = None
+            if new is not None and not new[0].startswith(prefix): new = None
+
+    def _decode(self, raw):
+        key, tag, contents = raw
+        return ber.TAG_TYPES[tag], ber.decode_value(tag, contents, 0, len(contents))
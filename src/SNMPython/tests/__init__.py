@@ -0,0 +1,44 @@
+'''
+@author: Carl Verge
+@contact: carlverge@gmail.com
+@version: 12.06
+@requires: Python 3
+
+Tests for SNMPython, against SimulatedAgents on localhost with the python backend, so they need neither a real agent
+nor the net-snmp bindings. From the src directory (or the top of the project):
+    python -m pytest -q
+'''
+
+import os
+import shutil
+import tempfile
+
+from ..agent import IF_ENTRY
+from ..mibindex import build_index, MIBIndex
+
+#Enough of SNMPv2-MIB and IF-MIB to name everything synthetic_if_table serves
+IF_COLUMNS = ('ifIndex', 'ifDescr', 'ifType', 'ifMtu', 'ifSpeed', 'ifPhysAddress', 'ifAdminStatus', 'ifOperStatus',
+              'ifLastChange', 'ifInOctets', 'ifInUcastPkts', 'ifInNUcastPkts', 'ifInDiscards', 'ifInErrors',
+              'ifInUnknownProtos', 'ifOutOctets', 'ifOutUcastPkts', 'ifOutNUcastPkts', 'ifOutDiscards', 'ifOutErrors',
+              'ifOutQLen', 'ifSpecific')
+MIB_ENTRIES = [('iso', '1'), ('org', '1.3'), ('dod', '1.3.6'), ('internet', '1.3.6.1'), ('mgmt', '1.3.6.1.2'),
+               ('mib-2', '1.3.6.1.2.1'), ('system', '1.3.6.1.2.1.1'), ('sysDescr', '1.3.6.1.2.1.1.1'),
+               ('sysObjectID', '1.3.6.1.2.1.1.2'), ('sysUpTime', '1.3.6.1.2.1.1.3'), ('sysName', '1.3.6.1.2.1.1.5'),
+               ('interfaces', '1.3.6.1.2.1.2'), ('ifNumber', '1.3.6.1.2.1.2.1'), ('ifTable', '1.3.6.1.2.1.2.2'),
+               ('ifEntry', '1.3.6.1.2.1.2.2.1')]
+MIB_ENTRIES += [(label, '.'.join([str(x) for x in IF_ENTRY + (column,)])) for column, label in enumerate(IF_COLUMNS, 1)]
+
+
+class TemporaryIndex(object):
+    '''
+    A MIBIndex of MIB_ENTRIES in a temporary directory, removed again by close.
+    '''
+    def __init__(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'mibs.idx')
+        build_index(MIB_ENTRIES, path)
+        self.index = MIBIndex(path)
+
+    def close(self):
+        self.index.close()
+        shutil.rmtree(self.directory)
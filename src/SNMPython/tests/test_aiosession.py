@@ -0,0 +1,167 @@
+import asyncio
+import time
+import unittest
+
+from ..SNMPython import SNMPError, SNMPTimeoutError, SNMPNoSuchNameError
+from ..agent import SimulatedAgent, MIBStore, synthetic_if_table
+from ..aiosession import AsyncSNMPythonSession
+from . import TemporaryIndex, IF_COLUMNS
+from .test_session import ROWS, IF_DESCR, _session
+
+SYSNAME = '.1.3.6.1.2.1.1.5.0'
+
+
+def _async_session(agent, **kwargs):
+    kwargs.setdefault('Version', 2)
+    kwargs.setdefault('Timeout', 1000000)
+    kwargs.setdefault('Retries', 1)
+    return AsyncSNMPythonSession(DestHost=agent.address, **kwargs)
+
+
+class AsyncSessionTest(unittest.TestCase):
+    #Arguments for the SimulatedAgent, every test gets one of its own
+    AGENT = {}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.mibs = TemporaryIndex()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.mibs.close()
+
+    def setUp(self):
+        self.agent = SimulatedAgent(MIBStore(synthetic_if_table(ROWS)), **self.AGENT).start()
+
+    def tearDown(self):
+        self.agent.stop()
+
+    def run_session(self, test, **kwargs):
+        #Run test(session) on a new event loop, closing the session after
+        async def run():
+            async with _async_session(self.agent, **kwargs) as session: return await test(session)
+        return asyncio.run(run())
+
+
+class AsyncGetTest(AsyncSessionTest):
+    def test_get(self):
+        async def test(session):
+            self.assertEqual(await session.get_data('.1.3.6.1.2.1.1.1.0', IF_DESCR + '.3'),
+                             ('SNMPython simulated agent', 'GigabitEthernet0/3'))
+            self.assertEqual(await session['ifDescr.2'], 'GigabitEthernet0/2')
+            self.assertEqual(await session.get_next_data('ifDescr'), 'GigabitEthernet0/1')
+            self.assertTrue(await session.contains(SYSNAME))
+            self.assertFalse(await session.contains('.1.3.6.1.2.1.1.99.0'))
+            self.assertEqual(await session.get_row_data('2', 'ifIndex', 'ifDescr'), ('2', 'GigabitEthernet0/2'))
+        self.run_session(test, MIBIndex=self.mibs.index)
+
+    def test_set(self):
+        async def test(session):
+            await session.set_data(('sysName.0', 'router1'))
+            self.assertEqual(await session.get_data('sysName.0'), 'router1')
+            with self.assertRaises(SNMPError): await session.set_data(('.1.3.6.1.2.1.1.6.0', 'Closet')) #No type to take
+        self.run_session(test, MIBIndex=self.mibs.index)
+
+    def test_names_need_index(self):
+        async def test(session):
+            with self.assertRaises(SNMPError): await session.get_data('sysName.0')
+        self.run_session(test)
+
+    def test_error_map(self):
+        #SNMP v1 reports a missing object with a noSuchName error
+        async def test(session):
+            with self.assertRaises(SNMPNoSuchNameError): await session.get_data('.1.3.6.1.2.1.1.99.0')
+        self.run_session(test, Version=1)
+
+    def test_many_in_flight(self):
+        #Every agent response is held back for 0.2s, one request at a time would take minutes.
+        #A burst this big can overflow the socket buffers, the retries cover what the kernel drops.
+        self.agent.latency = 0.2
+        oids = ['%s.%d' % (IF_DESCR, x % ROWS + 1) for x in range(2000)]
+        async def test(session):
+            return await asyncio.gather(*[session.get_data(oid) for oid in oids])
+        start = time.time()
+        values = self.run_session(test, Timeout=500000, Retries=5)
+        self.assertTrue(time.time() - start < 10)
+        self.assertEqual(values, ['GigabitEthernet0/%d' % (x % ROWS + 1) for x in range(2000)])
+        self.assertTrue(self.agent.stats['get'] >= 2000)
+
+    def test_split(self):
+        #More varbinds than the agent takes: split on tooBig and sent at once
+        self.agent.max_varbinds = 10
+        oids = ['%s.%d' % (IF_DESCR, x) for x in range(1, ROWS + 1)]
+        async def test(session):
+            return await session.get_data(*oids)
+        self.assertEqual(len(self.run_session(test)), ROWS)
+        self.assertTrue(self.agent.stats['too_big'] > 0)
+
+
+class AsyncWalkTest(AsyncSessionTest):
+    def setUp(self):
+        AsyncSessionTest.setUp(self)
+        self.session = _session(self.agent, MIBIndex=self.mibs.index)
+
+    def test_subtree(self):
+        async def test(session):
+            return await session.get_subtree_data_oids('ifDescr'), await session.get_subtree_data(IF_DESCR)
+        oids, values = self.run_session(test, MIBIndex=self.mibs.index)
+        self.assertEqual(oids, self.session.get_subtree_data_oids('ifDescr'))
+        self.assertEqual(values, self.session.get_subtree_data(IF_DESCR))
+        self.assertEqual(len(values), ROWS)
+
+    def test_table(self):
+        async def test(session):
+            return (await session.get_table('ifTable'), await session.get_table('ifTable', columns=['ifDescr', 'ifInOctets']),
+                    await session.get_table_indicies('ifTable'))
+        table, columns, indicies = self.run_session(test, MIBIndex=self.mibs.index, MaxRepetitions=7)
+        self.assertEqual(table, self.session.get_table('ifTable'))
+        self.assertEqual(type(table['1'])._fields, IF_COLUMNS)
+        self.assertEqual(columns, self.session.get_table('ifTable', columns=['ifDescr', 'ifInOctets']))
+        self.assertEqual(indicies, [str(x) for x in range(1, ROWS + 1)])
+
+    def test_empty_table(self):
+        self.agent.store = MIBStore(synthetic_if_table(0))
+        async def test(session):
+            return await session.get_table('ifTable'), await session.get_table('ifTable', columns=['ifDescr'])
+        self.assertEqual(self.run_session(test, MIBIndex=self.mibs.index), ({}, {}))
+
+    def test_small_agent(self):
+        #Walks halve the max-repetitions on tooBig
+        self.agent.max_varbinds = 10
+        async def test(session):
+            return await session.get_subtree_data(IF_DESCR)
+        self.assertEqual(len(self.run_session(test, MaxRepetitions=50)), ROWS)
+
+
+class AsyncTimeoutTest(AsyncSessionTest):
+    AGENT = dict(loss=1.0)
+
+    def test_retries(self):
+        async def test(session):
+            with self.assertRaises(SNMPTimeoutError): await session.get_data(SYSNAME)
+        self.run_session(test, Timeout=50000, Retries=2)
+        self.assertEqual(self.agent.stats['dropped'], 3)
+
+    def test_call_timeout(self):
+        #The call's timeout cuts the retries short
+        async def test(session):
+            start = time.time()
+            with self.assertRaises(SNMPTimeoutError): await session.get_data(SYSNAME, timeout=0.15)
+            return time.time() - start
+        self.assertTrue(self.run_session(test, Timeout=1000000, Retries=3) < 0.5)
+        self.assertEqual(self.agent.stats['dropped'], 1)
+
+    def test_cancel(self):
+        #A cancelled request isn't sent again
+        async def test(session):
+            task = asyncio.ensure_future(session.get_data(SYSNAME))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError): await task
+            await asyncio.sleep(0.3)
+        self.run_session(test, Timeout=100000, Retries=3)
+        self.assertEqual(self.agent.stats['dropped'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+from .. import ber
+
+
+class ValueTest(unittest.TestCase):
+    def roundtrip(self, type, value):
+        encoded = ber.encode_message(ber.VERSION_2C, b'public', ber.RESPONSE, 1, 0, 0, [((1, 3, 6, 1, 2, 1, 1, 1, 0), type, value)])
+        return ber.decode_message(encoded).varbinds[0]
+
+    def test_integers(self):
+        for value in (0, 1, -1, 127, 128, -128, -129, 255, 256, 2**31 - 1, -2**31):
+            self.assertEqual(self.roundtrip('INTEGER', value)[1:], ('INTEGER', value))
+
+    def test_unsigned(self):
+        #The top bit set needs a leading zero byte, or it would decode as negative
+        for type, value in (('COUNTER', 2**32 - 1), ('GAUGE', 2**31), ('TICKS', 128), ('COUNTER64', 2**64 - 1)):
+            self.assertEqual(self.roundtrip(type, value)[1:], (type, value))
+
+    def test_strings(self):
+        for value in (b'', b'eth0', bytes(range(256)), b'x' * 1000):
+            self.assertEqual(self.roundtrip('OCTETSTR', value)[1:], ('OCTETSTR', value))
+
+    def test_oids(self):
+        for value in ((0, 0), (1, 3, 6, 1), (1, 3, 6, 1, 4, 1, 2**32 - 1), (2, 999, 3), (1, 3, 127, 128, 16383, 16384)):
+            self.assertEqual(self.roundtrip('OBJECTID', value)[1:], ('OBJECTID', value))
+        self.assertEqual(self.roundtrip('OBJECTID', '.1.3.6.1.2.1')[2], (1, 3, 6, 1, 2, 1))
+
+    def test_ipaddr(self):
+        self.assertEqual(self.roundtrip('IPADDR', '10.0.255.1')[1:], ('IPADDR', '10.0.255.1'))
+
+    def test_exceptions(self):
+        for type in ('NULL', 'NOSUCHOBJECT', 'NOSUCHINSTANCE', 'ENDOFMIBVIEW'):
+            self.assertEqual(self.roundtrip(type, None)[1:], (type, None))
+
+    def test_unknown_type(self):
+        self.assertRaises(ber.BERError, ber.encode_value, 'FLOAT', 1.0)
+
+
+class MessageTest(unittest.TestCase):
+    def test_message(self):
+        varbinds = [((1, 3, 6, 1, 2, 1, 2, 2, 1, x, 1), 'NULL', None) for x in range(1, 200)] #Long enough for long form lengths
+        encoded = ber.encode_message(ber.VERSION_1, b'secret', ber.GET_NEXT_REQUEST, 2**31 - 1, 0, 0, varbinds)
+        self.assertEqual(ber.pdu_type(encoded), ber.GET_NEXT_REQUEST)
+        message = ber.decode_message(encoded)
+        self.assertEqual(message, ber.Message(ber.VERSION_1, b'secret', ber.GET_NEXT_REQUEST, 2**31 - 1, 0, 0, varbinds))
+
+    def test_getbulk(self):
+        message = ber.decode_message(ber.encode_message(ber.VERSION_2C, b'public', ber.GET_BULK_REQUEST, 7, 1, 50, []))
+        self.assertEqual((message.error_status, message.error_index, message.varbinds), (1, 50, []))
+
+    def test_trap_v1(self):
+        varbinds = [((1, 3, 6, 1, 2, 1, 2, 2, 1, 1, 7), 'INTEGER', 7)]
+        encoded = ber.encode_trap_v1(b'public', (1, 3, 6, 1, 4, 1, 9), '10.1.1.1', 6, 17, 999, varbinds)
+        self.assertEqual(ber.pdu_type(encoded), ber.TRAP_V1)
+        trap = ber.decode_trap_v1(encoded)
+        self.assertEqual((trap.enterprise, trap.agent_address, trap.generic_trap, trap.specific_trap, trap.timestamp, trap.varbinds),
+                         ((1, 3, 6, 1, 4, 1, 9), '10.1.1.1', 6, 17, 999, varbinds))
+        self.assertRaises(ber.BERError, ber.decode_message, encoded)
+
+    def test_garbage(self):
+        encoded = ber.encode_message(ber.VERSION_2C, b'public', ber.RESPONSE, 1, 0, 0, [((1, 3, 6, 1), 'INTEGER', 5)])
+        for data in (b'', b'junk', b'\x30\x03abc', encoded[:-1], encoded[:10]):
+            self.assertRaises(ber.BERError, ber.decode_message, data)
+
+    def test_format_oid(self):
+        self.assertEqual(ber.format_oid(ber.parse_oid('.1.3.6.1.2.1')), '.1.3.6.1.2.1')
+        self.assertEqual(ber.parse_oid('1.3.6'), (1, 3, 6))
+
+
+if __name__ == '__main__':
+    unittest.main()
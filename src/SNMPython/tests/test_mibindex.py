@@ -0,0 +1,63 @@
+import unittest
+
+from ..mibindex import MIBIndex, parse_tz
+from . import TemporaryIndex
+
+
+class MIBIndexTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.mibs = TemporaryIndex()
+        cls.index = cls.mibs.index
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.mibs.close()
+
+    def test_oid(self):
+        self.assertEqual(self.index.oid('ifDescr'), '.1.3.6.1.2.1.2.2.1.2')
+        self.assertEqual(self.index.oid('IF-MIB::ifDescr'), '.1.3.6.1.2.1.2.2.1.2')
+        self.assertEqual(self.index.oid('ifNoSuchThing'), None)
+
+    def test_numeric(self):
+        self.assertEqual(self.index.numeric('ifDescr.3'), '.1.3.6.1.2.1.2.2.1.2.3')
+        self.assertEqual(self.index.numeric('.iso.org.dod.internet.mgmt.mib-2.system.sysDescr.0'), '.1.3.6.1.2.1.1.1.0')
+        self.assertEqual(self.index.numeric('.1.3.6.1.2.1.1.1.0'), '.1.3.6.1.2.1.1.1.0')
+        self.assertEqual(self.index.numeric('ifNoSuchThing.3'), None)
+
+    def test_long_name(self):
+        self.assertEqual(self.index.long_name('.1.3.6.1.2.1.2.2'), '.iso.org.dod.internet.mgmt.mib-2.interfaces.ifTable')
+        self.assertEqual(self.index.long_name('.1.3.6.1.4.1'), '.iso.org.dod.internet.4.1')
+
+    def test_describe(self):
+        longName = '.iso.org.dod.internet.mgmt.mib-2.interfaces.ifTable.ifEntry.ifDescr'
+        self.assertEqual(self.index.describe('.1.3.6.1.2.1.2.2.1.2.3'), ('.1.3.6.1.2.1.2.2.1.2', 'ifDescr', longName, '3'))
+        self.assertEqual(self.index.describe('.1.3.6.1.2.1.2.2.1.2.3.4'), ('.1.3.6.1.2.1.2.2.1.2', 'ifDescr', longName, '3.4'))
+        self.assertEqual(self.index.describe('.1.3.6.1.4.1.9'), ('.1.3.6.1', 'internet', '.iso.org.dod.internet', '4.1.9'))
+        self.assertEqual(self.index.describe('.2.5'), None)
+
+    def test_describe_object(self):
+        #An object's own OID has no index to split off, even though its parent is an object too
+        self.assertEqual(self.index.describe('.1.3.6.1.2.1.2.2'),
+                         ('.1.3.6.1.2.1.2.2', 'ifTable', '.iso.org.dod.internet.mgmt.mib-2.interfaces.ifTable', ''))
+        self.assertEqual(self.index.describe('.1.3.6.1.2.1.2.2.1.2')[1:], ('ifDescr', self.index.long_name('.1.3.6.1.2.1.2.2.1.2'), ''))
+        self.assertEqual(self.index.describe('.1.3.6.1.2.1.2.2.1.2.3')[3], '3') #After the cache saw the parent
+
+    def test_cache_size(self):
+        class SmallIndex(MIBIndex):
+            CACHE_SIZE = 2
+        index = SmallIndex(self.index.path)
+        try:
+            for column in range(1, 10): index.describe('.1.3.6.1.2.1.2.2.1.%d.1' % column)
+            self.assertEqual(len(index._nodes), 2)
+            self.assertEqual(index.describe('.1.3.6.1.2.1.2.2.1.9.1')[1], 'ifLastChange')
+        finally:
+            index.close()
+
+    def test_parse_tz(self):
+        lines = ['"ifDescr"\t\t"1.3.6.1.2.1.2.2.1.2"', 'garbage', '"sysDescr"\t"1.3.6.1.2.1.1.1"']
+        self.assertEqual(list(parse_tz(lines)), [('ifDescr', '1.3.6.1.2.1.2.2.1.2'), ('sysDescr', '1.3.6.1.2.1.1.1')])
+
+
+if __name__ == '__main__':
+    unittest.main()
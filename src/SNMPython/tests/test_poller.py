@@ -0,0 +1,69 @@
+import time
+import unittest
+
+from ..SNMPython import SNMPError, SNMPTimeoutError
+from ..agent import SimulatedAgent, MIBStore, synthetic_if_table
+from ..poller import SNMPythonPoller
+
+SYSNAME = '.1.3.6.1.2.1.1.5.0'
+SYSUPTIME = '.1.3.6.1.2.1.1.3.0'
+IF_TABLE = '.1.3.6.1.2.1.2.2'
+
+
+class PollerTest(unittest.TestCase):
+    def setUp(self):
+        self.fast = SimulatedAgent(MIBStore(synthetic_if_table(4))).start()
+        self.slow = SimulatedAgent(MIBStore(synthetic_if_table(4)), latency=0.3).start()
+        self.dead = SimulatedAgent(MIBStore(synthetic_if_table(4)), loss=1.0).start()
+
+    def tearDown(self):
+        for agent in (self.fast, self.slow, self.dead): agent.stop()
+
+    def poller(self, **kwargs):
+        return SNMPythonPoller(Version=2, Timeout=1000000, Retries=0, Backend='python', **kwargs)
+
+    def quick(self, agent):
+        #A target that gives up on the agent after 0.1s
+        return {'DestHost': agent.address, 'Timeout': 100000}
+
+    def test_poll_many(self):
+        #Results come back as each host finishes, and a dead host yields its error
+        dead = self.quick(self.dead)
+        results = list(self.poller().poll_many([self.slow.address, dead, self.fast.address], SYSNAME, SYSUPTIME))
+        self.assertEqual([target for target, result in results], [self.fast.address, dead, self.slow.address])
+        self.assertEqual(results[0][1], ('simulated', '123456'))
+        self.assertTrue(isinstance(results[1][1], SNMPTimeoutError))
+        self.assertEqual(results[2][1], ('simulated', '123456'))
+
+    def test_dict_targets(self):
+        #Dictionary targets override the poller's session arguments
+        poller = self.poller()
+        results = dict((target['Community'], result) for target, result in poller.run([
+            ({'DestHost': self.fast.address, 'Community': 'public'}, 'get_data', (SYSNAME,)),
+            ({'DestHost': self.fast.address, 'Community': 'wrong', 'Timeout': 100000}, 'get_data', (SYSNAME,))]))
+        self.assertEqual(results['public'], 'simulated')
+        self.assertTrue(isinstance(results['wrong'], SNMPError))
+
+    def test_get_table_many(self):
+        results = dict(self.poller().get_table_many([self.fast.address, self.slow.address], IF_TABLE))
+        self.assertEqual(sorted(results), sorted([self.fast.address, self.slow.address]))
+        for table in results.values(): self.assertEqual(sorted(table), ['1', '2', '3', '4'])
+
+    def test_max_per_host(self):
+        #Four polls of the slow host take turns with max_per_host=1, and overlap with max_per_host=4
+        jobs = [(self.slow.address, 'get_data', (SYSNAME,))] * 4
+        for maxPerHost, least, most in ((1, 1.2, 3.0), (4, 0.3, 0.9)):
+            start = time.time()
+            results = list(self.poller(max_per_host=maxPerHost).run(jobs))
+            elapsed = time.time() - start
+            self.assertEqual([result for target, result in results], ['simulated'] * 4)
+            self.assertTrue(least <= elapsed < most, elapsed)
+
+    def test_reuses_sessions(self):
+        poller = self.poller()
+        for x in range(2): list(poller.poll_many([self.fast.address], SYSNAME))
+        self.assertEqual((poller.pool.stats['created'], poller.pool.stats['reused']), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
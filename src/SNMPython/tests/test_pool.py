@@ -0,0 +1,79 @@
+import unittest
+
+from ..SNMPython import SNMPythonSession, SNMPError
+from ..agent import SimulatedAgent, MIBStore, synthetic_if_table
+from ..pool import SessionPool
+
+
+class ClosingSession(SNMPythonSession):
+    #Counts how often the pool closes it
+    def __init__(self, *args, **kwargs):
+        SNMPythonSession.__init__(self, *args, **kwargs)
+        self.closed = 0
+
+    def close(self):
+        self.closed += 1
+        SNMPythonSession.close(self)
+
+
+class PoolTest(unittest.TestCase):
+    def setUp(self):
+        self.agents = [SimulatedAgent(MIBStore(synthetic_if_table(2))).start() for x in range(3)]
+        self.pool = SessionPool(max_size=2, session_factory=ClosingSession, Version=2, Timeout=1000000, Retries=1,
+                                Backend='python')
+
+    def tearDown(self):
+        for agent in self.agents: agent.stop()
+
+    def get(self, agent):
+        with self.pool.session(DestHost=agent.address) as session:
+            self.assertEqual(session.get_data('.1.3.6.1.2.1.1.5.0'), 'simulated')
+            return session
+
+    def test_reuse(self):
+        first = self.get(self.agents[0])
+        self.assertTrue(self.get(self.agents[0]) is first)
+        self.assertFalse(self.get(self.agents[1]) is first) #Keyed by the target
+        self.assertEqual((self.pool.stats['created'], self.pool.stats['reused']), (2, 1))
+        self.assertEqual(len(self.pool), 2)
+
+    def test_reset_settings(self):
+        with self.pool.session(DestHost=self.agents[0].address) as session: session.UseNumeric = 1
+        self.assertEqual(self.get(self.agents[0]).UseNumeric, 0)
+
+    def test_eviction_closes(self):
+        first, second = self.get(self.agents[0]), self.get(self.agents[1])
+        third = self.get(self.agents[2]) #The pool is full, the session idle the longest makes room
+        self.assertEqual(self.pool.stats['evicted'], 1)
+        self.assertEqual((first.closed, second.closed, third.closed), (1, 0, 0))
+        self.assertEqual(len(self.pool), 2)
+        fourth = self.get(self.agents[0])
+        self.assertFalse(fourth is first)
+        self.assertEqual(second.closed, 1)
+
+        self.pool.clear()
+        self.assertEqual(len(self.pool), 0)
+        self.assertEqual([session.closed for session in (first, second, third, fourth)], [1, 1, 1, 1])
+
+    def test_expiry_closes(self):
+        self.pool.idle_timeout = 0
+        first = self.get(self.agents[0])
+        self.assertFalse(self.get(self.agents[0]) is first)
+        self.assertEqual((self.pool.stats['expired'], first.closed), (1, 1))
+
+    def test_discard_closes(self):
+        session = self.pool.acquire(DestHost=self.agents[0].address)
+        self.pool.release(session, discard=True)
+        self.assertEqual(session.closed, 1)
+        self.assertEqual(len(self.pool), 0)
+
+    def test_full(self):
+        sessions = [self.pool.acquire(DestHost=agent.address) for agent in self.agents[:2]]
+        self.assertRaises(SNMPError, self.pool.acquire, timeout=0.05, DestHost=self.agents[2].address)
+        self.assertEqual(self.pool.stats['waits'], 1)
+        for session in sessions: self.pool.release(session)
+        self.assertRaises(ValueError, self.pool.release, sessions[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from ..SNMPython import ColumnarTable
+from ..rates import table_rates, UPTIME_WRAP
+
+COLUMNS = ('ifDescr', 'ifInOctets', 'ifHCInOctets')
+TYPES = ('OCTETSTR', 'COUNTER', 'COUNTER64')
+
+
+def _table(rows, timestamp=None, uptime=None):
+    #rows: iid -> (ifInOctets, ifHCInOctets), None for a missing cell
+    table = ColumnarTable(COLUMNS, timestamp, uptime)
+    for iid in sorted(rows, key=int):
+        values = ('eth%s' % iid,) + tuple(rows[iid])
+        table.append(iid, [None if value is None else str(value) for value in values],
+                     [None if value is None else type for value, type in zip(values, TYPES)])
+    return table
+
+
+class RatesTest(unittest.TestCase):
+    def test_rates(self):
+        rates = table_rates(_table({'1': (1000, 5000), '2': (0, 0)}, 100.0), _table({'1': (3000, 9000), '2': (10, 20)}, 110.0))
+        self.assertEqual(rates.interval, 10.0)
+        self.assertEqual((rates.delta('ifInOctets', '1'), rates.rate('ifInOctets', '1')), (2000, 200.0))
+        self.assertEqual(rates.rate('ifHCInOctets', '2'), 2.0)
+        self.assertEqual(sorted(rates.rates), ['ifHCInOctets', 'ifInOctets']) #Only the counters by default
+
+    def test_counter32_wrap(self):
+        rates = table_rates(_table({'1': (2**32 - 100, 0)}), _table({'1': (400, 0)}), interval=5)
+        self.assertEqual(rates.delta('ifInOctets', '1'), 500)
+        self.assertEqual(rates.rate('ifInOctets', '1'), 100.0)
+
+    def test_counter64_reset(self):
+        #A Counter64 doesn't wrap in practice, going down means it was reset
+        rates = table_rates(_table({'1': (0, 2**64 - 100)}), _table({'1': (0, 400)}), interval=5)
+        self.assertEqual(rates.rate('ifHCInOctets', '1'), None)
+
+    def test_rows_and_missing_cells(self):
+        old = _table({'1': (100, 100), '2': (100, None), '3': (100, 100)})
+        new = _table({'2': (200, 200), '3': (300, 300), '4': (400, 400)})
+        rates = table_rates(old, new, interval=1)
+        self.assertEqual(rates.index, ['2', '3'])
+        self.assertEqual((rates.delta('ifInOctets', '2'), rates.delta('ifHCInOctets', '2')), (100, None))
+        self.assertEqual(rates.delta('ifHCInOctets', '3'), 200)
+
+    def test_uptime(self):
+        #The agent's clock gives the interval, and a restart makes every cell invalid
+        rates = table_rates(_table({'1': (0, 0)}, 100.0, 1000), _table({'1': (600, 0)}, 130.0, 3000))
+        self.assertEqual((rates.interval, rates.rate('ifInOctets', '1')), (20.0, 30.0))
+        restarted = table_rates(_table({'1': (0, 0)}, 100.0, 900000), _table({'1': (600, 0)}, 130.0, 500))
+        self.assertTrue(restarted.discontinuity)
+        self.assertEqual(restarted.rate('ifInOctets', '1'), None)
+        wrapped = table_rates(_table({'1': (0, 0)}, 100.0, UPTIME_WRAP - 1000), _table({'1': (600, 0)}, 130.0, 2000))
+        self.assertEqual((wrapped.discontinuity, wrapped.interval), (False, 30.0))
+
+    def test_no_interval(self):
+        self.assertRaises(ValueError, table_rates, _table({'1': (0, 0)}), _table({'1': (0, 0)}))
+
+
+if __name__ == '__main__':
+    unittest.main()
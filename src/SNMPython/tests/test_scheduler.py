@@ -0,0 +1,81 @@
+import time
+import unittest
+
+from ..SNMPython import SNMPTimeoutError
+from ..agent import SimulatedAgent, MIBStore, synthetic_if_table
+from ..scheduler import PollScheduler
+
+SYSNAME = '.1.3.6.1.2.1.1.5.0'
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.fast = SimulatedAgent(MIBStore(synthetic_if_table(2))).start()
+        self.slow = SimulatedAgent(MIBStore(synthetic_if_table(2)), latency=0.4).start()
+        self.scheduler = None
+
+    def tearDown(self):
+        if self.scheduler is not None: self.scheduler.stop()
+        self.fast.stop()
+        self.slow.stop()
+
+    def start(self, **kwargs):
+        kwargs.setdefault('jitter', 0)
+        self.scheduler = PollScheduler(Version=2, Timeout=2000000, Retries=0, Backend='python', **kwargs)
+        return self.scheduler
+
+    def collect(self, seconds):
+        #Every result that comes in for the given time
+        results, end = [], time.time() + seconds
+        while time.time() < end:
+            try: results.append(self.scheduler.results.get(timeout=0.05))
+            except Exception: pass
+        return results
+
+    def test_poll(self):
+        scheduler = self.start()
+        job = scheduler.add(self.fast.address, [SYSNAME, '.1.3.6.1.2.1.1.3.0'], 0.1)
+        scheduler.start()
+        result = scheduler.results.get(timeout=5)
+        self.assertTrue(result.job is job)
+        self.assertEqual(result.result, ('simulated', '123456'))
+        self.assertTrue(result.scheduled <= result.collected)
+
+    def test_restart(self):
+        scheduler = self.start()
+        scheduler.add(self.fast.address, [SYSNAME], 0.1)
+        scheduler.start()
+        self.assertEqual(scheduler.results.get(timeout=5).result, 'simulated')
+        scheduler.stop()
+        self.collect(0.2)
+        self.assertEqual(self.collect(0.3), []) #Nothing runs while stopped
+        scheduler.start()
+        self.assertEqual(scheduler.results.get(timeout=5).result, 'simulated')
+        self.assertEqual(len(scheduler.jobs()), 1)
+
+    def test_skip(self):
+        #Polls that come due while the host is still busy are skipped
+        scheduler = self.start()
+        job = scheduler.add(self.slow.address, [SYSNAME], 0.1, deadline=1.0)
+        scheduler.start()
+        self.collect(1.0)
+        self.assertTrue(job.skipped > 0)
+        self.assertEqual(scheduler.stats['late'], 0)
+
+    def test_deadline(self):
+        #A poll stuck waiting for the only worker past its deadline is reported late, and never sent
+        scheduler = self.start(max_workers=1)
+        slow = scheduler.add(self.slow.address, [SYSNAME], 0.1, deadline=1.0)
+        fast = scheduler.add(self.fast.address, [SYSNAME], 0.1, deadline=0.2)
+        scheduler.start()
+        results = self.collect(1.5)
+        scheduler.stop()
+        late = [result for result in results if result.job is fast and isinstance(result.result, SNMPTimeoutError)]
+        self.assertTrue(late)
+        self.assertEqual([result.elapsed for result in late], [0.0] * len(late))
+        self.assertTrue(scheduler.stats['late'] >= len(late))
+        self.assertTrue([result for result in results if result.job is slow and result.result == 'simulated'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,456 @@
+import threading
+import time
+import unittest
+
+from ..SNMPython import SNMPythonSession, TableRefresher, TableChanges, ResponseCache, TRANSLATION_CACHE
+from ..SNMPython import SessionHooks, SessionMetrics
+from ..SNMPython import SNMPError, SNMPTimeoutError, SNMPHostDownError
+from ..agent import SimulatedAgent, MIBStore, synthetic_if_table, IF_ENTRY
+from ..ber import format_oid
+from . import TemporaryIndex, IF_COLUMNS
+
+ROWS = 40
+IF_TABLE = '.1.3.6.1.2.1.2.2'
+IF_DESCR = format_oid(IF_ENTRY + (2,))
+
+
+def _session(agent, **kwargs):
+    kwargs.setdefault('Version', 2)
+    kwargs.setdefault('Timeout', 1000000)
+    kwargs.setdefault('Retries', 1)
+    return SNMPythonSession(DestHost=agent.address, Backend='python', **kwargs)
+
+
+class AgentTest(unittest.TestCase):
+    #Arguments for the SimulatedAgent, every test gets one of its own
+    AGENT = {}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.mibs = TemporaryIndex()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.mibs.close()
+
+    def setUp(self):
+        self.agent = SimulatedAgent(MIBStore(synthetic_if_table(ROWS)), **self.AGENT).start()
+        self.session = _session(self.agent, MIBIndex=self.mibs.index)
+        self.session.reset_agent_state() #In case an earlier agent had the same port
+
+    def tearDown(self):
+        self.agent.stop()
+
+
+class GetTest(AgentTest):
+    def test_get(self):
+        self.assertEqual(self.session.get_data('.1.3.6.1.2.1.1.1.0', IF_DESCR + '.3'),
+                         ('SNMPython simulated agent', 'GigabitEthernet0/3'))
+        self.assertEqual(self.session.get_data('sysName.0'), 'simulated')
+
+    def test_row_data(self):
+        #Names resolve through the MIBIndex, netsnmp doesn't have any MIBs loaded
+        self.assertEqual(self.session.get_row_data('3', 'ifIndex', 'ifDescr'), ('3', 'GigabitEthernet0/3'))
+        rows = self.session.get_row_data(['1', '2'], 'IF-MIB::ifDescr')
+        self.assertEqual(rows, {'1': ('GigabitEthernet0/1',), '2': ('GigabitEthernet0/2',)})
+        self.assertEqual(self.session.get_table_indicies('ifTable'), [str(x) for x in range(1, ROWS + 1)])
+
+    def test_contains(self):
+        #By the type, not the value: ifOutQLen is 0 everywhere
+        self.assertTrue('ifOutQLen.1' in self.session)
+        self.assertTrue('.1.3.6.1.2.1.1.5.0' in self.session)
+        self.assertFalse('.1.3.6.1.2.1.1.99.0' in self.session)
+        self.assertFalse('ifDescr.%d' % (ROWS + 1) in self.session)
+
+    def test_close(self):
+        with _session(self.agent) as session:
+            self.assertEqual(session.get_data('.1.3.6.1.2.1.1.5.0'), 'simulated')
+        #Closed, the next request opens a new socket
+        self.assertEqual(session.get_data('.1.3.6.1.2.1.1.5.0'), 'simulated')
+        session.close()
+
+    def test_set(self):
+        #The python backend has no MIB to look the types up in, it uses the type the object has now
+        self.session.set_data(('sysName.0', 'router1'), ('ifAdminStatus.2', '2'))
+        self.assertEqual(self.session.get_data('sysName.0', 'ifAdminStatus.2'), ('router1', '2'))
+        self.assertEqual(self.agent.store.get((1, 3, 6, 1, 2, 1, 2, 2, 1, 7, 2)), ('INTEGER', 2))
+        #A new object needs its type
+        self.assertRaises(SNMPError, self.session.set_data, ('.1.3.6.1.2.1.1.6.0', 'Closet'))
+        self.session.set_data(('.1.3.6.1.2.1.1.6.0', 'Closet', 'OCTETSTR'))
+        self.assertEqual(self.session.get_data('.1.3.6.1.2.1.1.6.0'), 'Closet')
+        self.assertRaises(SNMPError, self.session.set_data, ('sysName.0',))
+
+    def test_set_shortcut(self):
+        self.session['sysName.0'] = 'router2'
+        self.assertEqual(self.session['sysName.0'], 'router2')
+        self.session['sysName.0, ifAdminStatus.1'] = 'router3', 2
+        self.assertEqual(self.session['sysName.0 ifAdminStatus.1'], ('router3', '2'))
+        #More OIDs than values, or the other way around
+        self.assertRaises(SNMPError, self.session.__setitem__, 'sysName.0 ifAdminStatus.1', 'router4')
+        self.assertRaises(SNMPError, self.session.__setitem__, 'sysName.0', ('router4', 1))
+        self.assertEqual(self.session['sysName.0'], 'router3')
+
+
+class WalkTest(AgentTest):
+    def test_subtree(self):
+        values = self.session.get_subtree_data(IF_DESCR)
+        self.assertEqual(len(values), ROWS)
+        self.assertEqual(values[-1], 'GigabitEthernet0/%d' % ROWS)
+
+    def test_subtree_names(self):
+        #A name with an instance isn't numeric, it is translated: ifTable.1 is ifEntry
+        entries = self.session.get_subtree_data('ifTable.1')
+        self.assertEqual(len(entries), ROWS * len(IF_COLUMNS))
+        self.assertEqual(entries, self.session.get_subtree_data('ifEntry'))
+        self.assertEqual(self.session.get_subtree_data('ifEntry.ifDescr'), self.session.get_subtree_data(IF_DESCR))
+        self.assertEqual(self.session.get_subtree_data('ifDescr.1'), []) #An instance has nothing under it
+        self.assertEqual(self.session.get_subtree_data('ifNoSuchThing.1'), [])
+
+    def test_translate_index(self):
+        #Names in the MIBIndex are translated without asking the agent
+        TRANSLATION_CACHE.clear()
+        self.agent.reset_stats()
+        translation = self.session.translate('ifTable')
+        self.assertEqual(translation.numeric, IF_TABLE)
+        self.assertEqual(translation.root, '.iso.org.dod.internet.mgmt.mib-2.interfaces.ifTable')
+        self.assertEqual(self.agent.stats['requests'], 0)
+        self.assertEqual(self.session.get_table_columns('ifTable'), list(IF_COLUMNS))
+
+    def test_subtree_outside_index(self):
+        #A column the index has no name for is named after ifEntry, the walk compares numbers and still includes it
+        TRANSLATION_CACHE.clear()
+        self.agent.store.set(IF_ENTRY + (30, 1), 'INTEGER', 7)
+        self.agent.reset_stats()
+        varbinds = list(self.session.iter_subtree('ifEntry'))
+        self.assertEqual(self.agent.stats['getnext'], 0) #No round-trips to find the root
+        self.assertEqual(len(varbinds), ROWS * len(IF_COLUMNS) + 1)
+        self.assertEqual(varbinds[-1][:3], ('.iso.org.dod.internet.mgmt.mib-2.interfaces.ifTable.ifEntry', '30.1', '7'))
+
+    def test_end_of_mib(self):
+        #ifTable is the last thing the agent has, the walk has to stop at endOfMibView without yielding it
+        for walk in (self.session.iter_subtree(IF_TABLE), self.session.iter_subtree_numeric(IF_TABLE)):
+            varbinds = list(walk)
+            self.assertEqual(len(varbinds), ROWS * len(IF_COLUMNS))
+            self.assertEqual([type for tag, iid, value, type in varbinds if value is None], [])
+            self.assertEqual(varbinds[-1][3], 'OBJECTID')
+
+    def test_subtrees(self):
+        #Named scalars and tables walked together
+        data = self.session.get_subtrees('sysUpTime.0', 'ifDescr', 'sysName.0', 'ifInOctets', 'ifNoSuchThing')
+        self.assertEqual(list(data), ['sysUpTime.0', 'ifDescr', 'sysName.0', 'ifInOctets', 'ifNoSuchThing'])
+        self.assertEqual(data['sysUpTime.0'], [('.1.3.6.1.2.1.1.3', '0', '123456', 'TICKS')])
+        self.assertEqual(data['sysName.0'][0][2], 'simulated')
+        self.assertEqual([value for tag, iid, value, type in data['ifDescr']], self.session.get_subtree_data(IF_DESCR))
+        self.assertEqual(len(data['ifInOctets']), ROWS)
+        self.assertEqual(data['ifNoSuchThing'], [])
+        self.assertEqual(self.session.get_subtrees('.1.3.6.1.2.1.1.3.0', IF_DESCR)[IF_DESCR], data['ifDescr'])
+
+    def test_subtrees_round_trips(self):
+        #Walked together the roots share the getbulk PDUs
+        roots = ('sysUpTime.0', 'sysName.0', 'ifDescr', 'ifInOctets', 'ifOutOctets')
+        session = _session(self.agent, MIBIndex=self.mibs.index, MaxRepetitions=10)
+        self.agent.reset_stats()
+        data = session.get_subtrees(*roots)
+        together = self.agent.stats['getbulk']
+        self.agent.reset_stats()
+        for root in roots: self.assertEqual(session.get_subtrees(root)[root], data[root])
+        self.assertTrue(together * 2 < self.agent.stats['getbulk'])
+        self.assertEqual([len(data[root]) for root in roots], [1, 1, ROWS, ROWS, ROWS])
+
+    def test_get_table(self):
+        serial = self.session.get_table('ifTable')
+        parallel = self.session.get_table('ifTable', parallel=True)
+        self.assertEqual(serial, parallel)
+        self.assertEqual(len(serial), ROWS)
+        last = serial[str(ROWS)]
+        self.assertEqual(type(last)._fields, IF_COLUMNS)
+        self.assertEqual(last.ifDescr, 'GigabitEthernet0/%d' % ROWS)
+        self.assertFalse(None in last)
+
+    def test_empty_table(self):
+        self.agent.store = MIBStore(synthetic_if_table(0))
+        for table in (self.session.get_table('ifTable'), self.session.get_table('ifTable', parallel=True),
+                      self.session.get_table('ifTable', columns=['ifDescr'])):
+            self.assertEqual(table, {})
+
+    def test_columnar(self):
+        table = self.session.get_table_columnar('ifTable', columns=['ifDescr', 'ifInOctets'])
+        self.assertEqual(table.index, [str(x) for x in range(1, ROWS + 1)])
+        self.assertEqual(table['2'].ifDescr, 'GigabitEthernet0/2')
+        self.assertEqual(table.types, ['OCTETSTR', 'COUNTER'])
+
+
+class VarbindLimitTest(WalkTest):
+    #The same walks against an agent that answers tooBig to more than 10 varbinds
+    AGENT = dict(max_varbinds=10)
+
+    def test_learns_limit(self):
+        oids = ['%s.%d' % (IF_DESCR, x) for x in range(1, ROWS + 1)]
+        self.assertEqual(len(self.session.get_data(*oids)), ROWS)
+        self.assertTrue(self.agent.stats['too_big'] > 0)
+        state = self.session.agent_state()
+        self.assertTrue(10 < state.too_big_varbinds)
+        self.assertTrue(state.max_varbinds < state.too_big_varbinds)
+
+    def test_columns(self):
+        self.assertEqual(len(self.session.get_table_columns('ifTable')), len(IF_COLUMNS))
+
+
+class SmallAgentTest(WalkTest):
+    #Responses over 484 bytes are truncated (getbulk) or tooBig
+    AGENT = dict(max_size=484)
+
+
+class AdaptiveBulkTest(AgentTest):
+    def walk(self, session):
+        self.agent.reset_stats()
+        self.assertEqual(session.get_subtree_data(IF_DESCR), ['GigabitEthernet0/%d' % x for x in range(1, ROWS + 1)])
+        return self.agent.stats['getbulk']
+
+    def test_grows(self):
+        #Full replies that come back fast double the max-repetitions for the next page
+        state = self.session.agent_state()
+        state.max_repetitions = 2
+        self.assertTrue(self.walk(self.session) < 6)
+        self.assertTrue(state.max_repetitions > 32)
+
+    def test_fixed(self):
+        session = _session(self.agent, MaxRepetitions=5)
+        self.assertEqual(self.walk(session), ROWS // 5 + 1)
+        self.assertEqual(session.agent_state().max_repetitions, SNMPythonSession.BULK_INITIAL)
+
+    def test_slow(self):
+        #Replies slower than BULK_SLOW shrink it
+        class SlowSession(SNMPythonSession): BULK_SLOW = 0.05
+        self.agent.latency = 0.1
+        session = SlowSession(DestHost=self.agent.address, Version=2, Timeout=1000000, Retries=1, Backend='python')
+        self.walk(session)
+        self.assertTrue(session.agent_state().max_repetitions < SNMPythonSession.BULK_INITIAL)
+
+    def test_truncated(self):
+        #Replies cut short by the agent's size limit don't grow it
+        self.agent.max_size = 484
+        state = self.session.agent_state()
+        self.assertTrue(self.walk(self.session) > 1)
+        self.assertEqual(state.max_repetitions, SNMPythonSession.BULK_INITIAL)
+
+
+class CacheTest(AgentTest):
+    def setUp(self):
+        AgentTest.setUp(self)
+        self.cache = ResponseCache({'sysName': 0.2, 'ifDescr': 60, 'ifIn': 60})
+
+    def cached(self, **kwargs):
+        return _session(self.agent, MIBIndex=self.mibs.index, ResponseCache=self.cache, **kwargs)
+
+    def test_ttl(self):
+        session = self.cached()
+        for x in range(3): self.assertEqual(session.get_data('sysName.0'), 'simulated')
+        self.assertEqual(self.agent.stats['get'], 1)
+        time.sleep(0.3) #Expired
+        self.assertEqual(session['sysName.0'], 'simulated')
+        self.assertEqual(self.agent.stats['get'], 2)
+
+    def test_prefixes(self):
+        #Whole labels only, and OIDs with no prefix aren't cached with the default ttl of 0
+        session = self.cached()
+        self.assertEqual(self.cache.ttl('ifInOctets.1'), 0)
+        for x in range(2): session.get_data('ifDescr.1', 'ifInOctets.1', 'sysDescr.0')
+        self.assertEqual(self.agent.stats['varbinds'], 5)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_contains(self):
+        session = self.cached()
+        for x in range(2): self.assertTrue('ifDescr.3' in session)
+        for x in range(2): self.assertFalse('ifDescr.%d' % (ROWS + 1) in session)
+        self.assertEqual(self.agent.stats['get'], 2)
+
+    def test_set_invalidates(self):
+        session = self.cached()
+        self.assertEqual(session.get_data('sysName.0'), 'simulated')
+        session.set_data(('sysName.0', 'router1'))
+        self.assertEqual(session.get_data('sysName.0'), 'router1')
+
+    def test_formats(self):
+        #Sessions with different settings sharing the cache get the results the way they asked for them
+        session, numeric = self.cached(), self.cached()
+        numeric.UseNumeric = 1
+        self.assertEqual(session.get_data_oids('ifDescr.1')[0][0], 'ifDescr')
+        self.assertEqual(numeric.get_data_oids('ifDescr.1')[0][0], IF_DESCR)
+        self.assertEqual(session.get_data_oids('ifDescr.1')[0][0], 'ifDescr')
+        self.assertEqual(self.agent.stats['get'], 2)
+
+    def test_coalescing(self):
+        #The same get from several threads at once only goes to the agent once
+        self.agent.latency = 0.3
+        results = []
+        def get():
+            results.append(self.cached().get_data('ifDescr.2'))
+        threads = [threading.Thread(target=get) for x in range(5)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(results, ['GigabitEthernet0/2'] * 5)
+        self.assertEqual(self.agent.stats['get'], 1)
+
+    def test_failed_get(self):
+        #When the get the others waited for fails, they try it themselves
+        self.agent.loss = 1.0
+        errors = []
+        def get():
+            try: self.cached(Timeout=100000, Retries=0).get_data('ifDescr.2')
+            except SNMPTimeoutError as e: errors.append(e)
+        threads = [threading.Thread(target=get) for x in range(3)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(len(self.cache), 0)
+
+
+class RecordingHooks(SessionHooks):
+    #Keeps every hook call
+    def __init__(self):
+        self.calls = []
+
+    def request_started(self, session, op, varbinds):
+        self.calls.append(('request_started', op, varbinds))
+
+    def request_finished(self, session, op, varbinds, returned, rtt, error):
+        self.calls.append(('request_finished', op, varbinds, returned, error))
+
+    def walk_finished(self, session, root, pages, varbinds):
+        self.calls.append(('walk_finished', root, pages, varbinds))
+
+    def call_finished(self, session, method, elapsed, assembly, error):
+        self.calls.append(('call_finished', method, error))
+
+
+class InstrumentationTest(AgentTest):
+    def test_hooks(self):
+        hooks = RecordingHooks()
+        session = _session(self.agent, Instrumentation=hooks)
+        session.get_data('.1.3.6.1.2.1.1.5.0', IF_DESCR + '.1')
+        self.assertEqual(hooks.calls, [('request_started', 'get', 2), ('request_finished', 'get', 2, 2, None),
+                                       ('call_finished', 'get_data', None)])
+
+        del hooks.calls[:]
+        session.get_subtree_data(IF_DESCR)
+        self.assertEqual([call[:2] for call in hooks.calls[:2]], [('request_started', 'getbulk'), ('request_finished', 'getbulk')])
+        self.assertEqual(hooks.calls[2:], [('walk_finished', IF_DESCR, 1, ROWS), ('call_finished', 'get_subtree_data', None)])
+
+    def test_metrics(self):
+        metrics = SessionMetrics()
+        session = _session(self.agent, MIBIndex=self.mibs.index, Instrumentation=metrics)
+        session.get_data('sysName.0')
+        self.assertEqual(len(session.get_table('ifTable')), ROWS)
+        total = metrics.total
+        self.assertEqual(total.calls, {'get_data': 1, 'get_table': 1}) #Not the walks get_table makes itself
+        self.assertEqual(total.requests['get'], 1)
+        self.assertTrue(total.walks >= 1)
+        self.assertEqual(total.walk_pages.count, total.walks)
+        self.assertEqual(total.rtt.count, sum(total.requests.values()))
+        self.assertEqual(total.varbinds_returned, self.agent.stats['varbinds'])
+        self.assertEqual(metrics.snapshot()['hosts'][self.agent.address]['calls'], total.calls)
+
+    def test_errors(self):
+        metrics = SessionMetrics()
+        self.agent.max_varbinds = 10
+        session = _session(self.agent, Instrumentation=metrics)
+        session.get_data(*['%s.%d' % (IF_DESCR, x) for x in range(1, ROWS + 1)])
+        self.assertTrue(metrics.total.errors['SNMPTooBigError'] > 0) #Counted, even though the session recovered
+
+        self.agent.loss = 1.0
+        session = _session(self.agent, Timeout=20000, Retries=0, Instrumentation=metrics)
+        self.assertRaises(SNMPTimeoutError, session.get_data, '.1.3.6.1.2.1.1.5.0')
+        self.assertEqual(metrics.total.errors['SNMPTimeoutError'], 1)
+        self.assertEqual(metrics.total.calls['get_data'], 2)
+
+
+class RefresherTest(AgentTest):
+    def setUp(self):
+        AgentTest.setUp(self)
+        #ifInOctets is sparse, the even rows don't have it
+        objects = synthetic_if_table(ROWS)
+        for x in range(2, ROWS + 1, 2): del objects[IF_ENTRY + (10, x)]
+        self.agent.store = MIBStore(objects)
+
+    def check_sparse(self, method):
+        refresher = TableRefresher(self.session, 'ifTable', ['ifInOctets'], columns=['ifIndex', 'ifDescr'], method=method)
+        self.assertEqual(len(refresher.refresh().added), ROWS)
+        self.assertEqual(refresher.table['2'].ifInOctets, None)
+
+        self.agent.store.set(IF_ENTRY + (10, 1), 'COUNTER', 5)
+        changes = refresher.refresh()
+        self.assertEqual(changes, TableChanges([], [], {'1': ('ifInOctets',)}))
+        self.assertEqual(len(refresher.table), ROWS) #The rows without ifInOctets are still there
+        self.assertEqual(refresher.table['2'], ('2', 'GigabitEthernet0/2', None))
+        self.assertEqual(refresher.table['1'].ifInOctets, '5')
+
+        #A row that is really gone
+        self.agent.store = MIBStore([(oid, type, value) for oid, type, value in self.agent.store if oid[-1] != ROWS])
+        self.assertEqual(refresher.refresh().removed, [str(ROWS)])
+        self.assertEqual(len(refresher.table), ROWS - 1)
+
+    def test_sparse_walk(self):
+        self.check_sparse('walk')
+
+    def test_sparse_get(self):
+        self.check_sparse('get')
+
+
+class BreakerTest(AgentTest):
+    AGENT = dict(loss=1.0)
+
+    def test_breaker(self):
+        session = _session(self.agent, Timeout=20000, Retries=0, BreakerThreshold=2)
+        for x in range(2): self.assertRaises(SNMPTimeoutError, session.get_data, '.1.3.6.1.2.1.1.1.0')
+        self.assertRaises(SNMPHostDownError, session.get_data, '.1.3.6.1.2.1.1.1.0')
+        state = session.agent_state()
+        self.assertEqual((state.breaker, state.trips, state.fast_failures), ('open', 1, 1))
+        self.assertEqual(self.agent.stats['dropped'], 2)
+
+    def test_probe(self):
+        #Once the backoff is over one request probes the agent: a timeout doubles the backoff, a reply closes the breaker
+        class QuickBreaker(SNMPythonSession): BREAKER_BACKOFF = 0.1
+        session = QuickBreaker(DestHost=self.agent.address, Version=2, Timeout=20000, Retries=0, Backend='python',
+                               BreakerThreshold=1)
+        self.assertRaises(SNMPTimeoutError, session.get_data, '.1.3.6.1.2.1.1.5.0')
+        state = session.agent_state()
+        time.sleep(0.15)
+        self.assertRaises(SNMPTimeoutError, session.get_data, '.1.3.6.1.2.1.1.5.0') #The probe
+        self.assertEqual((state.breaker, state.backoff, state.trips), ('open', 0.2, 2))
+        self.agent.loss = 0.0
+        self.assertRaises(SNMPHostDownError, session.get_data, '.1.3.6.1.2.1.1.5.0')
+        time.sleep(0.25)
+        self.assertEqual(session.get_data('.1.3.6.1.2.1.1.5.0'), 'simulated')
+        self.assertEqual((state.breaker, state.consecutive_timeouts), ('closed', 0))
+        self.assertEqual(self.agent.stats['dropped'], 2)
+
+
+class AdaptiveTimeoutTest(AgentTest):
+    AGENT = dict(latency=0.02)
+
+    def test_learns(self):
+        #After a few replies a request only waits about as long as the agent usually takes, not the whole Timeout
+        session = _session(self.agent, Timeout=5000000, Retries=0, AdaptiveTimeout=1)
+        for x in range(5): self.assertEqual(session.get_data('.1.3.6.1.2.1.1.5.0'), 'simulated')
+        state = session.agent_state()
+        self.assertTrue(0.02 <= state.srtt < 0.2)
+        self.assertEqual(state.timeout, SNMPythonSession.TIMEOUT_MIN)
+
+        self.agent.latency = 1.0
+        start = time.time()
+        self.assertRaises(SNMPTimeoutError, session.get_data, '.1.3.6.1.2.1.1.5.0')
+        self.assertTrue(time.time() - start < 0.8)
+        self.assertEqual(session.Timeout, 5000000) #Put back after the request
+        self.assertEqual(state.timeouts, 1)
+
+    def test_retried_replies(self):
+        #Replies that only came after a retry aren't timed, we can't tell which try was answered (Karn's algorithm)
+        self.agent.latency = 0.15
+        session = _session(self.agent, Timeout=100000, Retries=1, AdaptiveTimeout=1)
+        self.assertEqual(session.get_data('.1.3.6.1.2.1.1.5.0'), 'simulated')
+        self.assertEqual(session.agent_state().srtt, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+from ..SNMPython import SNMPError, SNMPTimeoutError
+from ..agent import SimulatedAgent, MIBStore, synthetic_if_table
+from ..shard import ShardedPoller
+from .test_session import _session
+
+SYSNAME = '.1.3.6.1.2.1.1.5.0'
+IF_TABLE = '.1.3.6.1.2.1.2.2'
+
+
+class ShardedPollerTest(unittest.TestCase):
+    def setUp(self):
+        self.agents = [SimulatedAgent(MIBStore(synthetic_if_table(5))).start() for x in range(3)]
+        self.dead = SimulatedAgent(MIBStore(synthetic_if_table(5)), loss=1.0).start()
+
+    def tearDown(self):
+        for agent in self.agents + [self.dead]: agent.stop()
+
+    def poller(self, **kwargs):
+        kwargs.setdefault('Timeout', 1000000)
+        return ShardedPoller(Version=2, Retries=0, Backend='python', **kwargs)
+
+    def test_get_table_many(self):
+        #Tables come back from the workers with their row classes rebuilt
+        poller = self.poller(processes=2, threads=2)
+        hosts = [agent.address for agent in self.agents]
+        results = dict(poller.get_table_many(hosts, IF_TABLE))
+        self.assertEqual(sorted(results), sorted(hosts))
+        expected = _session(self.agents[0]).get_table(IF_TABLE)
+        for table in results.values():
+            self.assertEqual(table, expected)
+            self.assertEqual(type(table['2'])._fields, type(expected['2'])._fields)
+        self.assertEqual(sorted(poller.costs), sorted(hosts)) #Learned for the next run
+
+    def test_errors(self):
+        #Errors keep their class, a dead host doesn't stop the others
+        poller = self.poller(processes=2)
+        dead = {'DestHost': self.dead.address, 'Timeout': 100000}
+        results = list(poller.poll_many([dead, self.agents[0].address], SYSNAME, '.1.3.6.1.2.1.1.3.0'))
+        self.assertEqual(len(results), 2)
+        for target, result in results:
+            if target == dead: self.assertTrue(isinstance(result, SNMPTimeoutError))
+            else: self.assertEqual(result, ('simulated', '123456'))
+
+    def test_stuck_worker(self):
+        #A worker that sends nothing for stall_timeout is killed, and its jobs fail once the retries are used up
+        self.agents[0].latency = 5.0
+        poller = self.poller(processes=1, stall_timeout=0.5, retries=1, Timeout=10000000)
+        results = list(poller.poll_many([self.agents[0].address], SYSNAME))
+        self.assertEqual(len(results), 1)
+        self.assertTrue(isinstance(results[0][1], SNMPError))
+        self.assertTrue('stuck' in str(results[0][1]))
+        self.assertEqual(self.agents[0].stats['get'], 2) #Tried again in a new worker
+
+    def test_shard(self):
+        #The most expensive jobs first, each to the cheapest shard
+        costs = {'a': 8, 'b': 5, 'c': 4, 'd': 3, 'e': 1}
+        poller = self.poller(cost=costs.get)
+        jobs = [(x, (target, 'get_data', ())) for x, target in enumerate(sorted(costs))]
+        shards = poller.shard(jobs, 2)
+        self.assertEqual([[job[1][0] for job in shard] for shard in shards], [['a', 'd'], ['b', 'c', 'e']])
+        self.assertEqual(len(poller.shard(jobs[:1], 4)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..snapshot import _key, _oid, write_snapshot, from_varbinds, Snapshot
+from ..agent import SimulatedAgent, synthetic_if_table
+from ..SNMPython import SNMPythonSession
+
+#Numbers on both sides of each change in the key's length
+EDGES = (0, 1, 0x7F, 0x80, 0x3FFF, 0x4000, 0x1FFFFF, 0x200000, 2**32 - 1)
+
+
+class KeyTest(unittest.TestCase):
+    def test_roundtrip(self):
+        for n in EDGES:
+            oid = (1, 3, 6, 1, 4, 1, n, 5)
+            self.assertEqual(_oid(_key(oid)), oid)
+        self.assertEqual(_key('.1.3.6.1'), _key((1, 3, 6, 1)))
+
+    def test_order(self):
+        #Keys sort as bytes the way the OIDs sort as tuples
+        oids = [(1, 3, a, b) for a in EDGES for b in EDGES] + [(1, 3), (1, 3, 0x80), (1, 4), (2,)]
+        self.assertEqual(sorted(oids, key=_key), sorted(oids))
+
+    def test_prefix(self):
+        for n, other in zip(EDGES, EDGES[1:]):
+            self.assertTrue(_key((1, 3, n, 7)).startswith(_key((1, 3, n))))
+            self.assertFalse(_key((1, 3, other, 7)).startswith(_key((1, 3, n))))
+
+    def test_parents(self):
+        parents = {}
+        oids = [(1, 3, 6, 1, 2, 1, 2, 2, 1, 2, n) for n in EDGES]
+        self.assertEqual([_key(oid, parents) for oid in oids], [_key(oid) for oid in oids])
+
+    def test_too_big(self):
+        self.assertRaises(ValueError, _key, (1, 3, 2**32))
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.objects = synthetic_if_table(20)
+        self.path = os.path.join(self.directory, 'agent.snap')
+        write_snapshot(self.objects, self.path, timestamp=1339000000)
+        self.snapshot = Snapshot(self.path)
+
+    def tearDown(self):
+        self.snapshot.close()
+        shutil.rmtree(self.directory)
+
+    def test_get(self):
+        self.assertEqual(len(self.snapshot), len(self.objects))
+        self.assertEqual(self.snapshot.timestamp, 1339000000)
+        for oid, (type, value) in self.objects.items(): self.assertEqual(self.snapshot.get(oid), (type, value))
+        self.assertEqual(self.snapshot.get((1, 3, 6, 1, 2, 1, 1, 99, 0)), ('NOSUCHINSTANCE', None))
+
+    def test_scan(self):
+        self.assertEqual([(oid, type, value) for oid, type, value in self.snapshot], [(oid,) + self.objects[oid] for oid in sorted(self.objects)])
+        self.assertEqual(len(list(self.snapshot.scan('.1.3.6.1.2.1.2.2.1.2'))), 20)
+        self.assertEqual(self.snapshot.getnext(max(self.objects))[1], 'ENDOFMIBVIEW')
+
+    def test_diff(self):
+        changed = dict(self.objects)
+        changed[(1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 3)] = ('OCTETSTR', b'uplink')
+        del changed[(1, 3, 6, 1, 2, 1, 1, 5, 0)]
+        path = os.path.join(self.directory, 'later.snap')
+        write_snapshot(changed, path)
+        later = Snapshot(path)
+        try:
+            self.assertEqual(list(self.snapshot.diff(later)),
+                             [((1, 3, 6, 1, 2, 1, 1, 5, 0), ('OCTETSTR', b'simulated'), None),
+                              ((1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 3), ('OCTETSTR', b'GigabitEthernet0/3'), ('OCTETSTR', b'uplink'))])
+        finally:
+            later.close()
+
+    def test_walk_archive(self):
+        #A walk written with from_varbinds comes back the same, and an agent serving the snapshot walks the same
+        with SimulatedAgent(self.snapshot) as agent:
+            session = SNMPythonSession(DestHost=agent.address, Version=2, Backend='python')
+            walk = list(session.iter_subtree_numeric('.1.3.6.1.2.1.2.2'))
+        path = os.path.join(self.directory, 'walk.snap')
+        write_snapshot(from_varbinds(walk), path)
+        archived = Snapshot(path)
+        try: self.assertEqual(list(archived.walk()), walk)
+        finally: archived.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import socket
+import time
+import unittest
+
+from .. import ber
+from ..traps import TrapReceiver, SYS_UPTIME, SNMP_TRAP_OID
+
+LINK_DOWN = (1, 3, 6, 1, 6, 3, 1, 1, 5, 3)
+IF_INDEX = ((1, 3, 6, 1, 2, 1, 2, 2, 1, 1, 7), 'INTEGER', 7)
+
+
+class TrapReceiverTest(unittest.TestCase):
+    def setUp(self):
+        self.receiver = TrapReceiver(host='127.0.0.1', port=0, communities=['public']).start()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.settimeout(2)
+
+    def tearDown(self):
+        self.socket.close()
+        self.receiver.stop()
+
+    def send(self, data):
+        self.socket.sendto(data, self.receiver.address)
+
+    def received(self, count):
+        notifications, deadline = [], time.time() + 2
+        while len(notifications) < count and time.time() < deadline:
+            if self.receiver.queue.empty(): time.sleep(0.01)
+            else: notifications.extend(self.receiver.queue.get())
+        return notifications
+
+    def test_traps(self):
+        self.send(ber.encode_message(ber.VERSION_2C, b'public', ber.TRAP_V2, 1, 0, 0,
+                                     [(SYS_UPTIME, 'TICKS', 1234), (SNMP_TRAP_OID, 'OBJECTID', LINK_DOWN), IF_INDEX]))
+        self.send(ber.encode_trap_v1(b'public', (1, 3, 6, 1, 4, 1, 9), '10.1.1.1', 2, 0, 999, [IF_INDEX]))
+        trap, trapV1 = self.received(2)
+        self.assertEqual((trap.kind, trap.uptime, trap.trap_oid, trap.varbinds),
+                         ('trap', 1234, '.1.3.6.1.6.3.1.1.5.3', [('.1.3.6.1.2.1.2.2.1.1', '7', '7', 'INTEGER')]))
+        #RFC 3584: generic trap 2 is linkDown
+        self.assertEqual((trapV1.kind, trapV1.trap_oid, trapV1.agent_address), ('trapv1', '.1.3.6.1.6.3.1.1.5.3', '10.1.1.1'))
+
+    def test_inform(self):
+        self.send(ber.encode_message(ber.VERSION_2C, b'public', ber.INFORM_REQUEST, 42, 0, 0,
+                                     [(SYS_UPTIME, 'TICKS', 1), (SNMP_TRAP_OID, 'OBJECTID', LINK_DOWN)]))
+        ack = ber.decode_message(self.socket.recv(65535))
+        self.assertEqual((ack.pdu, ack.request_id), (ber.RESPONSE, 42))
+        self.assertEqual(self.received(1)[0].kind, 'inform')
+
+    def test_full_queue(self):
+        #With the queue full, traps are dropped and informs are not acknowledged, both are counted
+        self.receiver.stop()
+        self.receiver = TrapReceiver(host='127.0.0.1', port=0, communities=['public'], queue_size=1).start()
+        trap = ber.encode_message(ber.VERSION_2C, b'public', ber.TRAP_V2, 1, 0, 0, [(SNMP_TRAP_OID, 'OBJECTID', LINK_DOWN)])
+        self.send(trap)
+        deadline = time.time() + 2
+        while not self.receiver.queue.full() and time.time() < deadline: time.sleep(0.01)
+        self.send(ber.encode_message(ber.VERSION_2C, b'public', ber.INFORM_REQUEST, 42, 0, 0,
+                                     [(SNMP_TRAP_OID, 'OBJECTID', LINK_DOWN)]))
+        self.send(trap)
+        self.socket.settimeout(0.3)
+        self.assertRaises(socket.timeout, self.socket.recv, 65535)
+        stats = self.receiver.stats
+        self.assertEqual((stats['datagrams'], stats['informs'], stats['dropped']), (3, 0, 2))
+
+    def test_bad_datagrams(self):
+        #Bad input is counted and the receiver keeps going
+        self.send(b'junk')
+        self.send(ber.encode_message(ber.VERSION_2C, b'public', ber.TRAP_V2, 1, 0, 0, [(SNMP_TRAP_OID, 'INTEGER', 3)]))
+        self.send(ber.encode_message(ber.VERSION_2C, b'private', ber.TRAP_V2, 2, 0, 0, [(SNMP_TRAP_OID, 'OBJECTID', LINK_DOWN)]))
+        self.send(ber.encode_message(ber.VERSION_2C, b'public', ber.TRAP_V2, 3, 0, 0, [(SNMP_TRAP_OID, 'OBJECTID', LINK_DOWN)]))
+        self.assertEqual(len(self.received(1)), 1)
+        stats = self.receiver.stats
+        self.assertEqual((stats['datagrams'], stats['bad'], stats['ignored'], stats['notifications']), (4, 2, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
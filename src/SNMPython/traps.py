@@ -0,0 +1,240 @@
+'''
+@author: Carl Verge
+@contact: carlverge@gmail.com
+@version: 12.06
+@requires: Python 3
+
+A receiver for SNMP v1/v2c traps and informs, built on the ber codec (no netsnmp needed), for trap storms:
+datagrams are read and decoded in batches, informs are acknowledged as soon as they are decoded, OID names are
+cached, and the batches go to a bounded queue (or a callback) with every dropped notification counted.
+    receiver = TrapReceiver(port=162, communities=['public'], mib_index=MIBIndex('/var/cache/mibs.idx'))
+    receiver.start()
+    while True:
+        for notification in receiver.queue.get():
+            print(notification.source, notification.trap_oid, notification.varbinds)
+'''
+
+import select
+import socket
+import threading
+import time
+from collections import namedtuple
+import queue
+
+from . import ber
+from .backend import netsnmp_value
+
+#A received trap or inform
+#   source: The (address, port) it came from
+#   received: When it was received, seconds since the epoch
+#   version: 1 or 2 (for v2c)
+#   community: The community string
+#   kind: 'trap' (v2c), 'inform', or 'trapv1'
+#   agent_address: The address of the agent that sent it, from the trap for v1 (it may be relayed), the source otherwise
+#   uptime: The agent's sysUpTime in TimeTicks, None if the notification doesn't have it
+#   trap_oid: The snmpTrapOID, numeric. For v1 traps it is worked out from the generic and specific trap (RFC 3584)
+#   varbinds: A list of (tag, iid, value, type) like get_data_oids returns, without sysUpTime.0 and snmpTrapOID.0 for v2c
+Notification = namedtuple('Notification', ['source', 'received', 'version', 'community', 'kind', 'agent_address', 'uptime',
+                                           'trap_oid', 'varbinds'])
+
+SYS_UPTIME = (1, 3, 6, 1, 2, 1, 1, 3, 0)
+SNMP_TRAP_OID = (1, 3, 6, 1, 6, 3, 1, 1, 4, 1, 0)
+#The generic v1 traps (coldStart, warmStart, linkDown, linkUp, authenticationFailure, egpNeighborLoss) are snmpTraps.N+1
+SNMP_TRAPS = (1, 3, 6, 1, 6, 3, 1, 1, 5)
+
+
+def trap_oid_v1(trap):
+    '''
+    @return: The snmpTrapOID a v1 trap translates to (RFC 3584), as a tuple of ints.
+    '''
+    if trap.generic_trap != 6: return SNMP_TRAPS + (trap.generic_trap + 1,)
+    return tuple(trap.enterprise) + (0, trap.specific_trap)
+
+
+class TrapReceiver(object):
+    '''
+    Receives traps and informs on a UDP socket with a background thread, see the module documentation.
+    Each time the socket is readable, up to batch_size datagrams are read and decoded, and the resulting list of
+    Notifications is handed on in one go: to the callback if there is one, otherwise to the queue.
+
+    When the queue is full, a batch is dropped (and counted in stats['dropped']) unless block is set, in which case the
+    receiver waits for room and the kernel's socket buffer takes up the slack. Informs are only acknowledged when their
+    batch has room, so a dropped inform is sent again by the agent rather than lost. It is counted in stats['dropped']
+    each time all the same.
+
+    @ivar queue: The queue.Queue of batches (lists of Notifications), if there is no callback.
+    @ivar stats: Counters: datagrams, notifications, informs (acknowledged), dropped, bad (couldn't be decoded, or not
+                 a valid notification, eg. an snmpTrapOID.0 that isn't an OID),
+                 ignored (other PDUs or unknown communities), batches, callback_errors.
+    '''
+    #The socket receive buffer we ask for, to ride out bursts
+    RECEIVE_BUFFER = 4 * 1024 * 1024
+
+    #The most OID translations kept, the cache starts over when it fills up
+    CACHE_SIZE = 65536
+
+    def __init__(self, host='0.0.0.0', port=162, communities=None, callback=None, queue_size=1000, batch_size=256,
+                 block=False, mib_index=None, long_names=False):
+        '''
+        @param host: The address to listen on.
+        @param port: The UDP port to listen on, 0 for any free port (see address).
+        @param communities: The communities to accept, None for any.
+        @param callback: Called with each batch (a list of Notifications) from the receiver thread. (Optional)
+        @param queue_size: The most batches waiting in the queue.
+        @param batch_size: The most datagrams read in one go.
+        @param block: Wait for room in a full queue instead of dropping the batch.
+        @param mib_index: A mibindex.MIBIndex to name the varbinds with. Without one the tags are numeric. (Optional)
+        @param long_names: Name the varbinds with long names, like the session's UseLongNames.
+        '''
+        self.host = host
+        self.port = port
+        self.communities = None if communities is None else set([c.encode('utf-8') if isinstance(c, str) else c for c in communities])
+        self.callback = callback
+        self.queue = queue.Queue(queue_size) if callback is None else None
+        self.batch_size = batch_size
+        self.block = block
+        self.mib_index = mib_index
+        self.long_names = long_names
+        self.stats = dict(datagrams=0, notifications=0, informs=0, dropped=0, bad=0, ignored=0, batches=0, callback_errors=0)
+        self._names = {} #OID tuple -> (tag, iid), only used by the receiver thread
+        self._socket = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._buffer = bytearray(65535)
+
+    @property
+    def address(self):
+        '''@return: The (host, port) the receiver is listening on, once started.'''
+        return self._socket.getsockname()[:2]
+
+    def start(self):
+        '''Open the socket and start the receiver thread.'''
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        self._socket = socket.socket(family, socket.SOCK_DGRAM)
+        try: self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.RECEIVE_BUFFER)
+        except socket.error: pass #The system limit applies
+        self._socket.bind((self.host, self.port))
+        self._socket.setblocking(False)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        '''Stop the receiver thread and close the socket.'''
+        self._stop.set()
+        if self._thread is not None: self._thread.join()
+        if self._socket is not None: self._socket.close()
+        self._thread = self._socket = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _serve(self):
+        while not self._stop.is_set():
+            if not select.select([self._socket], [], [], 0.1)[0]: continue
+            try: batch = self.receive_batch()
+            except Exception: continue #Bad datagrams are counted in receive_batch, the thread has to keep going regardless
+            if batch: self._deliver(batch)
+
+    def _room(self):
+        #Can the batch being read be delivered? Always with a callback or when blocking
+        return self.queue is None or self.block or not self.queue.full()
+
+    def receive_batch(self):
+        '''
+        Read and decode the datagrams waiting on the socket, up to batch_size. Called by the receiver thread.
+        @return: A list of Notifications.
+        '''
+        batch = []
+        room = self._room()
+        view = memoryview(self._buffer)
+        for x in range(self.batch_size):
+            try: size, source = self._socket.recvfrom_into(self._buffer)
+            except (BlockingIOError, InterruptedError): break
+            except socket.error: break #ICMP errors from sending an ack
+            self.stats['datagrams'] += 1
+            try: notification = self._decode(view[:size], source, room)
+            except Exception: #Whatever is wrong with one datagram, the rest of the batch still gets through
+                self.stats['bad'] += 1
+                continue
+            if notification is None: continue
+            if room: batch.append(notification)
+            else: self.stats['dropped'] += 1
+        return batch
+
+    def _decode(self, data, source, room):
+        received = time.time()
+        pdu = ber.pdu_type(data)
+        if pdu == ber.TRAP_V1:
+            trap = ber.decode_trap_v1(data)
+            if self.communities is not None and trap.community not in self.communities: return self._ignore()
+            return Notification(source, received, 1, trap.community.decode('latin-1'), 'trapv1', trap.agent_address,
+                                trap.timestamp, ber.format_oid(trap_oid_v1(trap)), self._varbinds(trap.varbinds))
+        if pdu not in (ber.TRAP_V2, ber.INFORM_REQUEST): return self._ignore()
+
+        message = ber.decode_message(data)
+        if self.communities is not None and message.community not in self.communities: return self._ignore()
+        varbinds, uptime, trapOid = message.varbinds, None, None
+        if varbinds and varbinds[0][0] == SYS_UPTIME:
+            uptime = varbinds[0][2]
+            varbinds = varbinds[1:]
+        if varbinds and varbinds[0][0] == SNMP_TRAP_OID:
+            if varbinds[0][1] != 'OBJECTID': raise ber.BERError('snmpTrapOID.0 is a %s, not an OID' % varbinds[0][1])
+            trapOid = ber.format_oid(varbinds[0][2])
+            varbinds = varbinds[1:]
+        if pdu == ber.INFORM_REQUEST:
+            if not room: #Don't acknowledge what we can't keep, the agent sends it again
+                self.stats['dropped'] += 1
+                return None
+            #Acknowledge it straight away, before any of the translating
+            ack = ber.encode_message(message.version, message.community, ber.RESPONSE, message.request_id, 0, 0, message.varbinds)
+            try: self._socket.sendto(ack, source)
+            except socket.error: pass
+            self.stats['informs'] += 1
+        return Notification(source, received, 2, message.community.decode('latin-1'),
+                            'inform' if pdu == ber.INFORM_REQUEST else 'trap', source[0], uptime, trapOid, self._varbinds(varbinds))
+
+    def _ignore(self):
+        self.stats['ignored'] += 1
+        return None
+
+    def _varbinds(self, varbinds):
+        return [self._name(oid) + (netsnmp_value(type, value), type) for oid, type, value in varbinds]
+
+    def _name(self, oid):
+        #(tag, iid) for an OID, cached as the same OIDs come up again and again in a storm
+        name = self._names.get(oid)
+        if name is not None: return name
+        name = None
+        if self.mib_index is not None:
+            found = self.mib_index.describe(ber.format_oid(oid))
+            if found is not None:
+                numeric, label, longName, iid = found
+                name = (longName if self.long_names else label, iid)
+        if name is None: name = (ber.format_oid(oid[:-1]), str(oid[-1])) #Numeric, split like netsnmp does
+        if len(self._names) >= self.CACHE_SIZE: self._names.clear()
+        self._names[oid] = name
+        return name
+
+    def _deliver(self, batch):
+        self.stats['batches'] += 1
+        self.stats['notifications'] += len(batch)
+        if self.callback is not None:
+            try: self.callback(batch)
+            except Exception: self.stats['callback_errors'] += 1
+            return
+        if self.block:
+            while not self._stop.is_set():
+                try:
+                    self.queue.put(batch, timeout=0.1)
+                    return
+                except queue.Full: continue
+            self.stats['dropped'] += len(batch) #Stopped while waiting
+            return
+        try: self.queue.put_nowait(batch)
+        except queue.Full: self.stats['dropped'] += len(batch)